@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 
-from .models import Cliente, Restaurante, Produto, Pedido, ItemPedido, Entrega, Avaliacao
+from .models import Cliente, Restaurante, Produto, Pedido, ItemPedido, Entrega, Entregador, Rota, Avaliacao
 
 # Define um "inline" para o modelo Cliente.
 class ClienteInline(admin.StackedInline):
@@ -33,4 +33,6 @@ admin.site.register(Produto)
 admin.site.register(Pedido)
 admin.site.register(ItemPedido)
 admin.site.register(Entrega)
+admin.site.register(Entregador)
+admin.site.register(Rota)
 admin.site.register(Avaliacao)
\ No newline at end of file
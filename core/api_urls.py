@@ -4,10 +4,19 @@ from . import api_views
 urlpatterns = [
     path('restaurantes/', api_views.restaurant_list_api, name='api_restaurant_list'),
     path('restaurantes/<int:pk>/', api_views.restaurant_detail_api, name='api_restaurant_detail'),
+    path('restaurantes/<int:pk>/avaliacoes/', api_views.avaliacoes_api, name='api_avaliacoes'),
+    path('facetas/', api_views.facetas_api, name='api_facetas'),
+    path('busca/', api_views.busca_api, name='api_busca'),
     path('login/', api_views.login_api, name='api_login'),
     path('logout/', api_views.logout_api, name='api_logout'),
     path('user/', api_views.user_info_api, name='api_user_info'),
     path('carrinho/', api_views.cart_api, name='api_cart'),
     path('carrinho/adicionar/', api_views.add_to_cart_api, name='api_add_to_cart'),
     path('checkout/', api_views.checkout_api, name='api_checkout'),
+    path('pedidos/status/', api_views.pedidos_status_em_lote_api, name='api_pedidos_status_em_lote'),
+    path('pedidos/<int:pk>/timeline/', api_views.pedido_timeline_api, name='api_pedido_timeline'),
+    path('pedidos/<int:pk>/status/', api_views.pedido_status_api, name='api_pedido_status'),
+    path('pedidos/eventos/', api_views.pedidos_eventos_api, name='api_pedidos_eventos'),
+    path('painel/vendas/', api_views.painel_vendas_api, name='api_painel_vendas'),
+    path('metricas/cache/', api_views.cache_metrics_api, name='api_cache_metrics'),
 ]
@@ -1,46 +1,383 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from .models import Restaurante, Produto, Pedido, ItemPedido, Cliente
+from .avaliacoes import AvaliacaoInvalida, AvaliacaoNaoPermitida, avaliar
+from .busca import BuscaIndisponivel, buscar
+from .cardapio import chave_cardapio_json, estatisticas_cache, etag_cardapio_api, obter_ou_gerar
+from .carrinho import (
+    CarrinhoMultiRestaurante, OperacaoInvalida, aplicar_operacoes, obter_carrinho,
+    precificar_carrinho, verificar_restaurante,
+)
+from .facetas import contagens
+from .geo import proximos
+from .horarios import filtro_aberto
+from .imagens import urls_derivadas
+from .models import Restaurante, Produto, Cliente, ChaveIdempotencia, Avaliacao
+from .notificacoes import canal_cliente, canal_restaurante, eventos_disponiveis, obter_broker
+from .vendas import intervalo, resumo
+from .pedidos import (
+    CarrinhoInvalido, ConflitoStatus, TransicaoInvalida, criar_pedido, linha_do_tempo, mudar_status,
+    mudar_status_em_lote,
+)
 import json
 
+# Paginação por cursor (keyset) sobre o id: o cliente manda o último id que
+# recebeu em ?cursor= e o próximo cursor volta no cabeçalho X-Next-Cursor.
+PAGE_SIZE_PADRAO = getattr(settings, 'API_PAGE_SIZE', 50)
+PAGE_SIZE_MAXIMO = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+
+# Campos expostos pela API -> coluna correspondente no modelo
+CAMPOS_RESTAURANTE = {
+    'id': 'id',
+    'nome': 'nome',
+    'endereco': 'endereco',
+    'tipo_cozinha': 'tipo_cozinha',
+    'horario_funcionamento': 'horario_funcionamento',
+    'imagem_url': 'foto_capa',
+    'imagens': 'capa_derivadas',
+    'nota_media': 'nota_media',
+    'total_avaliacoes': 'total_avaliacoes',
+}
+CAMPOS_PRODUTO = {
+    'id': 'id',
+    'nome': 'nome',
+    'descricao': 'descricao',
+    'preco': 'preco',
+    'foto_url': 'foto',
+    'fotos': 'fotos_derivadas',
+}
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _parametros_paginacao(request):
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limite = int(request.GET.get('limit', PAGE_SIZE_PADRAO))
+    except ValueError:
+        raise ParametroInvalido('cursor e limit devem ser inteiros')
+    if cursor < 0 or limite < 1:
+        raise ParametroInvalido('cursor e limit devem ser positivos')
+    return cursor, min(limite, PAGE_SIZE_MAXIMO)
+
+
+def _campos_selecionados(request, campos_disponiveis):
+    # ?fields=nome,preco limita as colunas carregadas; o id sempre vem junto
+    # porque é ele que serve de cursor.
+    pedidos = request.GET.get('fields')
+    if not pedidos:
+        return list(campos_disponiveis)
+    campos = [c.strip() for c in pedidos.split(',') if c.strip()]
+    invalidos = [c for c in campos if c not in campos_disponiveis]
+    if invalidos:
+        raise ParametroInvalido(f"Campos inválidos: {', '.join(invalidos)}")
+    if 'id' not in campos:
+        campos.insert(0, 'id')
+    return campos
+
+
+def _pagina(queryset, request, campos_disponiveis):
+    cursor, limite = _parametros_paginacao(request)
+    campos = _campos_selecionados(request, campos_disponiveis)
+    colunas = [campos_disponiveis[c] for c in campos]
+    # Busca um registro a mais só para saber se existe próxima página
+    linhas = list(queryset.filter(id__gt=cursor).order_by('id').values(*colunas)[:limite + 1])
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = linhas[-1]['id']
+
+    return _serializar(linhas, campos, campos_disponiveis), proximo_cursor
+
+
+def _serializar(linhas, campos, campos_disponiveis):
+    itens = []
+    for linha in linhas:
+        item = {}
+        for campo in campos:
+            valor = linha[campos_disponiveis[campo]]
+            if campo in ('imagem_url', 'foto_url'):
+                valor = default_storage.url(valor) if valor else None
+            elif campo in ('imagens', 'fotos'):
+                valor = urls_derivadas(valor)
+            elif campo == 'preco':
+                valor = str(valor)
+            elif campo == 'nota_media':
+                valor = round(valor, 2)
+            item[campo] = valor
+        itens.append(item)
+    return itens
+
+
+def _pagina_por_nota(queryset, request, campos_disponiveis):
+    # ?ordenar=nota: da maior nota média para a menor. O cursor é a posição
+    # "nota:id" do último restaurante recebido (keyset sobre restaurante_nota_idx).
+    cursor = request.GET.get('cursor')
+    try:
+        limite = int(request.GET.get('limit', PAGE_SIZE_PADRAO))
+        if cursor:
+            nota, ultimo_id = cursor.split(':')
+            nota, ultimo_id = float(nota), int(ultimo_id)
+    except ValueError:
+        raise ParametroInvalido('cursor deve ser "nota:id" e limit um inteiro')
+    if limite < 1:
+        raise ParametroInvalido('limit deve ser positivo')
+    limite = min(limite, PAGE_SIZE_MAXIMO)
+    campos = _campos_selecionados(request, campos_disponiveis)
+    colunas = [campos_disponiveis[c] for c in campos]
+    if cursor:
+        queryset = queryset.filter(Q(nota_media__lt=nota) | Q(nota_media=nota, id__gt=ultimo_id))
+    linhas = list(queryset.order_by('-nota_media', 'id').values(*colunas, 'nota_media')[:limite + 1])
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = f"{linhas[-1]['nota_media']!r}:{linhas[-1]['id']}"
+    return _serializar(linhas, campos, campos_disponiveis), proximo_cursor
+
+
+def _com_cursor(response, proximo_cursor):
+    if proximo_cursor is not None:
+        response['X-Next-Cursor'] = str(proximo_cursor)
+    return response
+
+
+def _filtrar_restaurantes(queryset, request):
+    # ?tipo_cozinha= e ?categoria= aceitam vários valores (repetindo o parâmetro)
+    cozinhas = request.GET.getlist('tipo_cozinha')
+    if cozinhas:
+        queryset = queryset.filter(tipo_cozinha__in=cozinhas)
+    categorias = request.GET.getlist('categoria')
+    if categorias:
+        # EXISTS em vez de JOIN: o restaurante aparece uma vez só, mesmo com
+        # vários produtos da categoria
+        queryset = queryset.filter(Exists(
+            Produto.objects.filter(restaurante_id=OuterRef('pk'), categoria__in=categorias)
+        ))
+    # ?aberto_agora=1: EXISTS sobre os horários interpretados, no próprio SQL
+    if request.GET.get('aberto_agora') in ('1', 'true'):
+        queryset = queryset.filter(filtro_aberto())
+    return queryset
+
+
+def _ponto_de_entrega(request):
+    # ?lat=&lon= explícitos ou, com ?perto=1, as coordenadas do cliente logado
+    if 'lat' in request.GET or 'lon' in request.GET:
+        try:
+            latitude, longitude = float(request.GET['lat']), float(request.GET['lon'])
+        except (KeyError, ValueError):
+            raise ParametroInvalido('lat e lon devem ser números')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ParametroInvalido('lat/lon fora do intervalo válido')
+        return latitude, longitude
+    if request.GET.get('perto') in ('1', 'true') and request.user.is_authenticated:
+        ponto = Cliente.objects.filter(user=request.user).values_list('latitude', 'longitude').first()
+        if not ponto or None in ponto:
+            raise ParametroInvalido('O endereço do cliente ainda não foi geocodificado')
+        return ponto
+    return None
+
+
+def _restaurantes_proximos(restaurantes, request, ponto):
+    # Sem cursor: a ordem é pela distância, e o resultado já vem limitado
+    # aos restaurantes que entregam no ponto
+    _, limite = _parametros_paginacao(request)
+    campos = _campos_selecionados(request, CAMPOS_RESTAURANTE)
+    try:
+        raio_km = float(request.GET['raio_km']) if 'raio_km' in request.GET else None
+    except ValueError:
+        raise ParametroInvalido('raio_km deve ser um número')
+    colunas = [CAMPOS_RESTAURANTE[c] for c in campos]
+    linhas = list(proximos(restaurantes, *ponto, raio_km=raio_km).values(*colunas, 'distancia_km')[:limite])
+    itens = _serializar(linhas, campos, CAMPOS_RESTAURANTE)
+    for item, linha in zip(itens, linhas):
+        item['distancia_km'] = round(linha['distancia_km'], 2)
+    return itens
+
+
 def restaurant_list_api(request):
-    restaurantes = Restaurante.objects.all()
-    data = []
-    for r in restaurantes:
-        data.append({
-            'id': r.id,
-            'nome': r.nome,
-            'endereco': r.endereco,
-            'tipo_cozinha': r.tipo_cozinha,
-            'horario_funcionamento': r.horario_funcionamento,
-            'imagem_url': r.produtos.first().foto.url if r.produtos.exists() and r.produtos.first().foto else None # Exemplo simples
-        })
-    return JsonResponse(data, safe=False)
+    # Uma única consulta: a foto de capa já fica gravada no próprio Restaurante
+    try:
+        restaurantes = _filtrar_restaurantes(Restaurante.objects.all(), request)
+        ponto = _ponto_de_entrega(request)
+        if ponto is not None:
+            return JsonResponse(_restaurantes_proximos(restaurantes, request, ponto), safe=False)
+        if request.GET.get('ordenar') == 'nota':
+            data, proximo_cursor = _pagina_por_nota(restaurantes, request, CAMPOS_RESTAURANTE)
+        else:
+            data, proximo_cursor = _pagina(restaurantes, request, CAMPOS_RESTAURANTE)
+    except ParametroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return _com_cursor(JsonResponse(data, safe=False), proximo_cursor)
 
-def restaurant_detail_api(request, pk):
-    restaurante = get_object_or_404(Restaurante, pk=pk)
-    produtos = restaurante.produtos.all()
-    produtos_data = []
-    for p in produtos:
-        produtos_data.append({
-            'id': p.id,
-            'nome': p.nome,
-            'descricao': p.descricao,
-            'preco': str(p.preco),
-            'foto_url': p.foto.url if p.foto else None
+@csrf_exempt
+def avaliacoes_api(request, pk):
+    # GET: média, total e avaliações (mais novas primeiro, ?cursor= com o último id)
+    # POST {"nota": 5, "comentario": "..."}: cria ou substitui a avaliação do cliente
+    restaurante = get_object_or_404(Restaurante.objects.only('id', 'nota_media', 'total_avaliacoes'), pk=pk)
+    if request.method == 'POST':
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Login required'}, status=401)
+        try:
+            cliente = request.user.cliente
+        except Cliente.DoesNotExist:
+            return JsonResponse({'error': 'User is not a client'}, status=400)
+        data = json.loads(request.body)
+        try:
+            avaliacao = avaliar(cliente, restaurante.id, data.get('nota'), data.get('comentario'))
+        except AvaliacaoInvalida as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except AvaliacaoNaoPermitida as e:
+            return JsonResponse({'error': str(e)}, status=403)
+        except IntegrityError:
+            # Outra submissão do mesmo cliente criou a avaliação ao mesmo tempo
+            return JsonResponse({'error': 'Review already being submitted'}, status=409)
+        restaurante.refresh_from_db(fields=['nota_media', 'total_avaliacoes'])
+        return JsonResponse({
+            'success': True,
+            'avaliacao_id': avaliacao.id,
+            'nota_media': round(restaurante.nota_media, 2),
+            'total_avaliacoes': restaurante.total_avaliacoes,
         })
-    
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        cursor, limite = _parametros_paginacao(request)
+    except ParametroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    avaliacoes = Avaliacao.objects.filter(restaurante_id=restaurante.id)
+    if cursor:
+        avaliacoes = avaliacoes.filter(id__lt=cursor)
+    linhas = list(avaliacoes.order_by('-id').values(
+        'id', 'nota', 'comentario', 'data_avaliacao', 'cliente__user__username'
+    )[:limite + 1])
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = linhas[-1]['id']
     data = {
-        'id': restaurante.id,
-        'nome': restaurante.nome,
-        'endereco': restaurante.endereco,
-        'tipo_cozinha': restaurante.tipo_cozinha,
-        'produtos': produtos_data
+        'nota_media': round(restaurante.nota_media, 2),
+        'total_avaliacoes': restaurante.total_avaliacoes,
+        'avaliacoes': [
+            {
+                'id': linha['id'],
+                'nota': linha['nota'],
+                'comentario': linha['comentario'] or '',
+                'cliente': linha['cliente__user__username'],
+                'data': linha['data_avaliacao'].isoformat(),
+            }
+            for linha in linhas
+        ],
     }
-    return JsonResponse(data)
+    return _com_cursor(JsonResponse(data), proximo_cursor)
+
+def facetas_api(request):
+    # Lê só a tabela de contagens, nunca um GROUP BY sobre restaurantes/produtos
+    return JsonResponse(contagens())
+
+def busca_api(request):
+    # Resultados de restaurantes e produtos numa lista só, ordenada pelo BM25
+    texto = request.GET.get('q', '').strip()
+    try:
+        limite = min(int(request.GET.get('limit', 20)), PAGE_SIZE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'error': 'limit deve ser inteiro'}, status=400)
+    if limite < 1:
+        return JsonResponse({'error': 'limit deve ser positivo'}, status=400)
+    try:
+        encontrados = buscar(texto, limite)
+    except BuscaIndisponivel as e:
+        return JsonResponse({'error': str(e)}, status=501)
+
+    ids = {'restaurante': [], 'produto': []}
+    for tipo, id_ in encontrados:
+        ids[tipo].append(id_)
+    restaurantes = {
+        r['id']: r for r in Restaurante.objects.filter(id__in=ids['restaurante']).values(
+            'id', 'nome', 'tipo_cozinha', 'foto_capa'
+        )
+    }
+    produtos = {
+        p['id']: p for p in Produto.objects.filter(id__in=ids['produto']).values(
+            'id', 'nome', 'preco', 'categoria', 'foto', 'restaurante_id', 'restaurante__nome'
+        )
+    }
+
+    resultados = []
+    for tipo, id_ in encontrados:
+        if tipo == 'restaurante' and id_ in restaurantes:
+            r = restaurantes[id_]
+            resultados.append({
+                'tipo': tipo,
+                'id': id_,
+                'nome': r['nome'],
+                'tipo_cozinha': r['tipo_cozinha'],
+                'imagem_url': default_storage.url(r['foto_capa']) if r['foto_capa'] else None,
+            })
+        elif tipo == 'produto' and id_ in produtos:
+            p = produtos[id_]
+            resultados.append({
+                'tipo': tipo,
+                'id': id_,
+                'nome': p['nome'],
+                'preco': str(p['preco']),
+                'categoria': p['categoria'],
+                'foto_url': default_storage.url(p['foto']) if p['foto'] else None,
+                'restaurante_id': p['restaurante_id'],
+                'restaurante_nome': p['restaurante__nome'],
+            })
+    return JsonResponse({'q': texto, 'resultados': resultados})
+
+# O cardápio muda pouco: o ETag forte permite que CDN/proxy revalidem com 304
+@cache_control(public=True, max_age=settings.CARDAPIO_CACHE_MAX_AGE)
+@condition(etag_func=etag_cardapio_api)
+def restaurant_detail_api(request, pk):
+    restaurante = get_object_or_404(
+        Restaurante.objects.only('id', 'nome', 'endereco', 'tipo_cozinha', 'versao_cardapio'), pk=pk
+    )
+
+    def gerar():
+        # A paginação e o ?fields= valem para a lista de produtos do cardápio
+        produtos_data, proximo_cursor = _pagina(
+            Produto.objects.filter(restaurante_id=restaurante.id), request, CAMPOS_PRODUTO
+        )
+        data = {
+            'id': restaurante.id,
+            'nome': restaurante.nome,
+            'endereco': restaurante.endereco,
+            'tipo_cozinha': restaurante.tipo_cozinha,
+            'produtos': produtos_data
+        }
+        return data, proximo_cursor
+
+    try:
+        data, proximo_cursor = obter_ou_gerar(chave_cardapio_json(restaurante, request), gerar)
+    except ParametroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return _com_cursor(JsonResponse(data), proximo_cursor)
+
+def cache_metrics_api(request):
+    # Formato texto do Prometheus, para ser coletado pelo scraper
+    stats = estatisticas_cache()
+    linhas = [
+        '# HELP delivery_cardapio_cache_hits_total Leituras do cache de cardápio atendidas pelo cache.',
+        '# TYPE delivery_cardapio_cache_hits_total counter',
+        f"delivery_cardapio_cache_hits_total {stats['hits']}",
+        '# HELP delivery_cardapio_cache_misses_total Leituras do cache de cardápio que precisaram gerar o conteúdo.',
+        '# TYPE delivery_cardapio_cache_misses_total counter',
+        f"delivery_cardapio_cache_misses_total {stats['misses']}",
+    ]
+    return HttpResponse('\n'.join(linhas) + '\n', content_type='text/plain; version=0.0.4')
 
 @csrf_exempt
 def login_api(request):
@@ -72,46 +409,152 @@ def user_info_api(request):
 
 @csrf_exempt
 def add_to_cart_api(request):
-    if not request.user.is_authenticated:
-        return JsonResponse({'error': 'Login required'}, status=401)
-        
+    # Visitantes anônimos também montam carrinho (na sessão); ele é mesclado
+    # ao carrinho da conta no login. O checkout continua exigindo login.
     if request.method == 'POST':
         data = json.loads(request.body)
-        produto_id = str(data.get('produto_id'))
-        
-        carrinho = request.session.get('carrinho', {})
-        if produto_id in carrinho:
-            carrinho[produto_id] += 1
-        else:
-            carrinho[produto_id] = 1
-            
-        request.session['carrinho'] = carrinho
-        return JsonResponse({'success': True, 'carrinho': carrinho})
+        try:
+            produto_id = int(data.get('produto_id'))
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'produto_id must be an integer'}, status=400)
+        restaurante_id = Produto.objects.filter(pk=produto_id).values_list('restaurante_id', flat=True).first()
+        if restaurante_id is None:
+            return JsonResponse({'error': 'Product not found'}, status=404)
+
+        carrinho = obter_carrinho(request)
+        try:
+            verificar_restaurante(carrinho.itens(), restaurante_id)
+        except CarrinhoMultiRestaurante as e:
+            return _erro_multi_restaurante(e)
+        carrinho.adicionar(produto_id)
+        return JsonResponse({'success': True, 'carrinho': carrinho.itens()})
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+def _carrinho_json(precificado):
+    itens = [
+        {
+            'produto_id': linha.produto_id,
+            'nome': linha.nome,
+            'preco': str(linha.preco),
+            'quantidade': linha.quantidade,
+            'subtotal': str(linha.subtotal)
+        }
+        for linha in precificado.linhas
+    ]
+    return JsonResponse({
+        'itens': itens,
+        'total': str(precificado.total),
+        'restaurante_id': precificado.restaurante_id,
+    })
+
+def _erro_multi_restaurante(e):
+    return JsonResponse({'error': str(e)}, status=409)
+
+@csrf_exempt
 def cart_api(request):
-    carrinho = request.session.get('carrinho', {})
-    if not carrinho:
-        return JsonResponse({'itens': [], 'total': 0})
-        
-    produto_ids = carrinho.keys()
-    produtos = Produto.objects.filter(id__in=produto_ids)
-    itens = []
-    total = 0
-    
-    for p in produtos:
-        qtd = carrinho[str(p.id)]
-        subtotal = p.preco * qtd
-        itens.append({
-            'produto_id': p.id,
-            'nome': p.nome,
-            'preco': str(p.preco),
-            'quantidade': qtd,
-            'subtotal': str(subtotal)
-        })
-        total += subtotal
-        
-    return JsonResponse({'itens': itens, 'total': str(total)})
+    carrinho = obter_carrinho(request)
+    if request.method == 'GET':
+        try:
+            return _carrinho_json(precificar_carrinho(carrinho.itens()))
+        except CarrinhoMultiRestaurante as e:
+            return _erro_multi_restaurante(e)
+
+    if request.method == 'PATCH':
+        # Várias alterações numa só requisição:
+        # {"operacoes": [{"produto_id": 1, "quantidade": 3, "op": "set"}, ...]}
+        # com op = set (padrão), increment ou remove
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        operacoes = data.get('operacoes') if isinstance(data, dict) else data
+        try:
+            precificado = aplicar_operacoes(carrinho, operacoes)
+        except OperacaoInvalida as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except CarrinhoMultiRestaurante as e:
+            return _erro_multi_restaurante(e)
+        return _carrinho_json(precificado)
+
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@csrf_exempt
+def pedido_status_api(request, pk):
+    # {"status_atual": "Pendente", "novo_status": "Em preparação"}
+    # 409 se o pedido já não estiver em status_atual (ou não for do dono)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    data = json.loads(request.body)
+    try:
+        mudar_status(pk, data.get('status_atual'), data.get('novo_status'), request.user)
+    except TransicaoInvalida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ConflitoStatus as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    return JsonResponse({'success': True, 'pedido_id': pk, 'status': data.get('novo_status')})
+
+@csrf_exempt
+def pedidos_status_em_lote_api(request):
+    # {"pedido_ids": [1, 2, 3], "novo_status": "A caminho"}
+    # Responde com o resultado de cada pedido (ok, invalido, conflito, nao_encontrado)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    data = json.loads(request.body)
+    pedido_ids = data.get('pedido_ids')
+    # bool é subclasse de int: true/false não podem passar por ids
+    if not isinstance(pedido_ids, list) or not all(
+        isinstance(i, int) and not isinstance(i, bool) for i in pedido_ids
+    ):
+        return JsonResponse({'error': 'pedido_ids must be a list of integers'}, status=400)
+    if len(pedido_ids) > settings.API_MAX_PAGE_SIZE:
+        return JsonResponse({'error': f'At most {settings.API_MAX_PAGE_SIZE} orders per request'}, status=400)
+    try:
+        resultados = mudar_status_em_lote(pedido_ids, data.get('novo_status'), request.user)
+    except TransicaoInvalida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'resultados': resultados})
+
+def painel_vendas_api(request):
+    # ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD (padrão: últimos 30 dias) e
+    # ?restaurante=<id> para um só; sem ele soma todos os restaurantes do dono
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    try:
+        inicio, fim = intervalo(request.GET.get('inicio'), request.GET.get('fim'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    restaurantes = Restaurante.objects.filter(dono=request.user)
+    if 'restaurante' in request.GET:
+        try:
+            restaurantes = restaurantes.filter(pk=int(request.GET['restaurante']))
+        except ValueError:
+            return JsonResponse({'error': 'restaurante deve ser um inteiro'}, status=400)
+    restaurante_ids = list(restaurantes.values_list('id', flat=True))
+    if not restaurante_ids:
+        return JsonResponse({'error': 'Restaurant not found'}, status=404)
+    return JsonResponse(resumo(restaurante_ids, inicio, fim))
+
+def pedido_timeline_api(request, pk):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    eventos = linha_do_tempo(pk, request.user)
+    if not eventos:
+        return JsonResponse({'error': 'Order not found'}, status=404)
+    return JsonResponse({'pedido_id': pk, 'eventos': eventos})
+
+def _resposta_idempotente(registro):
+    if registro.resposta is None:
+        # A primeira tentativa ainda está em andamento
+        return JsonResponse({'error': 'Request with this Idempotency-Key is in progress'}, status=409)
+    response = JsonResponse(registro.resposta)
+    response['Idempotent-Replayed'] = 'true'
+    return response
 
 @csrf_exempt
 def checkout_api(request):
@@ -119,43 +562,105 @@ def checkout_api(request):
         return JsonResponse({'error': 'Login required'}, status=401)
         
     if request.method == 'POST':
-        carrinho = request.session.get('carrinho', {})
-        if not carrinho:
-            return JsonResponse({'error': 'Cart is empty'}, status=400)
-            
-        produto_ids = carrinho.keys()
-        produtos = Produto.objects.filter(id__in=produto_ids)
-        
-        if not produtos.exists():
-             return JsonResponse({'error': 'Invalid products'}, status=400)
-             
-        restaurante = produtos.first().restaurante
+        # Apps móveis repetem o POST em caso de timeout: com o cabeçalho
+        # Idempotency-Key, uma repetição devolve a resposta original.
+        chave = request.headers.get('Idempotency-Key')
+        if chave is not None and (not chave or len(chave) > 255):
+            return JsonResponse({'error': 'Invalid Idempotency-Key'}, status=400)
+
+        carrinho_do_usuario = obter_carrinho(request)
+        carrinho = carrinho_do_usuario.itens()
+        registro = None
+        if chave is not None:
+            # Reserva a chave numa transação própria, já confirmada antes de
+            # criar o pedido: uma tentativa concorrente encontra a reserva
+            # sem resposta e recebe 409 em vez de esperar pela primeira.
+            try:
+                with transaction.atomic():
+                    registro, criado = ChaveIdempotencia.objects.get_or_create(user=request.user, chave=chave)
+            except IntegrityError:
+                registro, criado = ChaveIdempotencia.objects.get(user=request.user, chave=chave), False
+            if not criado:
+                return _resposta_idempotente(registro)
+
         try:
-            cliente = request.user.cliente
-        except:
-             return JsonResponse({'error': 'User is not a client'}, status=400)
+            if not carrinho:
+                return JsonResponse({'error': 'Cart is empty'}, status=400)
+            try:
+                cliente = request.user.cliente
+            except:
+                 return JsonResponse({'error': 'User is not a client'}, status=400)
 
-        pedido = Pedido.objects.create(
-            cliente=cliente,
-            restaurante=restaurante,
-            status='Pendente'
-        )
-        
-        total = 0
-        for p in produtos:
-            qtd = carrinho[str(p.id)]
-            ItemPedido.objects.create(
-                pedido=pedido,
-                produto=p,
-                quantidade=qtd,
-                preco_unitario=p.preco
-            )
-            total += p.preco * qtd
-            
-        pedido.valor_total = total
-        pedido.save()
-        
-        request.session['carrinho'] = {}
-        return JsonResponse({'success': True, 'pedido_id': pedido.id})
+            with transaction.atomic():
+                pedido = criar_pedido(cliente, carrinho)
+                entrega = pedido.entrega
+                resposta = {
+                    'success': True,
+                    'pedido_id': pedido.id,
+                    'tempo_estimado': {
+                        'minimo': entrega.minutos_minimo,
+                        'maximo': entrega.minutos_maximo,
+                        'texto': entrega.tempo_estimado,
+                        'distancia_km': entrega.distancia_km,
+                    },
+                }
+                if registro is not None:
+                    registro.pedido = pedido
+                    registro.resposta = resposta
+                    registro.save(update_fields=['pedido', 'resposta'])
+                    registro = None
+        except CarrinhoMultiRestaurante as e:
+            return _erro_multi_restaurante(e)
+        except CarrinhoInvalido:
+            return JsonResponse({'error': 'Invalid products'}, status=400)
+        finally:
+            # Sem pedido criado a reserva é liberada, para o app poder tentar
+            # de novo com a mesma chave. Se o processo morrer no meio, a
+            # reserva fica em 409 até o purgar_chaves_idempotencia removê-la.
+            if registro is not None:
+                registro.delete()
+
+        carrinho_do_usuario.limpar()
+        return JsonResponse(resposta)
         
     return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+async def _canal_do_usuario(user):
+    cliente = await Cliente.objects.filter(user=user).values('id', 'tipo_usuario').afirst()
+    if cliente is None:
+        return None
+    if cliente['tipo_usuario'] == 'RESTAURANTE':
+        restaurante_id = await Restaurante.objects.filter(dono=user).values_list('id', flat=True).afirst()
+        return canal_restaurante(restaurante_id) if restaurante_id is not None else None
+    return canal_cliente(cliente['id'])
+
+async def _fluxo_eventos(canal):
+    assinatura = await obter_broker().assinar(canal)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            mensagem = await assinatura.proxima(settings.SSE_HEARTBEAT_SEGUNDOS)
+            if mensagem is None:
+                # Comentário SSE para manter a conexão viva em proxies
+                yield ': ping\n\n'
+            else:
+                yield f'event: pedido\ndata: {json.dumps(mensagem)}\n\n'
+    finally:
+        await assinatura.fechar()
+
+async def pedidos_eventos_api(request):
+    # Server-Sent Events: o dono recebe os pedidos do restaurante dele e o
+    # cliente recebe os próprios pedidos, sem precisar recarregar a página
+    if not eventos_disponiveis(request):
+        return JsonResponse({'error': 'Event stream requires an ASGI server'}, status=501)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    canal = await _canal_do_usuario(user)
+    if canal is None:
+        return JsonResponse({'error': 'No orders to follow'}, status=404)
+    return StreamingHttpResponse(
+        _fluxo_eventos(canal),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,90 @@
+# core/avaliacoes.py
+#
+# Agregados das avaliações guardados no próprio Restaurante (total_avaliacoes,
+# soma_notas e nota_media), para a listagem mostrar e ordenar pela nota sem
+# um AVG por restaurante.
+#
+# Os signals de Avaliacao chamam somar() na mesma transação da gravação: um
+# UPDATE atômico com F() que soma a diferença e recalcula a média a partir
+# dos valores antigos da própria linha, então duas avaliações simultâneas não
+# se perdem. recalcular() refaz tudo do zero (comando recalcular_avaliacoes).
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Avaliacao, Pedido, Restaurante
+
+NOTA_MINIMA = 1
+NOTA_MAXIMA = 5
+
+
+class AvaliacaoInvalida(Exception):
+    pass
+
+
+class AvaliacaoNaoPermitida(Exception):
+    pass
+
+
+def somar(restaurante_id, notas, avaliacoes):
+    """Soma `notas` pontos e `avaliacoes` avaliações aos agregados do restaurante."""
+    if not notas and not avaliacoes:
+        return
+    novo_total = F('total_avaliacoes') + avaliacoes
+    nova_soma = F('soma_notas') + notas
+    Restaurante.objects.filter(pk=restaurante_id).update(
+        total_avaliacoes=novo_total,
+        soma_notas=nova_soma,
+        # No SET todas as colunas ainda têm o valor de antes do UPDATE
+        nota_media=Case(
+            When(total_avaliacoes__gt=-avaliacoes, then=Cast(nova_soma, FloatField()) / novo_total),
+            default=Value(0.0), output_field=FloatField(),
+        ),
+    )
+
+
+def avaliar(cliente, restaurante_id, nota, comentario=''):
+    """Cria ou atualiza a avaliação do cliente para o restaurante.
+
+    Só quem já recebeu um pedido do restaurante pode avaliar, e cada cliente
+    tem uma avaliação por restaurante (mandar de novo substitui a nota). Os
+    agregados do Restaurante são ajustados pelos signals dentro desta mesma
+    transação.
+    """
+    if isinstance(nota, bool) or not isinstance(nota, int) or not NOTA_MINIMA <= nota <= NOTA_MAXIMA:
+        raise AvaliacaoInvalida(f'A nota deve ser um inteiro de {NOTA_MINIMA} a {NOTA_MAXIMA}')
+    if comentario is not None and not isinstance(comentario, str):
+        raise AvaliacaoInvalida('O comentário deve ser um texto')
+    if not Pedido.objects.filter(cliente=cliente, restaurante_id=restaurante_id, status='Entregue').exists():
+        raise AvaliacaoNaoPermitida('Só é possível avaliar restaurantes dos quais você recebeu um pedido')
+    with transaction.atomic():
+        # select_for_update para duas submissões simultâneas do mesmo cliente
+        # não contarem duas vezes; a restrição única cobre a criação
+        avaliacao = Avaliacao.objects.select_for_update().filter(cliente=cliente, restaurante_id=restaurante_id).first()
+        if avaliacao is None:
+            avaliacao = Avaliacao(cliente=cliente, restaurante_id=restaurante_id)
+        avaliacao.nota = nota
+        avaliacao.comentario = comentario or ''
+        avaliacao.save()
+    return avaliacao
+
+
+def _agregado(funcao):
+    return Coalesce(
+        Subquery(
+            Avaliacao.objects.filter(restaurante_id=OuterRef('pk')).order_by()
+            .values('restaurante_id').annotate(valor=funcao).values('valor')
+        ),
+        0, output_field=IntegerField(),
+    )
+
+
+def recalcular():
+    """Refaz os agregados de todos os restaurantes a partir das avaliações."""
+    with transaction.atomic():
+        Restaurante.objects.update(total_avaliacoes=_agregado(Count('id')), soma_notas=_agregado(Sum('nota')))
+        Restaurante.objects.update(nota_media=Case(
+            When(total_avaliacoes__gt=0, then=Cast(F('soma_notas'), FloatField()) / F('total_avaliacoes')),
+            default=Value(0.0), output_field=FloatField(),
+        ))
@@ -0,0 +1,132 @@
+# core/busca.py
+#
+# Busca textual de restaurantes e produtos sobre uma tabela virtual FTS5 do
+# SQLite (core_busca, criada na migração 0011_busca). Cada restaurante e cada
+# produto vira uma linha; o rowid codifica o tipo (par = produto, ímpar =
+# restaurante) para que atualizar ou remover uma linha seja um acesso direto
+# pela chave, sem varrer o índice.
+#
+# * O tokenizador unicode61 com remove_diacritics ignora acentos e caixa:
+#   "acai" encontra "Açaí".
+# * A última palavra da consulta é buscada por prefixo (índices de prefixo de
+#   2 a 4 letras), para o type-ahead.
+# * O ranking é o BM25 do próprio FTS5, com peso maior para o nome.
+#
+# A tabela é mantida pelos signals de Restaurante e Produto. Gravações que não
+# disparam signals (bulk_create, update) precisam de reindexar() depois; o
+# comando reindexar_busca faz isso.
+
+import re
+
+from django.db import connection
+
+from .models import Restaurante, Produto
+
+TABELA = 'core_busca'
+
+# Pesos do BM25 na ordem das colunas da tabela (restaurante_id não é indexada)
+PESOS_BM25 = (0.0, 10.0, 4.0, 1.0, 2.0)
+
+_PALAVRAS = re.compile(r'\w+')
+
+
+class BuscaIndisponivel(Exception):
+    pass
+
+
+def disponivel():
+    return connection.vendor == 'sqlite'
+
+
+def _rowid_restaurante(restaurante_id):
+    return restaurante_id * 2 + 1
+
+
+def _rowid_produto(produto_id):
+    return produto_id * 2
+
+
+def _gravar(linhas):
+    # FTS5 não tem UPDATE eficiente de coluna: remove e insere de novo
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABELA} WHERE rowid = %s', [(linha[0],) for linha in linhas])
+        cursor.executemany(
+            f'INSERT INTO {TABELA} (rowid, restaurante_id, nome, tipo_cozinha, descricao, categoria) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            linhas,
+        )
+
+
+def indexar_restaurante(restaurante):
+    if disponivel():
+        _gravar([(_rowid_restaurante(restaurante.id), restaurante.id, restaurante.nome,
+                  restaurante.tipo_cozinha, '', '')])
+
+
+def indexar_produto(produto):
+    if disponivel():
+        _gravar([(_rowid_produto(produto.id), produto.restaurante_id, produto.nome, '',
+                  produto.descricao, produto.categoria)])
+
+
+def remover_restaurante(restaurante_id):
+    if disponivel():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABELA} WHERE rowid = %s', [_rowid_restaurante(restaurante_id)])
+
+
+def remover_produto(produto_id):
+    if disponivel():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABELA} WHERE rowid = %s', [_rowid_produto(produto_id)])
+
+
+def reindexar():
+    """Reconstrói o índice inteiro a partir das tabelas de origem."""
+    if not disponivel():
+        raise BuscaIndisponivel('A busca textual precisa do SQLite com FTS5.')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA}')
+        # INSERT ... SELECT: os dados não passam pelo Python
+        cursor.execute(
+            f'INSERT INTO {TABELA} (rowid, restaurante_id, nome, tipo_cozinha, descricao, categoria) '
+            f"SELECT id * 2 + 1, id, nome, tipo_cozinha, '', '' FROM {Restaurante._meta.db_table}"
+        )
+        cursor.execute(
+            f'INSERT INTO {TABELA} (rowid, restaurante_id, nome, tipo_cozinha, descricao, categoria) '
+            f"SELECT id * 2, restaurante_id, nome, '', descricao, categoria FROM {Produto._meta.db_table}"
+        )
+        # Junta os segmentos gerados pela carga em massa
+        cursor.execute(f"INSERT INTO {TABELA} ({TABELA}) VALUES ('optimize')")
+
+
+def expressao_fts(texto):
+    """Converte o texto digitado numa expressão MATCH segura.
+
+    Cada palavra vira uma frase entre aspas (o usuário não consegue injetar
+    operadores do FTS5) e a última ganha * para casar por prefixo.
+    """
+    palavras = _PALAVRAS.findall(texto)
+    if not palavras:
+        return None
+    termos = [f'"{palavra}"' for palavra in palavras]
+    termos[-1] += '*'
+    return ' '.join(termos)
+
+
+def buscar(texto, limite):
+    """Devolve [(tipo, id), ...] do mais para o menos relevante."""
+    if not disponivel():
+        raise BuscaIndisponivel('A busca textual precisa do SQLite com FTS5.')
+    expressao = expressao_fts(texto)
+    if expressao is None:
+        return []
+    pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH %s '
+            f'ORDER BY bm25({TABELA}, {pesos}) LIMIT %s',
+            [expressao, limite],
+        )
+        rowids = [linha[0] for linha in cursor.fetchall()]
+    return [('produto', rowid // 2) if rowid % 2 == 0 else ('restaurante', rowid // 2) for rowid in rowids]
@@ -0,0 +1,116 @@
+# core/cardapio.py
+#
+# Cache HTTP do cardápio: o ETag de cada resposta é derivado da versão do
+# cardápio gravada no Restaurante, então uma requisição condicional é
+# respondida com 304 consultando só a tabela de restaurantes.
+
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import Restaurante, Produto
+
+
+def capa_do_restaurante(restaurante_id):
+    # A capa é a foto do primeiro produto (menor id) que tiver imagem
+    return (
+        Produto.objects.filter(restaurante_id=restaurante_id)
+        .exclude(foto='')
+        .exclude(foto__isnull=True)
+        .order_by('id')
+        .values_list('foto', 'fotos_derivadas')
+        .first()
+    ) or (None, {})
+
+
+def incrementar_versao_cardapio(restaurante_id, **campos):
+    # UPDATE atômico: não depende do valor que estiver em memória
+    Restaurante.objects.filter(pk=restaurante_id).update(
+        versao_cardapio=F('versao_cardapio') + 1, **campos
+    )
+
+
+def cardapio_alterado(restaurante_id):
+    # Recalcula a capa e invalida os caches do cardápio desse restaurante
+    foto, derivadas = capa_do_restaurante(restaurante_id)
+    incrementar_versao_cardapio(restaurante_id, foto_capa=foto, capa_derivadas=derivadas)
+
+
+def versao_cardapio(restaurante_id):
+    return (
+        Restaurante.objects.filter(pk=restaurante_id)
+        .values_list('versao_cardapio', flat=True)
+        .first()
+    )
+
+
+def _assinatura_query(request):
+    # Paginação e ?fields= mudam o corpo da resposta, então entram no ETag
+    query = '&'.join(sorted(request.GET.urlencode().split('&')))
+    return hashlib.md5(query.encode()).hexdigest()[:12]
+
+
+def etag_cardapio_api(request, pk, **kwargs):
+    versao = versao_cardapio(pk)
+    if versao is None:
+        return None
+    return f'cardapio-{pk}-v{versao}-{_assinatura_query(request)}'
+
+
+def etag_cardapio_pagina(request, pk, **kwargs):
+    versao = versao_cardapio(pk)
+    if versao is None:
+        return None
+    # O HTML muda conforme o usuário logado (menu, botões de adicionar) e traz
+    # o {% csrf_token %} dos formulários do base.html. O login troca o segredo
+    # do CSRF, então ele também entra no ETag: senão um 304 devolveria a página
+    # com o token antigo e o POST de logout falharia.
+    usuario = request.user.pk if request.user.is_authenticated else 'anonimo'
+    segredo = request.META.get('CSRF_COOKIE') or ''
+    csrf = hashlib.md5(segredo.encode()).hexdigest()[:12]
+    return f'cardapio-{pk}-v{versao}-u{usuario}-c{csrf}'
+
+
+# -----------------------------------------------------------------------------
+# Cache do lado do servidor
+# -----------------------------------------------------------------------------
+# As chaves levam o id do restaurante e a versão do cardápio. Quando um
+# produto muda, os signals incrementam a versão só daquele restaurante e as
+# entradas antigas deixam de ser lidas (e acabam descartadas pelo LRU do
+# backend), sem mexer no cache dos outros restaurantes.
+
+_estatisticas = {'hits': 0, 'misses': 0}
+_estatisticas_lock = threading.Lock()
+
+
+def _registrar(evento):
+    with _estatisticas_lock:
+        _estatisticas[evento] += 1
+
+
+def estatisticas_cache():
+    with _estatisticas_lock:
+        return dict(_estatisticas)
+
+
+def chave_cardapio_json(restaurante, request):
+    return f'cardapio-json:{restaurante.id}:v{restaurante.versao_cardapio}:{_assinatura_query(request)}'
+
+
+def chave_cardapio_html(restaurante, pode_comprar):
+    return f'cardapio-html:{restaurante.id}:v{restaurante.versao_cardapio}:{int(pode_comprar)}'
+
+
+def obter_ou_gerar(chave, gerar):
+    cache = caches[settings.CARDAPIO_CACHE_ALIAS]
+    valor = cache.get(chave)
+    if valor is not None:
+        _registrar('hits')
+        return valor
+    _registrar('misses')
+    valor = gerar()
+    cache.set(chave, valor)
+    return valor
@@ -0,0 +1,313 @@
+# core/carrinho.py
+#
+# Armazenamento do carrinho. Todas as views e APIs acessam o carrinho por
+# obter_carrinho(request), que escolhe o backend conforme CARRINHO_BACKEND:
+#
+# * 'sessao': o carrinho fica na sessão, codificado de forma compacta
+#   ("12:3,45:1") em vez de um dict JSON.
+# * 'modelo': usuários logados usam as tabelas Carrinho/ItemCarrinho, com
+#   incrementos feitos no próprio banco via F(); visitantes anônimos continuam
+#   na sessão e o carrinho deles é mesclado no login.
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Carrinho, ItemCarrinho, Produto
+
+CHAVE_SESSAO = 'carrinho'
+
+
+class CarrinhoInvalido(Exception):
+    pass
+
+
+class CarrinhoMultiRestaurante(CarrinhoInvalido):
+
+    def __init__(self, mensagem, linhas=(), total=Decimal('0.00')):
+        super().__init__(mensagem)
+        # As linhas precificadas mesmo assim, para a tela mostrar o que remover
+        self.linhas = list(linhas)
+        self.total = total
+
+
+def empacotar(itens):
+    return ','.join(f'{produto_id}:{quantidade}' for produto_id, quantidade in itens.items())
+
+
+def desempacotar(valor):
+    # Aceita também o formato antigo (dict) de sessões gravadas antes da mudança
+    if not valor:
+        return {}
+    if isinstance(valor, dict):
+        return {str(k): int(v) for k, v in valor.items()}
+    itens = {}
+    for par in valor.split(','):
+        produto_id, quantidade = par.split(':')
+        itens[produto_id] = int(quantidade)
+    return itens
+
+
+class CarrinhoSessao:
+
+    def __init__(self, session):
+        self.session = session
+
+    def itens(self):
+        return desempacotar(self.session.get(CHAVE_SESSAO))
+
+    def _gravar(self, itens):
+        self.session[CHAVE_SESSAO] = empacotar(itens)
+
+    def adicionar(self, produto_id, quantidade=1):
+        itens = self.itens()
+        produto_id = str(produto_id)
+        itens[produto_id] = itens.get(produto_id, 0) + quantidade
+        self._gravar(itens)
+
+    def definir(self, produto_id, quantidade):
+        itens = self.itens()
+        itens[str(produto_id)] = quantidade
+        self._gravar(itens)
+
+    def remover(self, produto_id):
+        itens = self.itens()
+        if itens.pop(str(produto_id), None) is not None:
+            self._gravar(itens)
+
+    def substituir(self, itens):
+        self._gravar(itens)
+
+    def limpar(self):
+        if self.session.get(CHAVE_SESSAO):
+            self.session[CHAVE_SESSAO] = ''
+
+
+class CarrinhoModelo:
+
+    def __init__(self, user):
+        self.user = user
+        self._carrinho_id = None
+
+    @property
+    def carrinho_id(self):
+        if self._carrinho_id is None:
+            carrinho, _ = Carrinho.objects.get_or_create(user=self.user)
+            self._carrinho_id = carrinho.id
+        return self._carrinho_id
+
+    def itens(self):
+        return {
+            str(produto_id): quantidade
+            for produto_id, quantidade in ItemCarrinho.objects.filter(
+                carrinho__user=self.user
+            ).values_list('produto_id', 'quantidade')
+        }
+
+    def adicionar(self, produto_id, quantidade=1):
+        item = ItemCarrinho.objects.filter(carrinho_id=self.carrinho_id, produto_id=produto_id)
+        # Caminho comum: incrementa a linha existente sem lê-la antes
+        if item.update(quantidade=F('quantidade') + quantidade):
+            return
+        try:
+            with transaction.atomic():
+                ItemCarrinho.objects.create(carrinho_id=self.carrinho_id, produto_id=produto_id, quantidade=quantidade)
+        except IntegrityError:
+            # Outra requisição criou a linha ao mesmo tempo
+            item.update(quantidade=F('quantidade') + quantidade)
+
+    def definir(self, produto_id, quantidade):
+        ItemCarrinho.objects.update_or_create(
+            carrinho_id=self.carrinho_id, produto_id=produto_id,
+            defaults={'quantidade': quantidade},
+        )
+
+    def remover(self, produto_id):
+        ItemCarrinho.objects.filter(carrinho__user=self.user, produto_id=produto_id).delete()
+
+    def substituir(self, itens):
+        # Grava o carrinho inteiro com duas consultas: um DELETE dos produtos
+        # que saíram e um upsert das quantidades novas
+        with transaction.atomic():
+            ItemCarrinho.objects.filter(carrinho_id=self.carrinho_id).exclude(
+                produto_id__in=[int(produto_id) for produto_id in itens]
+            ).delete()
+            ItemCarrinho.objects.bulk_create(
+                [
+                    ItemCarrinho(carrinho_id=self.carrinho_id, produto_id=int(produto_id), quantidade=quantidade)
+                    for produto_id, quantidade in itens.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['carrinho', 'produto'],
+                update_fields=['quantidade'],
+            )
+
+    def limpar(self):
+        ItemCarrinho.objects.filter(carrinho__user=self.user).delete()
+
+
+OPERACOES = ('set', 'increment', 'remove')
+
+
+class OperacaoInvalida(ValueError):
+    pass
+
+
+def aplicar_operacoes(carrinho, operacoes):
+    """Aplica uma lista de {produto_id, quantidade, op} ao carrinho de uma vez.
+
+    Todos os produtos são validados numa única consulta e nada é gravado se
+    alguma operação for inválida. Devolve o carrinho já precificado.
+    """
+    if not isinstance(operacoes, list) or not operacoes:
+        raise OperacaoInvalida('Informe uma lista de operações')
+
+    validadas = []
+    for operacao in operacoes:
+        if not isinstance(operacao, dict):
+            raise OperacaoInvalida('Cada operação deve ser um objeto')
+        op = operacao.get('op', 'set')
+        if op not in OPERACOES:
+            raise OperacaoInvalida(f'Operação inválida: {op}')
+        try:
+            produto_id = int(operacao.get('produto_id'))
+            quantidade = int(operacao.get('quantidade', 1 if op == 'increment' else 0))
+        except (TypeError, ValueError):
+            raise OperacaoInvalida('produto_id e quantidade devem ser inteiros')
+        if op == 'set' and quantidade < 0:
+            raise OperacaoInvalida('A quantidade não pode ser negativa')
+        validadas.append((op, produto_id, quantidade))
+
+    ids = {produto_id for _, produto_id, _ in validadas}
+    existentes = set(Produto.objects.filter(id__in=ids).values_list('id', flat=True))
+    inexistentes = sorted(ids - existentes)
+    if inexistentes:
+        raise OperacaoInvalida(f"Produtos inexistentes: {', '.join(map(str, inexistentes))}")
+
+    itens = carrinho.itens()
+    for op, produto_id, quantidade in validadas:
+        chave = str(produto_id)
+        if op == 'set':
+            itens[chave] = quantidade
+        elif op == 'increment':
+            itens[chave] = itens.get(chave, 0) + quantidade
+        else:
+            itens.pop(chave, None)
+        if itens.get(chave, 1) <= 0:
+            del itens[chave]
+    # Precifica antes de gravar: rejeita um lote que misture restaurantes
+    precificado = precificar_carrinho(itens)
+    carrinho.substituir(itens)
+    return precificado
+
+
+def obter_carrinho(request):
+    if settings.CARRINHO_BACKEND == 'modelo' and request.user.is_authenticated:
+        return CarrinhoModelo(request.user)
+    return CarrinhoSessao(request.session)
+
+
+def mesclar_carrinho_da_sessao(request, user):
+    """Chamado no login: junta o carrinho anônimo ao carrinho salvo do usuário.
+
+    Um pedido só pode ter produtos de um restaurante. Se os dois carrinhos
+    forem de restaurantes diferentes, vale o da sessão (o que o usuário
+    acabou de montar) e o salvo é descartado, com um aviso.
+    """
+    if settings.CARRINHO_BACKEND != 'modelo':
+        return
+    sessao = CarrinhoSessao(request.session)
+    itens = sessao.itens()
+    if not itens:
+        return
+    carrinho = CarrinhoModelo(user)
+    salvos = carrinho.itens()
+    # Ignora produtos que foram excluídos enquanto estavam no carrinho anônimo
+    restaurantes = dict(
+        Produto.objects.filter(id__in=[*itens, *salvos]).values_list('id', 'restaurante_id')
+    )
+    itens = {produto_id: quantidade for produto_id, quantidade in itens.items() if int(produto_id) in restaurantes}
+    da_sessao = {restaurantes[int(produto_id)] for produto_id in itens}
+    dos_salvos = {restaurantes[int(produto_id)] for produto_id in salvos if int(produto_id) in restaurantes}
+    with transaction.atomic():
+        if dos_salvos and da_sessao and dos_salvos != da_sessao:
+            carrinho.substituir(itens)
+            messages.warning(
+                request,
+                'Seu carrinho salvo tinha produtos de outro restaurante e foi substituído pelo carrinho atual.',
+            )
+        else:
+            for produto_id, quantidade in itens.items():
+                carrinho.adicionar(produto_id, quantidade)
+    sessao.limpar()
+
+
+# -----------------------------------------------------------------------------
+# Precificação
+# -----------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class LinhaCarrinho:
+    produto_id: int
+    nome: str
+    preco: Decimal
+    quantidade: int
+    subtotal: Decimal
+
+
+@dataclass(frozen=True)
+class CarrinhoPrecificado:
+    linhas: list
+    total: Decimal
+    restaurante_id: int | None
+
+
+def verificar_restaurante(itens, restaurante_id):
+    # Um pedido só pode ter produtos de um restaurante
+    outros = Produto.objects.filter(id__in=itens.keys()).exclude(restaurante_id=restaurante_id)
+    if itens and outros.exists():
+        raise CarrinhoMultiRestaurante('O carrinho tem produtos de outro restaurante')
+
+
+def precificar_carrinho(itens):
+    """Calcula linhas e total de um carrinho {produto_id: quantidade}.
+
+    Faz uma única consulta, trazendo só id, nome, preco e restaurante_id, e
+    soma tudo em Decimal. Produtos que não existem mais são ignorados; um
+    carrinho com produtos de mais de um restaurante é rejeitado.
+    """
+    if not itens:
+        return CarrinhoPrecificado(linhas=[], total=Decimal('0.00'), restaurante_id=None)
+
+    produtos = (
+        Produto.objects.filter(id__in=itens.keys())
+        .order_by('id')
+        .values('id', 'nome', 'preco', 'restaurante_id')
+    )
+    linhas = []
+    restaurantes = set()
+    total = Decimal('0.00')
+    for produto in produtos:
+        quantidade = itens[str(produto['id'])]
+        subtotal = produto['preco'] * quantidade
+        linhas.append(LinhaCarrinho(
+            produto_id=produto['id'],
+            nome=produto['nome'],
+            preco=produto['preco'],
+            quantidade=quantidade,
+            subtotal=subtotal,
+        ))
+        restaurantes.add(produto['restaurante_id'])
+        total += subtotal
+
+    if len(restaurantes) > 1:
+        raise CarrinhoMultiRestaurante('O carrinho tem produtos de mais de um restaurante', linhas, total)
+    return CarrinhoPrecificado(
+        linhas=linhas,
+        total=total,
+        restaurante_id=restaurantes.pop() if restaurantes else None,
+    )
@@ -0,0 +1,240 @@
+# core/despacho.py
+#
+# Despacho: agrupa as entregas prontas para sair (pedido Em preparação ou A
+# caminho, ainda sem rota) em rotas de entregadores livres. Roda fora da
+# requisição, pelo worker do comando despachar.
+#
+# O planejamento é uma heurística gulosa de inserção. Os pedidos são
+# atendidos do mais antigo para o mais novo. Cada um é inserido na rota já
+# planejada em que ele custa menos (melhor posição de coleta e de entrega,
+# com a coleta antes da entrega), desde que:
+#
+# * a rota não passe de DESPACHO_PEDIDOS_POR_ROTA pedidos;
+# * o restaurante fique perto de uma coleta da rota;
+# * a rota não fique mais de DESPACHO_DESVIO_MAXIMO_MINUTOS mais longa.
+#
+# Senão o pedido abre uma rota nova com o entregador livre mais perto do
+# restaurante. O planejamento para em DESPACHO_LIMITE_SEGUNDOS. O que sobrar
+# fica para o próximo ciclo.
+#
+# planejar() só trabalha com os dataclasses abaixo, sem banco. Assim o
+# comando simular_despacho usa exatamente o mesmo algoritmo.
+
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .geo import distancia_km
+from .models import Entrega, Entregador, Pedido, Rota
+from .notificacoes import notificar_pedidos
+
+COLETA = 'coleta'
+ENTREGA = 'entrega'
+# Pedidos que já podem entrar numa rota
+STATUS_PARA_DESPACHO = ('Em preparação', 'A caminho')
+
+
+@dataclass(frozen=True)
+class PedidoDespacho:
+    pedido_id: int
+    # (latitude, longitude) do restaurante e do cliente; None se não geocodificado
+    coleta: tuple | None
+    destino: tuple | None
+
+    @property
+    def localizado(self):
+        return self.coleta is not None and self.destino is not None
+
+
+@dataclass(frozen=True)
+class EntregadorLivre:
+    entregador_id: int
+    posicao: tuple | None
+
+
+@dataclass
+class RotaPlanejada:
+    entregador_id: int
+    posicao: tuple | None
+    # [(COLETA ou ENTREGA, PedidoDespacho), ...] na ordem em que são feitas
+    paradas: list = field(default_factory=list)
+    minutos: float = 0.0
+
+    @property
+    def pedidos(self):
+        return [pedido for tipo, pedido in self.paradas if tipo == COLETA]
+
+    @property
+    def agrupavel(self):
+        # Sem coordenadas não dá para medir o desvio: o pedido vai sozinho
+        return all(pedido.localizado for pedido in self.pedidos)
+
+
+@dataclass(frozen=True)
+class Parametros:
+    capacidade: int
+    desvio_maximo: float
+    minutos_por_parada: float
+    velocidade_kmh: float
+
+    @classmethod
+    def das_configuracoes(cls, **valores):
+        padrao = {
+            'capacidade': settings.DESPACHO_PEDIDOS_POR_ROTA,
+            'desvio_maximo': settings.DESPACHO_DESVIO_MAXIMO_MINUTOS,
+            'minutos_por_parada': settings.DESPACHO_MINUTOS_POR_PARADA,
+            'velocidade_kmh': settings.ETA_VELOCIDADE_KMH,
+        }
+        padrao.update((nome, valor) for nome, valor in valores.items() if valor is not None)
+        return cls(**padrao)
+
+
+def _minutos_trecho(origem, destino, parametros):
+    if origem is None or destino is None:
+        return 0.0
+    return distancia_km(*origem, *destino) / parametros.velocidade_kmh * 60
+
+
+def duracao(posicao, paradas, parametros):
+    """Minutos para cumprir as paradas saindo de posicao."""
+    total = 0.0
+    atual = posicao
+    for tipo, pedido in paradas:
+        ponto = pedido.coleta if tipo == COLETA else pedido.destino
+        total += _minutos_trecho(atual, ponto, parametros) + parametros.minutos_por_parada
+        atual = ponto
+    return total
+
+
+def _perto_da_rota(rota, pedido, parametros):
+    # Pré-filtro barato antes de testar as inserções: o restaurante precisa
+    # estar a no máximo desvio_maximo minutos de alguma coleta da rota
+    alcance = parametros.desvio_maximo / 60 * parametros.velocidade_kmh
+    return any(distancia_km(*outro.coleta, *pedido.coleta) <= alcance for outro in rota.pedidos)
+
+
+def _melhor_insercao(rota, pedido, parametros):
+    # Testa todas as posições de coleta e, depois dela, de entrega
+    melhor = None
+    for i in range(len(rota.paradas) + 1):
+        com_coleta = rota.paradas[:i] + [(COLETA, pedido)] + rota.paradas[i:]
+        for j in range(i + 1, len(com_coleta) + 1):
+            paradas = com_coleta[:j] + [(ENTREGA, pedido)] + com_coleta[j:]
+            minutos = duracao(rota.posicao, paradas, parametros)
+            if melhor is None or minutos < melhor[0]:
+                melhor = (minutos, paradas)
+    return melhor
+
+
+def planejar(pedidos, entregadores, parametros=None, limite_segundos=None):
+    """Distribui os pedidos (do mais antigo ao mais novo) em rotas.
+
+    Devolve a lista de RotaPlanejada. Pedidos que não couberem (sem
+    entregador livre ou tempo esgotado) ficam de fora.
+    """
+    parametros = parametros or Parametros.das_configuracoes()
+    inicio = time.monotonic()
+    livres = list(entregadores)
+    rotas = []
+    for pedido in pedidos:
+        if limite_segundos is not None and time.monotonic() - inicio > limite_segundos:
+            break
+        melhor = None
+        if pedido.localizado:
+            for rota in rotas:
+                if len(rota.pedidos) >= parametros.capacidade or not rota.agrupavel:
+                    continue
+                if not _perto_da_rota(rota, pedido, parametros):
+                    continue
+                minutos, paradas = _melhor_insercao(rota, pedido, parametros)
+                acrescimo = minutos - rota.minutos
+                if acrescimo <= parametros.desvio_maximo and (melhor is None or acrescimo < melhor[0]):
+                    melhor = (acrescimo, rota, minutos, paradas)
+        if melhor is not None:
+            _, rota, rota.minutos, rota.paradas = melhor
+            continue
+        if not livres:
+            continue
+        entregador = min(
+            livres, key=lambda e: (_minutos_trecho(e.posicao, pedido.coleta, parametros), e.entregador_id)
+        )
+        livres.remove(entregador)
+        paradas = [(COLETA, pedido), (ENTREGA, pedido)]
+        rotas.append(RotaPlanejada(
+            entregador.entregador_id, entregador.posicao, paradas,
+            duracao(entregador.posicao, paradas, parametros),
+        ))
+    return rotas
+
+
+def _ponto(latitude, longitude):
+    return None if latitude is None or longitude is None else (latitude, longitude)
+
+
+def pedidos_pendentes():
+    linhas = (
+        Entrega.objects.filter(rota__isnull=True, pedido__status__in=STATUS_PARA_DESPACHO)
+        .order_by('pedido__data_pedido', 'pedido_id')
+        .values_list(
+            'pedido_id', 'pedido__restaurante__latitude', 'pedido__restaurante__longitude',
+            'pedido__cliente__latitude', 'pedido__cliente__longitude',
+        )
+    )
+    return [
+        PedidoDespacho(pedido_id, _ponto(r_lat, r_lon), _ponto(c_lat, c_lon))
+        for pedido_id, r_lat, r_lon, c_lat, c_lon in linhas
+    ]
+
+
+def entregadores_livres():
+    # Livre = ativo e sem entrega de pedido ainda ativo em alguma rota
+    ocupado = Entrega.objects.filter(rota__entregador=OuterRef('pk'), pedido__status__in=Pedido.STATUS_ATIVOS)
+    linhas = (
+        Entregador.objects.filter(ativo=True).exclude(Exists(ocupado))
+        .order_by('id').values_list('id', 'latitude', 'longitude')
+    )
+    return [EntregadorLivre(entregador_id, _ponto(lat, lon)) for entregador_id, lat, lon in linhas]
+
+
+def gravar(rotas, momento=None):
+    """Grava as rotas planejadas: um INSERT em lote e um UPDATE em lote."""
+    if not rotas:
+        return []
+    momento = momento or timezone.now()
+    with transaction.atomic():
+        criadas = Rota.objects.bulk_create([
+            Rota(entregador_id=rota.entregador_id, criada_em=momento, minutos_previstos=round(rota.minutos, 1))
+            for rota in rotas
+        ])
+        entregas = {}
+        for rota, criada in zip(rotas, criadas):
+            for posicao, (tipo, pedido) in enumerate(rota.paradas):
+                entrega = entregas.setdefault(
+                    pedido.pedido_id, Entrega(pedido_id=pedido.pedido_id, rota=criada, despachado_em=momento)
+                )
+                if tipo == COLETA:
+                    entrega.parada_coleta = posicao
+                else:
+                    entrega.parada_entrega = posicao
+        Entrega.objects.bulk_update(
+            entregas.values(), ['rota', 'parada_coleta', 'parada_entrega', 'despachado_em'], batch_size=500
+        )
+        notificar_pedidos(entregas, 'despachado')
+    return criadas
+
+
+def despachar(limite_segundos=None):
+    """Um ciclo do worker: lê as pendências, planeja e grava. Devolve as rotas criadas."""
+    pedidos = pedidos_pendentes()
+    if not pedidos:
+        return []
+    entregadores = entregadores_livres()
+    if not entregadores:
+        return []
+    if limite_segundos is None:
+        limite_segundos = settings.DESPACHO_LIMITE_SEGUNDOS
+    return gravar(planejar(pedidos, entregadores, limite_segundos=limite_segundos))
@@ -0,0 +1,206 @@
+# core/eta.py
+#
+# Estimativa do tempo de entrega (ETA) calculada no checkout e gravada na
+# Entrega do pedido. O tempo é a soma de quatro partes:
+#
+# * aceite: quanto o restaurante demora para começar a preparar (Pendente)
+# * fila: pedidos Pendentes/Em preparação à frente, divididos pela quantidade
+#   de pedidos que a cozinha prepara ao mesmo tempo
+# * preparo: duração média de "Em preparação"
+# * deslocamento: pela distância restaurante -> cliente quando os dois estão
+#   geocodificados, ou pela duração média de "A caminho"
+#
+# As médias são móveis exponenciais (com variância, que dá a largura da
+# faixa "30-45 min") por restaurante e etapa, e a fila é um contador por
+# status. Tudo fica em memória e é atualizado a cada PedidoEvento depois do
+# commit, então estimar custa O(1). Cada restaurante é carregado do banco na
+# primeira estimativa (últimos ETA_AMOSTRAS eventos, contagem da fila pelo
+# índice (restaurante, status)) e recarregado a cada ETA_RECARREGAR_SEGUNDOS,
+# o que também corrige a diferença entre processos quando há vários workers.
+
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .geo import distancia_km
+from .models import Pedido, PedidoEvento, Restaurante
+
+# Status em que cada etapa começa; ela termina no próximo evento do pedido
+ETAPAS = {
+    'Pendente': 'aceite',
+    'Em preparação': 'preparo',
+    'A caminho': 'deslocamento',
+}
+# Usados enquanto o restaurante não tem histórico
+MINUTOS_PADRAO = {'aceite': 5.0, 'preparo': 20.0, 'deslocamento': 15.0}
+# Peso de cada amostra nova nas médias móveis
+ALFA = 0.2
+# Quantos desvios-padrão acima da média vai o limite superior da faixa
+DESVIOS_NA_FAIXA = 1.28
+FAIXA_MINIMA_MINUTOS = 5
+
+
+class MediaMovel:
+    __slots__ = ('media', 'variancia', 'amostras')
+
+    def __init__(self):
+        self.media = 0.0
+        self.variancia = 0.0
+        self.amostras = 0
+
+    def adicionar(self, valor):
+        if self.amostras == 0:
+            self.media = valor
+        else:
+            diferenca = valor - self.media
+            incremento = ALFA * diferenca
+            self.media += incremento
+            self.variancia = (1 - ALFA) * (self.variancia + diferenca * incremento)
+        self.amostras += 1
+
+
+class EstadoRestaurante:
+    __slots__ = ('medias', 'fila', 'latitude', 'longitude', 'carregado_em')
+
+    def __init__(self, latitude, longitude):
+        self.medias = {etapa: MediaMovel() for etapa in MINUTOS_PADRAO}
+        self.fila = Counter()
+        self.latitude = latitude
+        self.longitude = longitude
+        self.carregado_em = time.monotonic()
+
+    def minutos(self, etapa):
+        media = self.medias[etapa]
+        if media.amostras == 0:
+            return MINUTOS_PADRAO[etapa], 0.0
+        return media.media, media.variancia
+
+
+@dataclass(frozen=True)
+class Estimativa:
+    minimo: int
+    maximo: int
+    distancia_km: float | None
+
+    @property
+    def texto(self):
+        return f'{self.minimo}-{self.maximo} min'
+
+
+def _minutos_entre(inicio, fim):
+    return (fim - inicio).total_seconds() / 60
+
+
+class MotorETA:
+
+    def __init__(self):
+        self._estados = {}
+        # pedido_id -> (status, início da etapa, restaurante_id) dos pedidos abertos
+        self._etapas_abertas = {}
+        self._lock = threading.Lock()
+
+    def limpar(self):
+        with self._lock:
+            self._estados.clear()
+            self._etapas_abertas.clear()
+
+    def _carregar(self, restaurante_id):
+        coordenadas = Restaurante.objects.filter(pk=restaurante_id).values_list('latitude', 'longitude').first()
+        estado = EstadoRestaurante(*(coordenadas or (None, None)))
+        fila = (
+            Pedido.objects.filter(restaurante_id=restaurante_id, status__in=Pedido.STATUS_ATIVOS)
+            .values_list('status').annotate(total=Count('id')).order_by()
+        )
+        estado.fila.update(dict(fila))
+
+        recentes = list(
+            PedidoEvento.objects.filter(restaurante_id=restaurante_id)
+            .order_by('-criado_em', '-id')
+            .values_list('pedido_id', 'status', 'criado_em')[:settings.ETA_AMOSTRAS]
+        )
+        # Cada par de eventos seguidos do mesmo pedido é uma amostra da etapa
+        # que começou no primeiro deles; aplica em ordem cronológica
+        recentes.sort(key=lambda evento: (evento[0], evento[2]))
+        amostras = []
+        for anterior, atual in zip(recentes, recentes[1:]):
+            if anterior[0] == atual[0] and anterior[1] in ETAPAS and atual[1] != 'Cancelado':
+                amostras.append((atual[2], ETAPAS[anterior[1]], _minutos_entre(anterior[2], atual[2])))
+        for _, etapa, minutos in sorted(amostras, key=lambda amostra: amostra[0]):
+            estado.medias[etapa].adicionar(minutos)
+        return estado
+
+    def _estado(self, restaurante_id):
+        with self._lock:
+            estado = self._estados.get(restaurante_id)
+        if estado is not None and time.monotonic() - estado.carregado_em < settings.ETA_RECARREGAR_SEGUNDOS:
+            return estado
+        estado = self._carregar(restaurante_id)
+        with self._lock:
+            self._estados[restaurante_id] = estado
+        return estado
+
+    def estimar(self, restaurante_id, latitude=None, longitude=None):
+        estado = self._estado(restaurante_id)
+        with self._lock:
+            aceite, var_aceite = estado.minutos('aceite')
+            preparo, var_preparo = estado.minutos('preparo')
+            deslocamento, var_deslocamento = estado.minutos('deslocamento')
+            a_frente = estado.fila['Pendente'] + estado.fila['Em preparação']
+
+        distancia = None
+        if None not in (latitude, longitude, estado.latitude, estado.longitude):
+            distancia = distancia_km(estado.latitude, estado.longitude, latitude, longitude)
+            deslocamento = settings.ETA_MINUTOS_RETIRADA + distancia / settings.ETA_VELOCIDADE_KMH * 60
+        fila = a_frente * preparo / settings.ETA_PEDIDOS_SIMULTANEOS
+
+        total = aceite + fila + preparo + deslocamento
+        desvio = math.sqrt(var_aceite + var_preparo + var_deslocamento)
+        minimo = max(1, round(total))
+        maximo = minimo + max(FAIXA_MINIMA_MINUTOS, math.ceil(DESVIOS_NA_FAIXA * desvio))
+        return Estimativa(minimo, maximo, distancia)
+
+    def registrar(self, eventos):
+        # eventos: [(pedido_id, restaurante_id ou None, status_anterior, status, momento)]
+        with self._lock:
+            sem_restaurante = [
+                evento[0] for evento in eventos if evento[1] is None and evento[0] not in self._etapas_abertas
+            ]
+        if sem_restaurante:
+            # Pedido aberto antes deste processo começar a acompanhar o restaurante
+            restaurantes = dict(Pedido.objects.filter(pk__in=sem_restaurante).values_list('id', 'restaurante_id'))
+            eventos = [(evento[0], evento[1] or restaurantes.get(evento[0]), *evento[2:]) for evento in eventos]
+        with self._lock:
+            for pedido_id, restaurante_id, anterior, status, momento in eventos:
+                aberta = self._etapas_abertas.pop(pedido_id, None)
+                if restaurante_id is None and aberta is not None:
+                    restaurante_id = aberta[2]
+                estado = self._estados.get(restaurante_id)
+                if estado is not None:
+                    if anterior in Pedido.STATUS_ATIVOS and estado.fila[anterior] > 0:
+                        estado.fila[anterior] -= 1
+                    if status in Pedido.STATUS_ATIVOS:
+                        estado.fila[status] += 1
+                    if aberta is not None and aberta[0] == anterior and status != 'Cancelado':
+                        estado.medias[ETAPAS[anterior]].adicionar(_minutos_entre(aberta[1], momento))
+                if status in ETAPAS and restaurante_id is not None:
+                    self._etapas_abertas[pedido_id] = (status, momento, restaurante_id)
+
+
+motor = MotorETA()
+
+
+def estimar(restaurante_id, latitude=None, longitude=None):
+    return motor.estimar(restaurante_id, latitude, longitude)
+
+
+def registrar_eventos(eventos):
+    """Atualiza as médias e a fila em memória depois do commit."""
+    eventos = list(eventos)
+    if eventos:
+        transaction.on_commit(lambda: motor.registrar(eventos))
@@ -0,0 +1,63 @@
+# core/facetas.py
+#
+# Contagens das facetas da vitrine ("Japonesa (42)", "Sobremesa (310)"),
+# guardadas em ContagemFaceta e atualizadas pelos signals a cada mudança:
+#
+# * tipo_cozinha: restaurantes de cada tipo. Cada restaurante conta uma vez,
+#   então basta somar ou subtrair 1 com um UPDATE atômico.
+# * categoria: restaurantes que têm ao menos um produto da categoria. Aqui um
+#   +1/-1 não funciona (o restaurante pode ter vários produtos da mesma
+#   categoria, e numa exclusão em cascata todos somem antes dos signals), então
+#   só o valor afetado é recontado, usando o índice (categoria, restaurante).
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import ContagemFaceta, Restaurante, Produto
+
+FACETAS = [faceta for faceta, _ in ContagemFaceta.FACETA_CHOICES]
+
+
+def ajustar_cozinha(valor, delta):
+    if not valor:
+        return
+    if delta > 0:
+        ContagemFaceta.objects.bulk_create(
+            [ContagemFaceta(faceta='tipo_cozinha', valor=valor, total=0)], ignore_conflicts=True
+        )
+        ContagemFaceta.objects.filter(faceta='tipo_cozinha', valor=valor).update(total=F('total') + delta)
+    else:
+        ContagemFaceta.objects.filter(faceta='tipo_cozinha', valor=valor, total__gte=-delta).update(
+            total=F('total') + delta
+        )
+
+
+def recontar_categoria(valor):
+    if not valor:
+        return
+    total = Produto.objects.filter(categoria=valor).values('restaurante_id').distinct().count()
+    ContagemFaceta.objects.bulk_create(
+        [ContagemFaceta(faceta='categoria', valor=valor, total=total)],
+        update_conflicts=True, unique_fields=['faceta', 'valor'], update_fields=['total'],
+    )
+
+
+def recalcular():
+    """Refaz todas as contagens do zero (backfill e correção de divergências)."""
+    cozinhas = Restaurante.objects.values('tipo_cozinha').annotate(total=Count('id'))
+    categorias = Produto.objects.values('categoria').annotate(total=Count('restaurante_id', distinct=True))
+    with transaction.atomic():
+        ContagemFaceta.objects.all().delete()
+        ContagemFaceta.objects.bulk_create(
+            [ContagemFaceta(faceta='tipo_cozinha', valor=c['tipo_cozinha'], total=c['total']) for c in cozinhas]
+            + [ContagemFaceta(faceta='categoria', valor=c['categoria'], total=c['total']) for c in categorias]
+        )
+
+
+def contagens():
+    # {"tipo_cozinha": [{"valor": "Japonesa", "total": 42}, ...], "categoria": [...]}
+    resultado = {faceta: [] for faceta in FACETAS}
+    linhas = ContagemFaceta.objects.filter(total__gt=0).order_by('faceta', '-total', 'valor')
+    for faceta, valor, total in linhas.values_list('faceta', 'valor', 'total'):
+        resultado[faceta].append({'valor': valor, 'total': total})
+    return resultado
@@ -1,5 +1,10 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.models import User
+from PIL import Image, ImageFile
+
+from .horarios import HorarioInvalido, intervalos_semana
+
 from .models import Cliente
 from .models import Restaurante, Produto
 
@@ -21,10 +26,74 @@ class RestauranteForm(forms.ModelForm):
     class Meta:
         model = Restaurante
         # O campo 'dono' será preenchido automaticamente pela view
-        fields = ['nome', 'endereco', 'horario_funcionamento', 'tipo_cozinha']
+        fields = ['nome', 'endereco', 'horario_funcionamento', 'tipo_cozinha', 'raio_entrega_km']
+        help_texts = {
+            'horario_funcionamento': 'Ex: 08:00-22:00 ou Seg-Sex 11:00-15:00; Sáb 18:00-02:00; Dom fechado',
+        }
+
+    def clean_horario_funcionamento(self):
+        # O filtro "aberto agora" depende de o texto poder ser interpretado
+        horario = self.cleaned_data['horario_funcionamento']
+        try:
+            intervalos_semana(horario)
+        except HorarioInvalido as e:
+            raise forms.ValidationError(str(e))
+        return horario
         
         
+# Quanto do arquivo pode ser lido procurando o cabeçalho da imagem
+LIMITE_CABECALHO_FOTO = 256 * 1024
+
+
+class FotoProdutoField(forms.ImageField):
+    """ImageField que valida a foto sem decodificar a imagem inteira.
+
+    O forms.ImageField padrão abre e verifica o arquivo todo na thread da
+    requisição. Aqui o tamanho é checado antes de ler qualquer byte e o
+    cabeçalho é lido em blocos até o Pillow descobrir formato e dimensões.
+    A decodificação de verdade fica com o worker de core/imagens.py.
+    """
+
+    def to_python(self, data):
+        # Pula o ImageField.to_python, que faz a verificação completa
+        arquivo = forms.FileField.to_python(self, data)
+        if arquivo is None:
+            return None
+
+        if arquivo.size > settings.PRODUTO_FOTO_MAX_BYTES:
+            limite = settings.PRODUTO_FOTO_MAX_BYTES // (1024 * 1024)
+            raise forms.ValidationError(f'A foto deve ter no máximo {limite} MB.', code='tamanho')
+
+        parser = ImageFile.Parser()
+        lidos = 0
+        try:
+            for bloco in arquivo.chunks(chunk_size=64 * 1024):
+                parser.feed(bloco)
+                lidos += len(bloco)
+                if parser.image is not None or lidos >= LIMITE_CABECALHO_FOTO:
+                    break
+        except (OSError, Image.DecompressionBombError):
+            parser.image = None
+        imagem = parser.image
+        if imagem is None or imagem.format not in settings.PRODUTO_FOTO_FORMATOS:
+            raise forms.ValidationError(self.error_messages['invalid_image'], code='invalid_image')
+
+        largura, altura = imagem.size
+        if max(largura, altura) > settings.PRODUTO_FOTO_MAX_LADO:
+            raise forms.ValidationError(
+                f'A foto deve ter no máximo {settings.PRODUTO_FOTO_MAX_LADO} pixels de lado.',
+                code='dimensoes',
+            )
+
+        arquivo.image = imagem
+        arquivo.content_type = Image.MIME.get(imagem.format)
+        arquivo.seek(0)
+        return arquivo
+
+
 class ProdutoForm(forms.ModelForm):
+    foto = FotoProdutoField(required=False)
+
     class Meta:
         model = Produto
         # O campo 'restaurante' será preenchido automaticamente pela view
@@ -0,0 +1,165 @@
+# core/geo.py
+#
+# Localização de restaurantes e clientes.
+#
+# Geocodificação: os endereços são texto livre, então as coordenadas são
+# preenchidas fora da requisição pelo comando geocodificar, usando a classe
+# configurada em settings.GEOCODIFICADOR:
+#
+# * 'core.geo.GeocodificadorFixture' (padrão): tabela local endereço ->
+#   coordenadas em JSON (settings.GEOCODIFICADOR_FIXTURE). Serve para
+#   desenvolvimento e testes, sem rede.
+# * 'core.geo.GeocodificadorNominatim': API do OpenStreetMap, respeitando o
+#   limite de uma requisição por segundo.
+#
+# Busca por proximidade: cada restaurante guarda a célula de uma grade fixa
+# de CELULA_GRAUS graus. Uma busca num raio calcula as células que cobrem a
+# caixa em volta do ponto e filtra por celula_geo IN (...) e pela própria
+# caixa, usando o índice. Os restaurantes que sobram são cortados pelo raio
+# de entrega e ordenados pela distância de haversine, tudo no SQL.
+
+import json
+import math
+import threading
+import time
+import unicodedata
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from django.utils.module_loading import import_string
+
+from .models import Restaurante
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU_LATITUDE = 111.32
+# ~5,5 km de lado no equador: um raio de 10 km cobre poucas células
+CELULA_GRAUS = 0.05
+_COLUNAS_GRADE = int(360 / CELULA_GRAUS)
+
+
+def _linha(latitude):
+    return int(math.floor((latitude + 90) / CELULA_GRAUS))
+
+
+def _coluna(longitude):
+    return int(math.floor((longitude + 180) / CELULA_GRAUS)) % _COLUNAS_GRADE
+
+
+def celula(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return _linha(latitude) * _COLUNAS_GRADE + _coluna(longitude)
+
+
+def caixa(latitude, longitude, raio_km):
+    # (lat_min, lat_max, lon_min, lon_max) que contém o círculo do raio
+    delta_lat = raio_km / KM_POR_GRAU_LATITUDE
+    cosseno = max(math.cos(math.radians(latitude)), 0.01)
+    delta_lon = min(raio_km / (KM_POR_GRAU_LATITUDE * cosseno), 180)
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def celulas_da_caixa(lat_min, lat_max, lon_min, lon_max):
+    linhas = range(_linha(max(lat_min, -90)), _linha(min(lat_max, 90)) + 1)
+    colunas = {_coluna(lon_min + i * CELULA_GRAUS) for i in range(int((lon_max - lon_min) / CELULA_GRAUS) + 1)}
+    colunas.add(_coluna(lon_max))
+    return [linha * _COLUNAS_GRADE + coluna for linha in linhas for coluna in colunas]
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def expressao_distancia(latitude, longitude):
+    """Haversine entre (latitude, longitude) e as colunas do Restaurante, em km."""
+    dlat = Radians(F('latitude') - Value(latitude)) / 2
+    dlon = Radians(F('longitude') - Value(longitude)) / 2
+    a = Power(Sin(dlat), 2) + Value(math.cos(math.radians(latitude))) * Cos(Radians(F('latitude'))) * Power(Sin(dlon), 2)
+    return Value(2 * RAIO_TERRA_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def _distancia_plana_quadrada(latitude, longitude):
+    # Aproximação equiretangular (km²) só com aritmética nativa do banco. Até o
+    # raio máximo de entrega ela difere do haversine em poucos metros, então
+    # serve para o corte pelo raio; o haversine (que no SQLite roda como função
+    # Python) fica só no SELECT, calculado uma vez por candidato, para ordenar.
+    km_por_grau_longitude = KM_POR_GRAU_LATITUDE * math.cos(math.radians(latitude))
+    dy = (F('latitude') - Value(latitude)) * Value(KM_POR_GRAU_LATITUDE)
+    dx = (F('longitude') - Value(longitude)) * Value(km_por_grau_longitude)
+    return ExpressionWrapper(dy * dy + dx * dx, output_field=FloatField())
+
+
+def proximos(queryset, latitude, longitude, raio_km=None):
+    """Restaurantes do queryset que entregam em (latitude, longitude), do mais perto.
+
+    raio_km limita a busca; por padrão vai até o maior raio de entrega
+    permitido. Cada restaurante vem anotado com distancia_km.
+    """
+    raio_km = min(raio_km or Restaurante.RAIO_ENTREGA_MAXIMO_KM, Restaurante.RAIO_ENTREGA_MAXIMO_KM)
+    lat_min, lat_max, lon_min, lon_max = caixa(latitude, longitude, raio_km)
+    queryset = queryset.filter(
+        celula_geo__in=celulas_da_caixa(lat_min, lat_max, lon_min, lon_max),
+        latitude__range=(lat_min, lat_max),
+    )
+    if lon_min >= -180 and lon_max <= 180:
+        queryset = queryset.filter(longitude__range=(lon_min, lon_max))
+    return (
+        queryset.alias(distancia_quadrada=_distancia_plana_quadrada(latitude, longitude))
+        .filter(distancia_quadrada__lte=raio_km * raio_km)
+        .filter(distancia_quadrada__lte=F('raio_entrega_km') * F('raio_entrega_km'))
+        .annotate(distancia_km=expressao_distancia(latitude, longitude))
+        .order_by('distancia_km', 'id')
+    )
+
+
+def normalizar_endereco(endereco):
+    sem_acentos = unicodedata.normalize('NFKD', endereco).encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acentos.lower().replace(',', ' ').split())
+
+
+class GeocodificadorFixture:
+
+    def __init__(self):
+        with open(settings.GEOCODIFICADOR_FIXTURE, encoding='utf-8') as arquivo:
+            enderecos = json.load(arquivo)
+        self._coordenadas = {normalizar_endereco(e): tuple(c) for e, c in enderecos.items()}
+
+    def geocodificar(self, endereco):
+        # (latitude, longitude) ou None se o endereço não for conhecido
+        return self._coordenadas.get(normalizar_endereco(endereco))
+
+
+class GeocodificadorNominatim:
+
+    URL = 'https://nominatim.openstreetmap.org/search'
+
+    def __init__(self):
+        self._ultima = 0.0
+        self._lock = threading.Lock()
+
+    def geocodificar(self, endereco):
+        with self._lock:
+            # Política de uso do Nominatim: no máximo uma requisição por segundo
+            espera = self._ultima + 1 - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self._ultima = time.monotonic()
+        parametros = urllib.parse.urlencode({'q': endereco, 'format': 'json', 'limit': 1, 'countrycodes': 'br'})
+        requisicao = urllib.request.Request(
+            f'{self.URL}?{parametros}', headers={'User-Agent': settings.GEOCODIFICADOR_USER_AGENT}
+        )
+        with urllib.request.urlopen(requisicao, timeout=10) as resposta:
+            resultados = json.load(resposta)
+        if not resultados:
+            return None
+        return float(resultados[0]['lat']), float(resultados[0]['lon'])
+
+
+def obter_geocodificador():
+    return import_string(settings.GEOCODIFICADOR)()
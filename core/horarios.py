@@ -0,0 +1,158 @@
+# core/horarios.py
+#
+# Interpreta o texto livre de Restaurante.horario_funcionamento e grava os
+# intervalos em HorarioFuncionamento (dia da semana + minutos desde a
+# meia-noite), para que "aberto agora" seja um filtro SQL indexado.
+#
+# Formatos aceitos (sem diferenciar maiúsculas nem acentos):
+#
+#   08:00-22:00                       todos os dias
+#   Seg-Sex 08:00-18:00; Sáb 10h-14h  dias específicos, separados por ';'
+#   Seg-Sex: 08:00–18:00              ':' depois dos dias, travessão
+#   Ter a Dom 11:30-15:00 e 18:00-23:00
+#   Sex-Sáb 18:00-02:00               atravessa a meia-noite
+#   24h / Dom fechado
+#
+# Um intervalo que passa da meia-noite vira dois: até 24:00 no dia em que
+# abre e a partir de 00:00 no dia seguinte.
+
+import re
+import unicodedata
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import HorarioFuncionamento
+
+MINUTOS_NO_DIA = 24 * 60
+
+# Segunda = 0, como em datetime.weekday()
+DIAS = {'seg': 0, 'ter': 1, 'qua': 2, 'qui': 3, 'sex': 4, 'sab': 5, 'dom': 6}
+TODOS_OS_DIAS = tuple(range(7))
+
+_HORA = r'(\d{1,2})(?:[:h](\d{2})?)?'
+_INTERVALO = re.compile(rf'{_HORA}\s*(?:-|as|a|ate)\s*{_HORA}')
+_DIA = r'(seg|ter|qua|qui|sex|sab|dom)[a-z]*(?:-feira)?\.?'
+_DIAS = re.compile(rf'{_DIA}(?:\s*(-|a|ate)\s*{_DIA})?')
+_MARCADOR = re.compile(r'(?:^|\s)(fechado|24 ?h|24 horas)$')
+_SEPARADORES = re.compile(r'(?:[\s,/&+]|\be\b)*')
+
+
+class HorarioInvalido(ValueError):
+    pass
+
+
+def _so_separadores(texto):
+    return _SEPARADORES.fullmatch(texto) is not None
+
+
+def _normalizar(texto):
+    # Travessões colados de outros lugares viram hífen antes de descartar o
+    # que não é ASCII, senão "08:00–22:00" perderia o separador
+    texto = texto.replace('–', '-').replace('—', '-')
+    sem_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acentos.lower().split())
+
+
+def _minutos(hora, minuto):
+    hora, minuto = int(hora), int(minuto or 0)
+    if hora > 24 or minuto > 59 or (hora == 24 and minuto):
+        raise HorarioInvalido(f'Hora inválida: {hora:02d}:{minuto:02d}')
+    return hora * 60 + minuto
+
+
+def _dias(texto):
+    # "seg-sex", "ter a dom", "sab, dom:" -> (0, 1, 2, 3, 4) ...
+    texto = texto.removesuffix(':').rstrip()
+    if not texto or texto in ('todos os dias', 'diariamente', 'diario'):
+        return TODOS_OS_DIAS
+    dias = []
+    posicao = 0
+    for encontrado in _DIAS.finditer(texto):
+        if not _so_separadores(texto[posicao:encontrado.start()]):
+            raise HorarioInvalido(f'Dias inválidos: {texto}')
+        inicio = DIAS[encontrado.group(1)]
+        fim = DIAS[encontrado.group(3)] if encontrado.group(3) else inicio
+        # Faixa que dá a volta na semana, como "sex a seg"
+        dias += [(inicio + i) % 7 for i in range((fim - inicio) % 7 + 1)]
+        posicao = encontrado.end()
+    if not dias or not _so_separadores(texto[posicao:]):
+        raise HorarioInvalido(f'Dias inválidos: {texto}')
+    return tuple(dict.fromkeys(dias))
+
+
+def _trecho(texto):
+    # Um trecho é "[dias] intervalo [e intervalo...]" ou "[dias] fechado/24h"
+    intervalos = list(_INTERVALO.finditer(texto))
+    if not intervalos:
+        marcador = _MARCADOR.search(texto)
+        if marcador is None:
+            raise HorarioInvalido(f'Nenhum horário encontrado em "{texto}"')
+        faixas = [] if marcador.group(1) == 'fechado' else [(0, MINUTOS_NO_DIA)]
+        return _dias(texto[:marcador.start()].strip()), faixas
+    dias = _dias(texto[:intervalos[0].start()].strip())
+    faixas = []
+    for i, intervalo in enumerate(intervalos):
+        if i and not _so_separadores(texto[intervalos[i - 1].end():intervalo.start()]):
+            raise HorarioInvalido(f'Horário inválido: {texto}')
+        abre = _minutos(intervalo.group(1), intervalo.group(2))
+        fecha = _minutos(intervalo.group(3), intervalo.group(4))
+        faixas.append((abre, fecha))
+    if not _so_separadores(texto[intervalos[-1].end():]):
+        raise HorarioInvalido(f'Horário inválido: {texto}')
+    return dias, faixas
+
+
+def intervalos_semana(texto):
+    """Converte o texto em [(dia_semana, abre, fecha), ...] em minutos.
+
+    Levanta HorarioInvalido se o texto não puder ser interpretado.
+    """
+    normalizado = _normalizar(texto)
+    if not normalizado:
+        raise HorarioInvalido('Horário vazio')
+    intervalos = set()
+    for trecho in filter(None, (t.strip() for t in re.split(r'[;|\n]', normalizado))):
+        dias, faixas = _trecho(trecho)
+        for dia in dias:
+            for abre, fecha in faixas:
+                if fecha == abre:
+                    # "00:00-00:00": aberto o dia inteiro
+                    intervalos.add((dia, 0, MINUTOS_NO_DIA))
+                elif fecha > abre:
+                    intervalos.add((dia, abre, fecha))
+                else:
+                    intervalos.add((dia, abre, MINUTOS_NO_DIA))
+                    if fecha:
+                        intervalos.add(((dia + 1) % 7, 0, fecha))
+    return sorted(intervalos)
+
+
+def atualizar_horarios(restaurante_id, texto):
+    """Regrava os intervalos de um restaurante. Texto inválido = nunca aberto."""
+    try:
+        intervalos = intervalos_semana(texto)
+    except HorarioInvalido:
+        intervalos = []
+    HorarioFuncionamento.objects.filter(restaurante_id=restaurante_id).delete()
+    HorarioFuncionamento.objects.bulk_create([
+        HorarioFuncionamento(restaurante_id=restaurante_id, dia_semana=dia, abre=abre, fecha=fecha)
+        for dia, abre, fecha in intervalos
+    ])
+
+
+def momento_local(momento=None):
+    # Os horários são cadastrados na hora local dos restaurantes, não em UTC
+    momento = momento or timezone.now()
+    local = momento.astimezone(ZoneInfo(settings.RESTAURANTES_FUSO_HORARIO))
+    return local.weekday(), local.hour * 60 + local.minute
+
+
+def filtro_aberto(momento=None):
+    """Expressão EXISTS para filtrar Restaurante pelos que estão abertos."""
+    dia, minuto = momento_local(momento)
+    return Exists(HorarioFuncionamento.objects.filter(
+        restaurante_id=OuterRef('pk'), dia_semana=dia, abre__lte=minuto, fecha__gt=minuto,
+    ))
@@ -0,0 +1,203 @@
+# core/imagens.py
+#
+# Versões reduzidas das fotos de produto. Quando um Produto é salvo com foto
+# nova, o signal agenda gerar_rendicoes(), que roda num pool de threads depois
+# do commit: o upload responde logo e o Pillow trabalha fora da requisição.
+#
+# Cada versão (thumb, card, full) é gravada em WebP e JPEG com o hash do
+# conteúdo no nome do arquivo. Assim as URLs podem ser servidas com cache
+# "imutável": se a foto mudar, o nome muda junto.
+#
+# Os arquivos que deixam de ser usados (foto trocada ou produto excluído) são
+# apagados pelo mesmo pool, também depois do commit.
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .cardapio import cardapio_alterado
+from .models import Produto, Restaurante
+
+logger = logging.getLogger(__name__)
+
+# Nome da versão -> maior lado em pixels (a imagem nunca é ampliada)
+RENDICOES = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1200,
+}
+# Formato -> (formato do Pillow, extensão, opções de gravação)
+FORMATOS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+PASTA_DERIVADAS = 'produtos_fotos/derivadas/'
+
+
+def _abrir_original(nome):
+    with default_storage.open(nome, 'rb') as arquivo:
+        imagem = Image.open(arquivo)
+        imagem.load()
+    # Fotos de celular costumam vir deitadas com a rotação só no EXIF
+    imagem = ImageOps.exif_transpose(imagem)
+    if imagem.mode in ('RGBA', 'LA', 'P'):
+        # JPEG não tem transparência: aplica o fundo branco do cardápio
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+
+def _gravar(conteudo, base, rendicao, extensao):
+    resumo = hashlib.sha256(conteudo).hexdigest()[:16]
+    nome = f'{PASTA_DERIVADAS}{base}.{rendicao}.{resumo}.{extensao}'
+    # Mesmo hash = mesmo conteúdo: não precisa gravar de novo
+    if default_storage.exists(nome):
+        return nome
+    return default_storage.save(nome, ContentFile(conteudo))
+
+
+def gerar_rendicoes(produto_id):
+    """Gera as versões da foto atual do produto e grava em fotos_derivadas.
+
+    Devolve o dicionário gravado, ou None se o produto não tiver foto ou se a
+    foto tiver sido trocada enquanto as versões eram geradas.
+    """
+    produto = Produto.objects.filter(pk=produto_id).values('foto', 'restaurante_id', 'fotos_derivadas').first()
+    if not produto or not produto['foto']:
+        return None
+    original = produto['foto']
+    imagem = _abrir_original(original)
+    base = os.path.splitext(os.path.basename(original))[0]
+
+    derivadas = {}
+    for rendicao, lado in RENDICOES.items():
+        copia = imagem.copy()
+        copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        derivadas[rendicao] = {}
+        for formato, (formato_pil, extensao, opcoes) in FORMATOS.items():
+            buffer = io.BytesIO()
+            copia.save(buffer, formato_pil, **opcoes)
+            derivadas[rendicao][formato] = _gravar(buffer.getvalue(), base, rendicao, extensao)
+
+    # UPDATE condicional: se a foto mudou no meio do caminho, o resultado já é
+    # velho e a geração agendada para a foto nova é quem vale.
+    if not Produto.objects.filter(pk=produto_id, foto=original).update(fotos_derivadas=derivadas):
+        return None
+    cardapio_alterado(produto['restaurante_id'])
+    remover_arquivos(set(arquivos_derivados(produto['fotos_derivadas'])) - set(arquivos_derivados(derivadas)))
+    return derivadas
+
+
+def arquivos_derivados(derivadas):
+    for arquivos in (derivadas or {}).values():
+        yield from arquivos.values()
+
+
+def _versoes_em_uso(nomes):
+    # O nome das versões vem do conteúdo: dois produtos com a mesma foto
+    # compartilham os mesmos arquivos, que só podem sair quando ninguém mais
+    # os referencia (nem a capa de algum restaurante)
+    if not nomes:
+        return set()
+    em_uso = set()
+    for modelo, campo in ((Produto, 'fotos_derivadas'), (Restaurante, 'capa_derivadas')):
+        filtro = Q()
+        for rendicao in RENDICOES:
+            for formato in FORMATOS:
+                filtro |= Q(**{f'{campo}__{rendicao}__{formato}__in': nomes})
+        for derivadas in modelo.objects.filter(filtro).values_list(campo, flat=True):
+            em_uso.update(arquivos_derivados(derivadas))
+    return em_uso
+
+
+def _remover(nomes):
+    # Um original pode ter sido reaproveitado por outro produto nesse meio tempo
+    em_uso = set(Produto.objects.filter(foto__in=nomes).values_list('foto', flat=True))
+    em_uso |= _versoes_em_uso([nome for nome in nomes if nome.startswith(PASTA_DERIVADAS)])
+    for nome in nomes:
+        if nome in em_uso:
+            continue
+        try:
+            default_storage.delete(nome)
+        except OSError:
+            logger.warning('Não foi possível apagar %s', nome, exc_info=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _obter_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGENS_WORKERS, thread_name_prefix='rendicoes'
+            )
+        return _executor
+
+
+def _gerar_em_segundo_plano(produto_id):
+    try:
+        gerar_rendicoes(produto_id)
+    except Exception:
+        logger.exception('Falha ao gerar as versões da foto do produto %s', produto_id)
+    finally:
+        # Cada thread do pool abre a própria conexão; não deixa ela pendurada
+        connections.close_all()
+
+
+def agendar_rendicoes(produto_id):
+    """Agenda a geração das versões para depois do commit da transação atual."""
+
+    def agendar():
+        if settings.IMAGENS_SINCRONO:
+            gerar_rendicoes(produto_id)
+        else:
+            _obter_executor().submit(_gerar_em_segundo_plano, produto_id)
+
+    transaction.on_commit(agendar)
+
+
+def _remover_em_segundo_plano(nomes):
+    try:
+        _remover(nomes)
+    except Exception:
+        logger.exception('Falha ao apagar arquivos de fotos: %s', nomes)
+    finally:
+        connections.close_all()
+
+
+def remover_arquivos(nomes):
+    """Apaga do storage, depois do commit, arquivos que deixaram de ser usados."""
+    nomes = [nome for nome in nomes if nome]
+    if not nomes:
+        return
+
+    def agendar():
+        if settings.IMAGENS_SINCRONO:
+            _remover(nomes)
+        else:
+            _obter_executor().submit(_remover_em_segundo_plano, nomes)
+
+    transaction.on_commit(agendar)
+
+
+def urls_derivadas(derivadas):
+    # {"thumb": {"webp": "<arquivo>"}} -> {"thumb": {"webp": "<url>"}}
+    return {
+        rendicao: {formato: default_storage.url(nome) for formato, nome in arquivos.items()}
+        for rendicao, arquivos in (derivadas or {}).items()
+    }
@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.busca import buscar, reindexar
+from core.models import Restaurante, Produto
+
+PRATOS = [
+    'Pizza', 'Lasanha', 'Feijoada', 'Moqueca', 'Açaí', 'Pão de Queijo', 'Coxinha', 'Pastel',
+    'Hambúrguer', 'Temaki', 'Yakisoba', 'Strogonoff', 'Parmegiana', 'Tapioca', 'Brigadeiro', 'Escondidinho',
+]
+INGREDIENTES = [
+    'frango', 'carne', 'calabresa', 'queijo', 'camarão', 'salmão', 'palmito', 'banana',
+    'chocolate', 'mandioca', 'catupiry', 'bacon', 'cebola', 'tomate', 'manjericão', 'limão',
+]
+CATEGORIAS = ['Prato Principal', 'Entrada', 'Sobremesa', 'Bebida', 'Lanche']
+COZINHAS = ['Brasileira', 'Italiana', 'Japonesa', 'Nordestina', 'Árabe', 'Lanches', 'Doces']
+CONSULTAS = ['acai', 'pizza calab', 'frango catup', 'camarao', 'sobrem', 'japon', 'pao de queijo']
+
+
+def busca_like(texto, limite):
+    # O que o cliente faria sem índice: LIKE em todas as colunas, sem ranking
+    restaurantes = Restaurante.objects.filter(Q(nome__icontains=texto) | Q(tipo_cozinha__icontains=texto))
+    produtos = Produto.objects.filter(
+        Q(nome__icontains=texto) | Q(descricao__icontains=texto) | Q(categoria__icontains=texto)
+    )
+    return list(restaurantes.values_list('id', flat=True)[:limite]) + list(produtos.values_list('id', flat=True)[:limite])
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark da busca textual (core.busca) contra LIKE sobre um catálogo sintético. '
+        'Roda numa transação desfeita no final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=100_000)
+        parser.add_argument('--restaurantes', type=int, default=1000)
+        parser.add_argument('--repeticoes', type=int, default=50)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(42)
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-busca')
+            restaurantes = Restaurante.objects.bulk_create([
+                Restaurante(
+                    dono=user, nome=f'{aleatorio.choice(PRATOS)} do {i}', endereco='-',
+                    horario_funcionamento='00:00-23:59', tipo_cozinha=aleatorio.choice(COZINHAS),
+                )
+                for i in range(options['restaurantes'])
+            ])
+            produtos = (
+                Produto(
+                    restaurante=aleatorio.choice(restaurantes),
+                    nome=f'{aleatorio.choice(PRATOS)} de {aleatorio.choice(INGREDIENTES)}',
+                    descricao=' '.join(aleatorio.choices(INGREDIENTES, k=8)),
+                    preco='29.90',
+                    categoria=aleatorio.choice(CATEGORIAS),
+                )
+                for _ in range(options['produtos'])
+            )
+            Produto.objects.bulk_create(produtos, batch_size=5000)
+
+            inicio = time.perf_counter()
+            reindexar()
+            self.stdout.write(f'reindexar: {time.perf_counter() - inicio:.2f} s para {options["produtos"]} produtos')
+
+            for consulta in CONSULTAS:
+                linha = [f'{consulta!r:>16}']
+                for nome, funcao in (('fts5', buscar), ('like', busca_like)):
+                    inicio = time.perf_counter()
+                    for _ in range(options['repeticoes']):
+                        funcao(consulta, 20)
+                    duracao = (time.perf_counter() - inicio) / options['repeticoes']
+                    linha.append(f'{nome} {duracao * 1000:7.2f} ms')
+                self.stdout.write('  '.join(linha))
+            transaction.set_rollback(True)
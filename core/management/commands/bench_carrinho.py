@@ -0,0 +1,72 @@
+import random
+import time
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.carrinho import obter_carrinho
+from core.models import Restaurante, Produto
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara os backends de carrinho (sessao x modelo): escritas no banco e '
+        'bytes gravados em django_session por operação. Roda dentro de uma '
+        'transação desfeita no final, sem deixar dados para trás.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operacoes', type=int, default=500)
+        parser.add_argument('--produtos', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-carrinho')
+            restaurante = Restaurante.objects.create(
+                dono=user, nome='Bench', endereco='-', horario_funcionamento='00:00-23:59', tipo_cozinha='-'
+            )
+            produtos = Produto.objects.bulk_create([
+                Produto(restaurante=restaurante, nome=f'P{i}', descricao='', preco='1.00', categoria='-')
+                for i in range(options['produtos'])
+            ])
+            for backend in ('sessao', 'modelo'):
+                self.medir(backend, user, produtos, options)
+            transaction.set_rollback(True)
+
+    def medir(self, backend, user, produtos, options):
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        sessao = SessionStore()
+        sessao.create()
+        rng = random.Random(options['seed'])
+        escritas = bytes_sessao = 0
+
+        with override_settings(CARRINHO_BACKEND=backend):
+            inicio = time.perf_counter()
+            for _ in range(options['operacoes']):
+                # Simula um ciclo de requisição: carrega a sessão, altera o
+                # carrinho e salva a sessão só se ela foi modificada.
+                request = SimpleNamespace(session=SessionStore(sessao.session_key), user=user)
+                with CaptureQueriesContext(connection) as consultas:
+                    obter_carrinho(request).adicionar(rng.choice(produtos).id)
+                    if request.session.modified:
+                        request.session.save()
+                for consulta in consultas.captured_queries:
+                    sql = consulta['sql'].lstrip().upper()
+                    if sql.startswith(('INSERT', 'UPDATE', 'DELETE')):
+                        escritas += 1
+                        if 'DJANGO_SESSION' in sql:
+                            bytes_sessao += len(consulta['sql'])
+            duracao = time.perf_counter() - inicio
+
+        n = options['operacoes']
+        self.stdout.write(
+            f'{backend:>7}: {escritas / n:.2f} escritas/op, '
+            f'{bytes_sessao / n:.0f} bytes em django_session/op, '
+            f'{duracao / n * 1000:.3f} ms/op'
+        )
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from core.geo import celula, expressao_distancia, proximos
+from core.models import Restaurante
+
+# Pontos de consulta espalhados pela Grande São Paulo
+PONTOS = [(-23.5614, -46.6559), (-23.6104, -46.6672), (-23.5026, -46.6252), (-23.6500, -46.5300)]
+
+
+def varredura_completa(latitude, longitude, limite):
+    # Sem pré-filtro: calcula a distância de todos os restaurantes
+    return list(
+        Restaurante.objects.filter(latitude__isnull=False)
+        .annotate(distancia_km=expressao_distancia(latitude, longitude))
+        .filter(distancia_km__lte=F('raio_entrega_km'))
+        .order_by('distancia_km', 'id')
+        .values_list('id', flat=True)[:limite]
+    )
+
+
+def com_grade(latitude, longitude, limite):
+    return list(proximos(Restaurante.objects.all(), latitude, longitude).values_list('id', flat=True)[:limite])
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark da busca por proximidade (core.geo.proximos) contra uma varredura completa. '
+        'Roda numa transação desfeita no final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurantes', type=int, default=50_000)
+        parser.add_argument('--repeticoes', type=int, default=20)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(42)
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-geo')
+            restaurantes = []
+            for i in range(options['restaurantes']):
+                # 80% na Grande São Paulo, o resto espalhado pelo Brasil
+                if aleatorio.random() < 0.8:
+                    latitude, longitude = aleatorio.gauss(-23.55, 0.25), aleatorio.gauss(-46.63, 0.25)
+                else:
+                    latitude, longitude = aleatorio.uniform(-33, 5), aleatorio.uniform(-73, -35)
+                restaurantes.append(Restaurante(
+                    dono=user, nome=f'Restaurante {i}', endereco='-', horario_funcionamento='00:00-23:59',
+                    tipo_cozinha='-', latitude=latitude, longitude=longitude,
+                    celula_geo=celula(latitude, longitude), raio_entrega_km=aleatorio.choice([3, 5, 8, 12]),
+                ))
+            Restaurante.objects.bulk_create(restaurantes, batch_size=5000)
+
+            for nome, funcao in (('varredura', varredura_completa), ('grade', com_grade)):
+                with CaptureQueriesContext(connection) as consultas:
+                    funcao(*PONTOS[0], 50)
+                plano = connection.ops.explain_query_prefix()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{plano} {consultas[0]["sql"]}')
+                    detalhes = '; '.join(str(linha[-1]) for linha in cursor.fetchall())
+                inicio = time.perf_counter()
+                for _ in range(options['repeticoes']):
+                    for ponto in PONTOS:
+                        funcao(*ponto, 50)
+                duracao = (time.perf_counter() - inicio) / (options['repeticoes'] * len(PONTOS))
+                self.stdout.write(f'{nome:>10}: {duracao * 1000:7.2f} ms/consulta  [{detalhes}]')
+
+            for ponto in PONTOS:
+                if varredura_completa(*ponto, 50) != com_grade(*ponto, 50):
+                    self.stderr.write(f'Resultados diferentes para {ponto}')
+            transaction.set_rollback(True)
@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.carrinho import precificar_carrinho
+from core.models import Restaurante, Produto
+
+
+def precificar_legado(itens):
+    # Como as views faziam antes: instâncias completas de Produto e soma
+    # começando de um int
+    valor_total = 0
+    linhas = []
+    for produto in Produto.objects.filter(id__in=itens.keys()):
+        quantidade = itens[str(produto.id)]
+        subtotal = produto.preco * quantidade
+        linhas.append({'produto': produto, 'quantidade': quantidade, 'subtotal': subtotal})
+        valor_total += subtotal
+    return linhas, valor_total
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmark da precificação do carrinho: compara o loop antigo com '
+        'core.carrinho.precificar_carrinho. Roda numa transação desfeita no final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--itens', type=int, default=20, help='Produtos distintos no carrinho.')
+        parser.add_argument('--repeticoes', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-precificacao')
+            restaurante = Restaurante.objects.create(
+                dono=user, nome='Bench', endereco='-', horario_funcionamento='00:00-23:59', tipo_cozinha='-'
+            )
+            produtos = Produto.objects.bulk_create([
+                Produto(
+                    restaurante=restaurante, nome=f'Produto {i}', descricao='x' * 500,
+                    preco='19.90', categoria='-',
+                )
+                for i in range(options['itens'])
+            ])
+            itens = {str(p.id): 1 + i % 3 for i, p in enumerate(produtos)}
+
+            for nome, funcao in (('legado', precificar_legado), ('precificar_carrinho', precificar_carrinho)):
+                with CaptureQueriesContext(connection) as consultas:
+                    funcao(itens)
+                inicio = time.perf_counter()
+                for _ in range(options['repeticoes']):
+                    funcao(itens)
+                duracao = time.perf_counter() - inicio
+                self.stdout.write(
+                    f'{nome:>20}: {duracao / options["repeticoes"] * 1e6:.1f} µs/chamada, '
+                    f'{len(consultas)} consulta(s)'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Cliente, Restaurante, Pedido
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara N POSTs individuais de mudança de status com uma única chamada '
+        'em lote na API. Roda numa transação desfeita no final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=100)
+
+    def handle(self, *args, **options):
+        n = options['pedidos']
+        with transaction.atomic():
+            dono = User.objects.create_user(username='bench-status')
+            Cliente.objects.create(user=dono, telefone='-', endereco='-', tipo_usuario='RESTAURANTE')
+            restaurante = Restaurante.objects.create(
+                dono=dono, nome='Bench', endereco='-', horario_funcionamento='00:00-23:59', tipo_cozinha='-'
+            )
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(dono)
+
+            pedidos = Pedido.objects.bulk_create([Pedido(restaurante=restaurante) for _ in range(n)])
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                for pedido in pedidos:
+                    client.post(
+                        reverse('api_pedido_status', args=[pedido.id]),
+                        {'status_atual': 'Pendente', 'novo_status': 'Em preparação'},
+                        content_type='application/json',
+                    )
+                individual = time.perf_counter() - inicio
+            self.stdout.write(f'{n} POSTs individuais: {individual * 1000:.1f} ms, {len(consultas)} consultas')
+
+            pedidos = Pedido.objects.bulk_create([Pedido(restaurante=restaurante) for _ in range(n)])
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                client.post(
+                    reverse('api_pedidos_status_em_lote'),
+                    {'pedido_ids': [p.id for p in pedidos], 'novo_status': 'Em preparação'},
+                    content_type='application/json',
+                )
+                lote = time.perf_counter() - inicio
+            self.stdout.write(f'1 chamada em lote:      {lote * 1000:.1f} ms, {len(consultas)} consultas')
+            transaction.set_rollback(True)
@@ -0,0 +1,49 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.despacho import despachar
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker do despacho: a cada intervalo agrupa as entregas prontas em rotas de '
+        'entregadores livres (ver core/despacho.py). Rode uma única instância.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float, default=settings.DESPACHO_INTERVALO_SEGUNDOS,
+            help='Segundos entre um ciclo e o próximo.',
+        )
+        parser.add_argument('--uma-vez', action='store_true', help='Roda um ciclo só e termina.')
+
+    def ciclo(self):
+        inicio = time.perf_counter()
+        rotas = despachar()
+        if rotas:
+            self.stdout.write(
+                f'{len(rotas)} rota(s) criada(s) em {(time.perf_counter() - inicio) * 1000:.0f} ms.'
+            )
+        return rotas
+
+    def handle(self, *args, **options):
+        if options['uma_vez']:
+            self.ciclo()
+            return
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    self.ciclo()
+                except Exception:
+                    # Um ciclo com erro não derruba o worker; o próximo tenta de novo
+                    logger.exception('Falha no ciclo de despacho')
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Despacho encerrado.')
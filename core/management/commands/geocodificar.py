@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from core.geo import celula, normalizar_endereco, obter_geocodificador
+from core.models import Cliente, Restaurante
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche latitude/longitude de restaurantes e clientes a partir do endereço, '
+        'usando o geocodificador de settings.GEOCODIFICADOR.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Geocodifica de novo também quem já tem coordenadas.',
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Registros gravados por UPDATE.')
+
+    def geocodificar(self, modelo, geocodificador, cache, options):
+        registros = modelo.objects.exclude(endereco='')
+        if not options['todos']:
+            registros = registros.filter(latitude__isnull=True)
+        campos = ['latitude', 'longitude'] + (['celula_geo'] if modelo is Restaurante else [])
+
+        pendentes = []
+        encontrados = nao_encontrados = 0
+        # Lê tudo antes de gravar: no SQLite, atualizar a tabela enquanto um
+        # cursor ainda percorre a mesma tabela pode repetir ou pular linhas
+        for registro_id, endereco in list(registros.values_list('id', 'endereco')):
+            # Endereços repetidos não vão de novo ao geocodificador
+            chave = normalizar_endereco(endereco)
+            if chave not in cache:
+                cache[chave] = geocodificador.geocodificar(endereco)
+            coordenadas = cache[chave]
+            if coordenadas is None:
+                nao_encontrados += 1
+                continue
+            registro = modelo(id=registro_id, latitude=coordenadas[0], longitude=coordenadas[1])
+            if modelo is Restaurante:
+                registro.celula_geo = celula(*coordenadas)
+            pendentes.append(registro)
+            encontrados += 1
+            if len(pendentes) >= options['lote']:
+                modelo.objects.bulk_update(pendentes, campos)
+                pendentes = []
+        modelo.objects.bulk_update(pendentes, campos)
+        self.stdout.write(
+            f'{modelo._meta.verbose_name_plural}: {encontrados} geocodificado(s), '
+            f'{nao_encontrados} endereço(s) não encontrado(s).'
+        )
+
+    def handle(self, *args, **options):
+        geocodificador = obter_geocodificador()
+        cache = {}
+        for modelo in (Restaurante, Cliente):
+            self.geocodificar(modelo, geocodificador, cache, options)
+        self.stdout.write(self.style.SUCCESS('Geocodificação concluída.'))
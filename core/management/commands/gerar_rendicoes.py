@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.imagens import gerar_rendicoes
+from core.models import Produto
+
+
+class Command(BaseCommand):
+    help = 'Gera as versões reduzidas (thumb, card, full) das fotos de produto que ainda não têm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Regera também as fotos que já têm versões (ex.: depois de mudar os tamanhos).',
+        )
+
+    def handle(self, *args, **options):
+        produtos = Produto.objects.exclude(foto='').exclude(foto__isnull=True)
+        if not options['todos']:
+            produtos = produtos.filter(fotos_derivadas={})
+        geradas = 0
+        for produto_id in produtos.values_list('id', flat=True).iterator():
+            try:
+                if gerar_rendicoes(produto_id):
+                    geradas += 1
+            except OSError as e:
+                self.stderr.write(f'Produto {produto_id}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Versões geradas para {geradas} produto(s).'))
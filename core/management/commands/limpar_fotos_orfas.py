@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.imagens import arquivos_derivados
+from core.models import Produto, Restaurante
+
+PASTA_FOTOS = 'produtos_fotos'
+
+
+class Command(BaseCommand):
+    help = 'Apaga os arquivos de produtos_fotos/ que nenhum produto ou restaurante referencia mais.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutos', type=int, default=60,
+            help='Idade mínima (em minutos) dos arquivos apagados, para não pegar uploads em andamento.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Só lista os arquivos órfãos, sem apagar.',
+        )
+
+    def arquivos_no_storage(self, pasta):
+        try:
+            subpastas, arquivos = default_storage.listdir(pasta)
+        except FileNotFoundError:
+            return
+        for arquivo in arquivos:
+            yield f'{pasta}/{arquivo}'
+        for subpasta in subpastas:
+            yield from self.arquivos_no_storage(f'{pasta}/{subpasta}')
+
+    def arquivos_em_uso(self):
+        # Três consultas, independente de quantos produtos existam
+        em_uso = set(Produto.objects.exclude(foto='').values_list('foto', flat=True))
+        em_uso.update(Restaurante.objects.exclude(foto_capa='').values_list('foto_capa', flat=True))
+        for derivadas in Produto.objects.exclude(fotos_derivadas={}).values_list('fotos_derivadas', flat=True).iterator():
+            em_uso.update(arquivos_derivados(derivadas))
+        em_uso.discard(None)
+        return em_uso
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(minutes=options['minutos'])
+        # Lista o storage antes de ler o banco: um arquivo gravado no meio do
+        # caminho não aparece na listagem, e não corre o risco de ser apagado
+        candidatos = list(self.arquivos_no_storage(PASTA_FOTOS))
+        em_uso = self.arquivos_em_uso()
+
+        removidos = 0
+        for nome in candidatos:
+            if nome in em_uso or default_storage.get_modified_time(nome) > limite:
+                continue
+            if options['dry_run']:
+                self.stdout.write(nome)
+            else:
+                default_storage.delete(nome)
+            removidos += 1
+
+        acao = 'encontrado(s)' if options['dry_run'] else 'removido(s)'
+        self.stdout.write(self.style.SUCCESS(f'{removidos} arquivo(s) órfão(s) {acao}.'))
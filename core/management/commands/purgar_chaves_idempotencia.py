@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = 'Remove em lote as chaves de idempotência do checkout que já expiraram.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int, default=settings.IDEMPOTENCY_KEY_TTL_HORAS,
+            help='Idade mínima (em horas) das chaves removidas.',
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(hours=options['horas'])
+        # Sem cascatas nem signals, o Django resolve isso com um único DELETE
+        # usando o índice de criado_em
+        removidas, _ = ChaveIdempotencia.objects.filter(criado_em__lt=limite).delete()
+        self.stdout.write(self.style.SUCCESS(f'{removidas} chave(s) de idempotência removida(s).'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.avaliacoes import recalcular
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero a nota média e o total de avaliações de todos os restaurantes.'
+
+    def handle(self, *args, **options):
+        # Necessário depois de gravações em massa que não disparam signals
+        # (bulk_create, update) nas avaliações
+        recalcular()
+        self.stdout.write(self.style.SUCCESS('Agregados das avaliações recalculados.'))
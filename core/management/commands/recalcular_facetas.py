@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.facetas import recalcular
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero as contagens das facetas (tipo de cozinha e categoria).'
+
+    def handle(self, *args, **options):
+        # Necessário depois de gravações em massa que não disparam signals
+        # (bulk_create, update) nos restaurantes ou produtos
+        recalcular()
+        self.stdout.write(self.style.SUCCESS('Contagens das facetas recalculadas.'))
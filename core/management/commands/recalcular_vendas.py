@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.vendas import recalcular
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero os rollups diários de vendas a partir dos pedidos e itens.'
+
+    def handle(self, *args, **options):
+        # Backfill do histórico e correção depois de gravações que não passam
+        # por core/vendas.py (pedidos excluídos, itens alterados no admin)
+        recalcular()
+        self.stdout.write(self.style.SUCCESS('Rollups de vendas recalculados.'))
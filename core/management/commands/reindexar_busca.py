@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.busca import BuscaIndisponivel, reindexar
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual (FTS5) de restaurantes e produtos.'
+
+    def handle(self, *args, **options):
+        try:
+            reindexar()
+        except BuscaIndisponivel as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS('Índice de busca reconstruído.'))
@@ -0,0 +1,135 @@
+import heapq
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.despacho import EntregadorLivre, Parametros, PedidoDespacho, duracao, planejar
+from core.geo import KM_POR_GRAU_LATITUDE
+
+CENTRO = (-23.5614, -46.6559)
+
+
+def _ponto_perto(aleatorio, origem, raio_km):
+    # Ponto uniforme num disco de raio_km em volta de origem
+    distancia = raio_km * math.sqrt(aleatorio.random())
+    angulo = aleatorio.uniform(0, 2 * math.pi)
+    dlat = distancia * math.cos(angulo) / KM_POR_GRAU_LATITUDE
+    dlon = distancia * math.sin(angulo) / (KM_POR_GRAU_LATITUDE * math.cos(math.radians(origem[0])))
+    return origem[0] + dlat, origem[1] + dlon
+
+
+def gerar_pedidos(aleatorio, options):
+    """[(minuto em que fica pronto, PedidoDespacho)] em ordem de tempo."""
+    restaurantes = [_ponto_perto(aleatorio, CENTRO, options['raio_cidade']) for _ in range(options['restaurantes'])]
+    # Poucos restaurantes concentram a maioria dos pedidos, como na vida real
+    pesos = [1 / (i + 1) for i in range(len(restaurantes))]
+    pedidos = []
+    minuto = 0.0
+    duracao_minutos = options['horas'] * 60
+    while True:
+        minuto += aleatorio.expovariate(options['pedidos_por_hora'] / 60)
+        if minuto >= duracao_minutos:
+            break
+        restaurante = aleatorio.choices(restaurantes, pesos)[0]
+        pronto = minuto + aleatorio.uniform(10, 25)
+        destino = _ponto_perto(aleatorio, restaurante, options['raio_entrega'])
+        pedidos.append((pronto, PedidoDespacho(len(pedidos) + 1, restaurante, destino)))
+    pedidos.sort(key=lambda item: (item[0], item[1].pedido_id))
+    return pedidos
+
+
+def simular(pedidos, options, parametros):
+    """Reexecuta o fluxo em tempo simulado, um ciclo de despacho por intervalo."""
+    aleatorio = random.Random(options['seed'] + 1)
+    livres = {i: _ponto_perto(aleatorio, CENTRO, options['raio_cidade']) for i in range(1, options['entregadores'] + 1)}
+    # (minuto em que termina a rota, entregador, posição final)
+    em_rota = []
+    prontos = {}
+    latencias = []
+    tamanhos = []
+    tempos_planejamento = []
+    ultimo_fim = 0.0
+    proximo = 0
+    minuto = 0.0
+    while proximo < len(pedidos) or prontos:
+        while em_rota and em_rota[0][0] <= minuto:
+            _, entregador_id, posicao = heapq.heappop(em_rota)
+            livres[entregador_id] = posicao
+        while proximo < len(pedidos) and pedidos[proximo][0] <= minuto:
+            pronto, pedido = pedidos[proximo]
+            prontos[pedido.pedido_id] = (pronto, pedido)
+            proximo += 1
+
+        if prontos and livres:
+            entregadores = [EntregadorLivre(i, posicao) for i, posicao in sorted(livres.items())]
+            inicio = time.perf_counter()
+            rotas = planejar([pedido for _, pedido in prontos.values()], entregadores, parametros)
+            tempos_planejamento.append(time.perf_counter() - inicio)
+            for rota in rotas:
+                del livres[rota.entregador_id]
+                fim = minuto + duracao(rota.posicao, rota.paradas, parametros)
+                ultimo_fim = max(ultimo_fim, fim)
+                heapq.heappush(em_rota, (fim, rota.entregador_id, rota.paradas[-1][1].destino))
+                tamanhos.append(len(rota.pedidos))
+                for pedido in rota.pedidos:
+                    pronto, _ = prontos.pop(pedido.pedido_id)
+                    latencias.append(minuto - pronto)
+        minuto += options['intervalo']
+    return latencias, tamanhos, tempos_planejamento, ultimo_fim
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulação determinística do despacho (core.despacho.planejar) sobre um fluxo '
+        'sintético de pedidos, para ajustar os parâmetros sem banco. Mesma semente, '
+        'mesmo resultado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--horas', type=float, default=4)
+        parser.add_argument('--pedidos-por-hora', type=float, default=100)
+        parser.add_argument('--restaurantes', type=int, default=60)
+        parser.add_argument('--entregadores', type=int, default=45)
+        parser.add_argument('--raio-cidade', type=float, default=8, help='km em volta do centro.')
+        parser.add_argument('--raio-entrega', type=float, default=4, help='km do restaurante ao cliente.')
+        parser.add_argument('--intervalo', type=float, default=1, help='Minutos simulados entre ciclos.')
+        parser.add_argument('--capacidade', type=int, help='Padrão: DESPACHO_PEDIDOS_POR_ROTA.')
+        parser.add_argument('--desvio', type=float, help='Padrão: DESPACHO_DESVIO_MAXIMO_MINUTOS.')
+
+    def handle(self, *args, **options):
+        if options['entregadores'] < 1:
+            raise CommandError('A simulação precisa de pelo menos um entregador.')
+        parametros = Parametros.das_configuracoes(capacidade=options['capacidade'], desvio_maximo=options['desvio'])
+        pedidos = gerar_pedidos(random.Random(options['seed']), options)
+        latencias, tamanhos, tempos, ultimo_fim = simular(pedidos, options, parametros)
+        if not latencias:
+            self.stdout.write('Nenhum pedido gerado.')
+            return
+
+        horas_entregador = options['entregadores'] * ultimo_fim / 60
+        self.stdout.write(
+            f'Parâmetros: capacidade={parametros.capacidade}, desvio={parametros.desvio_maximo} min, '
+            f'{parametros.velocidade_kmh} km/h, {parametros.minutos_por_parada} min/parada'
+        )
+        self.stdout.write(f'Pedidos entregues:          {len(latencias)} em {len(tamanhos)} rotas')
+        self.stdout.write(f'Pedidos por rota:           {statistics.mean(tamanhos):.2f}')
+        self.stdout.write(f'Pedidos por entregador-hora: {len(latencias) / horas_entregador:.2f}')
+        self.stdout.write(
+            f'Latência de atribuição:     média {statistics.mean(latencias):.1f} min, '
+            f'p50 {_percentil(latencias, 50):.1f}, p95 {_percentil(latencias, 95):.1f}, '
+            f'máx {max(latencias):.1f}'
+        )
+        # Tempo real de CPU: é a única linha que muda entre execuções
+        self.stdout.write(
+            f'Planejamento:               {len(tempos)} ciclos, média {statistics.mean(tempos) * 1000:.2f} ms, '
+            f'máx {max(tempos) * 1000:.2f} ms'
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+def preencher_foto_capa(apps, schema_editor):
+    Restaurante = apps.get_model('core', 'Restaurante')
+    Produto = apps.get_model('core', 'Produto')
+    capas = {}
+    fotos = (
+        Produto.objects.exclude(foto='').exclude(foto__isnull=True)
+        .order_by('id').values_list('restaurante_id', 'foto')
+    )
+    for restaurante_id, foto in fotos:
+        capas.setdefault(restaurante_id, foto)
+    for restaurante_id, foto in capas.items():
+        Restaurante.objects.filter(pk=restaurante_id).update(foto_capa=foto)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_cliente_tipo_usuario_restaurante_dono'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurante',
+            name='foto_capa',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='produtos_fotos/'),
+        ),
+        migrations.RunPython(preencher_foto_capa, migrations.RunPython.noop),
+    ]
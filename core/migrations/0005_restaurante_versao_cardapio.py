@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_restaurante_foto_capa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurante',
+            name='versao_cardapio',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_carrinho_itemcarrinho'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['restaurante', '-data_pedido'], name='pedido_restaurante_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', '-data_pedido'], name='pedido_cliente_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['restaurante', 'status'], name='pedido_restaurante_status_idx'),
+        ),
+    ]
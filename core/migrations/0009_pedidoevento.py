@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def registrar_pedidos_existentes(apps, schema_editor):
+    # Os pedidos antigos não têm histórico: registra o estado atual de cada um
+    # na data do pedido, para que toda linha do tempo tenha pelo menos um evento
+    Pedido = apps.get_model('core', 'Pedido')
+    PedidoEvento = apps.get_model('core', 'PedidoEvento')
+    eventos = (
+        PedidoEvento(pedido_id=pedido_id, restaurante_id=restaurante_id, status=status, criado_em=data_pedido)
+        for pedido_id, restaurante_id, status, data_pedido in Pedido.objects.values_list(
+            'id', 'restaurante_id', 'status', 'data_pedido'
+        ).iterator()
+    )
+    PedidoEvento.objects.bulk_create(eventos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_pedido_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_anterior', models.CharField(blank=True, choices=[('Pendente', 'Pendente'), ('Em preparação', 'Em preparação'), ('A caminho', 'A caminho'), ('Entregue', 'Entregue'), ('Cancelado', 'Cancelado')], max_length=20, null=True)),
+                ('status', models.CharField(choices=[('Pendente', 'Pendente'), ('Em preparação', 'Em preparação'), ('A caminho', 'A caminho'), ('Entregue', 'Entregue'), ('Cancelado', 'Cancelado')], max_length=20)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='core.pedido')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_pedidos', to='core.restaurante')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['pedido', 'criado_em'], name='evento_pedido_data_idx'), models.Index(fields=['restaurante', 'criado_em'], name='evento_restaurante_data_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_pedidos_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pedidoevento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='fotos_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='capa_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
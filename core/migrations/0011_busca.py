@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# Tabela virtual FTS5 core_busca usada por core/busca.py: uma linha por
+# restaurante ou produto, sem acentos nem caixa e com índices de prefixo de 2 a
+# 4 letras. O SQL fica escrito aqui para a migração não mudar com o módulo.
+CRIAR_TABELA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_busca USING fts5(
+        restaurante_id UNINDEXED,
+        nome,
+        tipo_cozinha,
+        descricao,
+        categoria,
+        prefix = '2 3 4',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+'''
+
+
+def criar_indice_busca(apps, schema_editor):
+    # FTS5 só existe no SQLite; nos outros bancos a busca fica indisponível
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CRIAR_TABELA)
+    schema_editor.execute(
+        "INSERT INTO core_busca (rowid, restaurante_id, nome, tipo_cozinha, descricao, categoria) "
+        "SELECT id * 2 + 1, id, nome, tipo_cozinha, '', '' FROM core_restaurante"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_busca (rowid, restaurante_id, nome, tipo_cozinha, descricao, categoria) "
+        "SELECT id * 2, restaurante_id, nome, '', descricao, categoria FROM core_produto"
+    )
+
+
+def remover_indice_busca(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS core_busca')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_fotos_derivadas'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
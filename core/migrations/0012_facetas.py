@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_facetas(apps, schema_editor):
+    Restaurante = apps.get_model('core', 'Restaurante')
+    Produto = apps.get_model('core', 'Produto')
+    ContagemFaceta = apps.get_model('core', 'ContagemFaceta')
+    cozinhas = Restaurante.objects.values('tipo_cozinha').annotate(total=Count('id'))
+    categorias = Produto.objects.values('categoria').annotate(total=Count('restaurante_id', distinct=True))
+    ContagemFaceta.objects.bulk_create(
+        [ContagemFaceta(faceta='tipo_cozinha', valor=c['tipo_cozinha'], total=c['total']) for c in cozinhas]
+        + [ContagemFaceta(faceta='categoria', valor=c['categoria'], total=c['total']) for c in categorias]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faceta', models.CharField(choices=[('tipo_cozinha', 'Tipo de cozinha'), ('categoria', 'Categoria')], max_length=20)),
+                ('valor', models.CharField(max_length=50)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['categoria', 'restaurante'], name='produto_categoria_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurante',
+            index=models.Index(fields=['tipo_cozinha', 'id'], name='restaurante_cozinha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='contagemfaceta',
+            constraint=models.UniqueConstraint(fields=('faceta', 'valor'), name='contagem_faceta_unica'),
+        ),
+        migrations.RunPython(calcular_facetas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:49
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def interpretar_horarios(apps, schema_editor):
+    # Usa o parser da aplicação: a regra de interpretação é a mesma do dia a
+    # dia, e textos que ele não entende ficam sem intervalos (nunca abertos)
+    from core.horarios import HorarioInvalido, intervalos_semana
+
+    Restaurante = apps.get_model('core', 'Restaurante')
+    HorarioFuncionamento = apps.get_model('core', 'HorarioFuncionamento')
+    horarios = []
+    for restaurante_id, texto in Restaurante.objects.values_list('id', 'horario_funcionamento').iterator():
+        try:
+            intervalos = intervalos_semana(texto)
+        except HorarioInvalido:
+            continue
+        horarios += [
+            HorarioFuncionamento(restaurante_id=restaurante_id, dia_semana=dia, abre=abre, fecha=fecha)
+            for dia, abre, fecha in intervalos
+        ]
+    HorarioFuncionamento.objects.bulk_create(horarios, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_facetas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorarioFuncionamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(6)])),
+                ('abre', models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(1440)])),
+                ('fecha', models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(1440)])),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='core.restaurante')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurante', 'dia_semana', 'abre', 'fecha'], name='horario_aberto_idx')],
+            },
+        ),
+        migrations.RunPython(interpretar_horarios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:55
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_horarios_funcionamento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='celula_geo',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='raio_entrega_km',
+            field=models.FloatField(default=5, help_text='Distância máxima (em km) até onde o restaurante entrega', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(15)]),
+        ),
+        migrations.AddIndex(
+            model_name='restaurante',
+            index=models.Index(fields=['celula_geo', 'latitude', 'longitude'], name='restaurante_geo_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_geolocalizacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrega',
+            name='distancia_km',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='estimado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='minutos_maximo',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='minutos_minimo',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='entrega',
+            name='tempo_estimado',
+            field=models.CharField(blank=True, help_text='Ex: 30-45 min', max_length=50),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_entrega_estimativa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrega',
+            name='despachado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='parada_coleta',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='parada_entrega',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Entregador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('telefone', models.CharField(blank=True, max_length=15)),
+                ('ativo', models.BooleanField(default=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('user', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entregador', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'entregadores',
+            },
+        ),
+        migrations.CreateModel(
+            name='Rota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criada_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('minutos_previstos', models.FloatField()),
+                ('entregador', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='rotas', to='core.entregador')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='rota',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entregas', to='core.rota'),
+        ),
+        migrations.AddIndex(
+            model_name='entrega',
+            index=models.Index(condition=models.Q(('rota__isnull', True)), fields=['pedido'], name='entrega_sem_rota_idx'),
+        ),
+    ]
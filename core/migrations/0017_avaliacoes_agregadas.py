@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def remover_avaliacoes_duplicadas(apps, schema_editor):
+    # Antes da restrição única, um cliente podia avaliar o mesmo restaurante
+    # várias vezes: fica só a avaliação mais recente de cada par
+    Avaliacao = apps.get_model('core', 'Avaliacao')
+    manter = set()
+    repetidas = []
+    linhas = Avaliacao.objects.order_by('-data_avaliacao', '-id').values_list('id', 'cliente_id', 'restaurante_id')
+    for avaliacao_id, cliente_id, restaurante_id in linhas.iterator(chunk_size=5000):
+        if (cliente_id, restaurante_id) in manter:
+            repetidas.append(avaliacao_id)
+        else:
+            manter.add((cliente_id, restaurante_id))
+    for inicio in range(0, len(repetidas), 500):
+        Avaliacao.objects.filter(id__in=repetidas[inicio:inicio + 500]).delete()
+
+
+def preencher_agregados(apps, schema_editor):
+    Restaurante = apps.get_model('core', 'Restaurante')
+    Avaliacao = apps.get_model('core', 'Avaliacao')
+    agregados = Avaliacao.objects.values('restaurante_id').annotate(total=Count('id'), soma=Sum('nota')).order_by()
+    for agregado in agregados:
+        Restaurante.objects.filter(pk=agregado['restaurante_id']).update(
+            total_avaliacoes=agregado['total'],
+            soma_notas=agregado['soma'],
+            nota_media=agregado['soma'] / agregado['total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_despacho'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurante',
+            name='nota_media',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='soma_notas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='total_avaliacoes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(remover_avaliacoes_duplicadas, migrations.RunPython.noop),
+        migrations.RunPython(preencher_agregados, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='avaliacao',
+            index=models.Index(fields=['restaurante', '-id'], name='avaliacao_restaurante_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurante',
+            index=models.Index(fields=['-nota_media', 'id'], name='restaurante_nota_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='avaliacao',
+            constraint=models.UniqueConstraint(fields=('cliente', 'restaurante'), name='avaliacao_unica_por_cliente'),
+        ),
+    ]
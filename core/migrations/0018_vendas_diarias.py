@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_avaliacoes_agregadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('pedidos', models.IntegerField(default=0)),
+                ('faturamento_centavos', models.BigIntegerField(default=0)),
+                ('cancelados', models.IntegerField(default=0)),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='core.restaurante')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurante', 'dia'), name='venda_diaria_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaProdutoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('quantidade', models.IntegerField(default=0)),
+                ('faturamento_centavos', models.BigIntegerField(default=0)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='core.produto')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_produtos_diarias', to='core.restaurante')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurante', 'dia', 'produto'), name='venda_produto_diaria_unica')],
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User  
+from django.utils import timezone
 # -----------------------------------------------------------------------------
 # Entidade: Cliente
 # -----------------------------------------------------------------------------
@@ -17,6 +18,9 @@ class Cliente(models.Model):
     telefone = models.CharField(max_length=15)
     endereco = models.TextField()
     tipo_usuario = models.CharField(max_length=20, choices=TIPO_USUARIO_CHOICES, default='CLIENTE')
+    # Preenchidas pelo comando geocodificar a partir do endereço
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.user.username
@@ -25,17 +29,107 @@ class Cliente(models.Model):
 # Entidade: Restaurante
 # -----------------------------------------------------------------------------
 class Restaurante(models.Model):
-   
+    RAIO_ENTREGA_MAXIMO_KM = 15
+    CAMPOS_AVALIACOES = ('total_avaliacoes', 'soma_notas', 'nota_media')
+
     dono = models.ForeignKey(User, on_delete=models.CASCADE, related_name='restaurantes')
     
     nome = models.CharField(max_length=100)
     endereco = models.TextField()
     horario_funcionamento = models.CharField(max_length=100, help_text="Ex: 08:00-22:00")
     tipo_cozinha = models.CharField(max_length=50)
+    # Foto de capa desnormalizada: é a foto do primeiro produto (menor id) que
+    # tiver imagem. Mantida pelos signals em core/signals.py para que a listagem
+    # não precise consultar os produtos de cada restaurante.
+    foto_capa = models.ImageField(upload_to='produtos_fotos/', blank=True, null=True, editable=False)
+    # Versões reduzidas da foto de capa (ver Produto.fotos_derivadas)
+    capa_derivadas = models.JSONField(default=dict, blank=True, editable=False)
+    # Incrementado pelos signals sempre que o restaurante ou algum produto do
+    # cardápio muda. Serve de base para o ETag das páginas de cardápio.
+    versao_cardapio = models.PositiveIntegerField(default=1, editable=False)
+    # Coordenadas preenchidas pelo comando geocodificar (core/geo.py). Ficam
+    # vazias até lá, e voltam a ficar vazias quando o endereço muda.
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    # Célula da grade de core/geo.py, usada como pré-filtro indexado nas
+    # buscas por proximidade
+    celula_geo = models.IntegerField(null=True, blank=True, editable=False)
+    raio_entrega_km = models.FloatField(
+        default=5, validators=[MinValueValidator(0), MaxValueValidator(RAIO_ENTREGA_MAXIMO_KM)],
+        help_text="Distância máxima (em km) até onde o restaurante entrega",
+    )
+    # Agregados das avaliações, atualizados na mesma transação de cada
+    # avaliação (core/avaliacoes.py). soma_notas deixa a média exata sem
+    # precisar ler as avaliações; nota_media fica 0 enquanto não houver nenhuma.
+    total_avaliacoes = models.PositiveIntegerField(default=0, editable=False)
+    soma_notas = models.PositiveIntegerField(default=0, editable=False)
+    nota_media = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Filtro ?tipo_cozinha= da listagem, que pagina pelo id
+            models.Index(fields=['tipo_cozinha', 'id'], name='restaurante_cozinha_idx'),
+            models.Index(fields=['celula_geo', 'latitude', 'longitude'], name='restaurante_geo_idx'),
+            # Listagem com ?ordenar=nota, paginada por (nota_media, id)
+            models.Index(fields=['-nota_media', 'id'], name='restaurante_nota_idx'),
+        ]
+
+    # Campo -> atributo com o valor lido do banco, para os signals saberem se
+    # ele mudou. Campos adiados (.only()/.defer()) ficam sem o atributo.
+    CAMPOS_ACOMPANHADOS = {
+        'tipo_cozinha': '_tipo_cozinha_carregado',
+        'horario_funcionamento': '_horario_carregado',
+        'endereco': '_endereco_carregado',
+    }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        for campo, atributo in cls.CAMPOS_ACOMPANHADOS.items():
+            if campo in instance.__dict__:
+                setattr(instance, atributo, instance.__dict__[campo])
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Os agregados das avaliações só mudam pelo UPDATE com F() de
+        # core/avaliacoes.py: um save() comum (admin, formulário) não pode
+        # regravar os valores lidos antes e desfazer uma avaliação simultânea
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferidos = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                campo.attname for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.attname not in deferidos
+                and campo.attname not in self.CAMPOS_AVALIACOES
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nome
 
+# -----------------------------------------------------------------------------
+# Entidade: HorarioFuncionamento
+# -----------------------------------------------------------------------------
+# Restaurante.horario_funcionamento interpretado por core/horarios.py: uma linha
+# por dia da semana e intervalo, em minutos desde a meia-noite. Um intervalo
+# que passa da meia-noite é gravado como dois.
+class HorarioFuncionamento(models.Model):
+    restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name='horarios')
+    # 0 = segunda ... 6 = domingo, como datetime.weekday()
+    dia_semana = models.PositiveSmallIntegerField(validators=[MaxValueValidator(6)])
+    abre = models.PositiveSmallIntegerField(validators=[MaxValueValidator(24 * 60)])
+    fecha = models.PositiveSmallIntegerField(validators=[MaxValueValidator(24 * 60)])
+
+    class Meta:
+        indexes = [
+            # "Aberto agora" é um EXISTS correlacionado: para cada restaurante
+            # da página, busca pelo restaurante e dia e compara a faixa sem
+            # sair do índice
+            models.Index(fields=['restaurante', 'dia_semana', 'abre', 'fecha'], name='horario_aberto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurante_id} dia {self.dia_semana}: {self.abre // 60:02d}:{self.abre % 60:02d}-{self.fecha // 60:02d}:{self.fecha % 60:02d}"
+
 # -----------------------------------------------------------------------------
 # Entidade: Produto
 # -----------------------------------------------------------------------------
@@ -48,6 +142,29 @@ class Produto(models.Model):
     # Para o ImageField funcionar, é necessário instalar a biblioteca Pillow:
     # pip install Pillow
     foto = models.ImageField(upload_to='produtos_fotos/', blank=True, null=True)
+    # Versões da foto em tamanhos menores, geradas em segundo plano por
+    # core/imagens.py: {"thumb": {"webp": "<arquivo>", "jpeg": "<arquivo>"}, ...}
+    fotos_derivadas = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Filtro ?categoria= da listagem e contagem das facetas por categoria
+            models.Index(fields=['categoria', 'restaurante'], name='produto_categoria_idx'),
+        ]
+
+    # Ver Restaurante.CAMPOS_ACOMPANHADOS
+    CAMPOS_ACOMPANHADOS = {
+        'foto': '_foto_carregada',
+        'categoria': '_categoria_carregada',
+    }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        for campo, atributo in cls.CAMPOS_ACOMPANHADOS.items():
+            if campo in instance.__dict__:
+                setattr(instance, atributo, instance.__dict__[campo])
+        return instance
 
     def __str__(self):
         return f"{self.nome} - {self.restaurante.nome}"
@@ -63,6 +180,16 @@ class Pedido(models.Model):
         ('Entregue', 'Entregue'),
         ('Cancelado', 'Cancelado'),
     ]
+    # Pedidos que ainda precisam de atenção da cozinha/entrega
+    STATUS_ATIVOS = ['Pendente', 'Em preparação', 'A caminho']
+    # Máquina de estados: para quais status cada status pode avançar
+    TRANSICOES = {
+        'Pendente': ['Em preparação', 'Cancelado'],
+        'Em preparação': ['A caminho', 'Cancelado'],
+        'A caminho': ['Entregue'],
+        'Entregue': [],
+        'Cancelado': [],
+    }
 
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, related_name='pedidos')
     restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name='pedidos')
@@ -70,12 +197,96 @@ class Pedido(models.Model):
     data_pedido = models.DateTimeField(auto_now_add=True)
     valor_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+    class Meta:
+        # Índices dos caminhos mais usados: histórico do cliente (meus_pedidos),
+        # painel do restaurante (ver_pedidos_restaurante) e filtro por status
+        indexes = [
+            models.Index(fields=['restaurante', '-data_pedido'], name='pedido_restaurante_data_idx'),
+            models.Index(fields=['cliente', '-data_pedido'], name='pedido_cliente_data_idx'),
+            models.Index(fields=['restaurante', 'status'], name='pedido_restaurante_status_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guarda o status lido do banco para os signals saberem se ele mudou
+        instance = super().from_db(db, field_names, values)
+        instance._status_carregado = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         # Agora ele busca o 'username' do 'User' que está ligado ao 'Cliente'
         if self.cliente:
             return f"Pedido #{self.id} - {self.cliente.user.username}"
         return f"Pedido #{self.id} - [Cliente Excluído]"
 # -----------------------------------------------------------------------------
+# Entidade: PedidoEvento
+# -----------------------------------------------------------------------------
+class PedidoEvento(models.Model):
+    # Histórico somente de inserção: uma linha na criação do pedido e uma a
+    # cada mudança de status, gravada na mesma transação da mudança. O
+    # restaurante é repetido aqui para consultar uma janela de tempo de um
+    # restaurante sem passar pela tabela de pedidos.
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='eventos')
+    restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name='eventos_pedidos')
+    status_anterior = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pedido', 'criado_em'], name='evento_pedido_data_idx'),
+            models.Index(fields=['restaurante', 'criado_em'], name='evento_restaurante_data_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('PedidoEvento é somente inserção')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.status_anterior or '-'} -> {self.status}"
+
+# -----------------------------------------------------------------------------
+# Entidades: VendaDiaria e VendaProdutoDiaria
+# -----------------------------------------------------------------------------
+# Totais de vendas pré-agregados por restaurante e dia (local, em
+# RESTAURANTES_FUSO_HORARIO), mantidos por core/vendas.py no checkout e quando
+# um pedido é cancelado. O painel de vendas lê só estas tabelas. Valores em
+# centavos para que as somas incrementais sejam exatas.
+class VendaDiaria(models.Model):
+    restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name='vendas_diarias')
+    dia = models.DateField()
+    # Pedidos não cancelados e o faturamento deles
+    pedidos = models.IntegerField(default=0)
+    faturamento_centavos = models.BigIntegerField(default=0)
+    cancelados = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurante', 'dia'], name='venda_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurante_id} em {self.dia}: {self.pedidos} pedido(s)"
+
+
+class VendaProdutoDiaria(models.Model):
+    restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name='vendas_produtos_diarias')
+    dia = models.DateField()
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='vendas_diarias')
+    quantidade = models.IntegerField(default=0)
+    faturamento_centavos = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Também serve de índice para "mais vendidos" num intervalo de dias
+            models.UniqueConstraint(fields=['restaurante', 'dia', 'produto'], name='venda_produto_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id} em {self.dia}: {self.quantidade}"
+
+# -----------------------------------------------------------------------------
 # Tabela Associativa: ItemPedido (Conecta Pedido e Produto)
 # -----------------------------------------------------------------------------
 class ItemPedido(models.Model):
@@ -87,14 +298,61 @@ class ItemPedido(models.Model):
     def __str__(self):
         return f"{self.quantidade}x {self.produto.nome} no Pedido #{self.pedido.id}"
 
+# -----------------------------------------------------------------------------
+# Entidades: Entregador e Rota
+# -----------------------------------------------------------------------------
+class Entregador(models.Model):
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='entregador')
+    nome = models.CharField(max_length=100)
+    telefone = models.CharField(max_length=15, blank=True)
+    # Só entregadores ativos recebem rotas do despacho (core/despacho.py)
+    ativo = models.BooleanField(default=True)
+    # Última posição conhecida, enviada pelo app do entregador
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'entregadores'
+
+    def __str__(self):
+        return self.nome
+
+
+class Rota(models.Model):
+    # Um grupo de entregas feito numa saída do entregador. A ordem das paradas
+    # fica em cada Entrega (parada_coleta / parada_entrega).
+    entregador = models.ForeignKey(Entregador, on_delete=models.PROTECT, related_name='rotas')
+    criada_em = models.DateTimeField(default=timezone.now)
+    minutos_previstos = models.FloatField()
+
+    def __str__(self):
+        return f"Rota #{self.id} - {self.entregador.nome}"
+
 # -----------------------------------------------------------------------------
 # Entidade: Entrega
 # -----------------------------------------------------------------------------
 class Entrega(models.Model):
     # OneToOneField garante que um pedido SÓ pode ter UMA entrega
     pedido = models.OneToOneField(Pedido, on_delete=models.CASCADE, primary_key=True)
-    tempo_estimado = models.CharField(max_length=50, help_text="Ex: 30-45 min")
-    
+    # Texto para exibição ("30-45 min"); os minutos ficam nos campos abaixo
+    tempo_estimado = models.CharField(max_length=50, blank=True, help_text="Ex: 30-45 min")
+    # Estimativa calculada por core/eta.py no checkout
+    minutos_minimo = models.PositiveSmallIntegerField(null=True, blank=True)
+    minutos_maximo = models.PositiveSmallIntegerField(null=True, blank=True)
+    distancia_km = models.FloatField(null=True, blank=True)
+    estimado_em = models.DateTimeField(null=True, blank=True)
+    # Preenchidos pelo despacho; a posição das paradas começa em 0
+    rota = models.ForeignKey(Rota, on_delete=models.SET_NULL, null=True, blank=True, related_name='entregas')
+    parada_coleta = models.PositiveSmallIntegerField(null=True, blank=True)
+    parada_entrega = models.PositiveSmallIntegerField(null=True, blank=True)
+    despachado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Índice parcial: o despacho só procura as entregas ainda sem rota
+            models.Index(fields=['pedido'], condition=models.Q(rota__isnull=True), name='entrega_sem_rota_idx'),
+        ]
+
     def __str__(self):
         return f"Entrega para o Pedido #{self.pedido.id}"
 
@@ -108,5 +366,98 @@ class Avaliacao(models.Model):
     comentario = models.TextField(blank=True, null=True)
     data_avaliacao = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'restaurante'], name='avaliacao_unica_por_cliente'),
+        ]
+        indexes = [
+            # Avaliações de um restaurante, das mais novas para as mais antigas
+            models.Index(fields=['restaurante', '-id'], name='avaliacao_restaurante_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guarda a nota e o restaurante lidos do banco para os signals
+        # ajustarem os agregados do Restaurante pela diferença
+        instance = super().from_db(db, field_names, values)
+        instance._nota_carregada = instance.__dict__.get('nota')
+        instance._restaurante_carregado = instance.__dict__.get('restaurante_id')
+        return instance
+
+    def __str__(self):
+        return f"Avaliação de {self.cliente.user.username} para {self.restaurante.nome}: Nota {self.nota}"
+
+
+# -----------------------------------------------------------------------------
+# Entidade: ChaveIdempotencia
+# -----------------------------------------------------------------------------
+class ChaveIdempotencia(models.Model):
+    # Guarda a resposta do checkout para cada cabeçalho Idempotency-Key, assim
+    # uma nova tentativa do app devolve o mesmo pedido em vez de criar outro.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chaves_idempotencia')
+    chave = models.CharField(max_length=255)
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True)
+    # Fica vazia enquanto o pedido ainda está sendo criado
+    resposta = models.JSONField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chave'], name='chave_idempotencia_unica_por_usuario'),
+        ]
+
+    def __str__(self):
+        return f"{self.chave} ({self.user.username})"
+
+
+# -----------------------------------------------------------------------------
+# Entidades: Carrinho e ItemCarrinho
+# -----------------------------------------------------------------------------
+# Usadas quando CARRINHO_BACKEND = 'modelo'. Cada item é uma linha própria,
+# então adicionar um produto é um UPDATE de uma linha em vez de regravar a
+# sessão inteira em django_session.
+class Carrinho(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='carrinho')
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Carrinho de {self.user.username}"
+
+
+class ItemCarrinho(models.Model):
+    carrinho = models.ForeignKey(Carrinho, on_delete=models.CASCADE, related_name='itens')
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    quantidade = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrinho', 'produto'], name='item_carrinho_unico_por_produto'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto.nome}"
+
+
+# -----------------------------------------------------------------------------
+# Entidade: ContagemFaceta
+# -----------------------------------------------------------------------------
+# Quantos restaurantes existem para cada tipo de cozinha e quantos oferecem
+# cada categoria de produto. Mantida por core/facetas.py, assim os filtros
+# "Japonesa (42)" saem de uma tabela pequena em vez de um GROUP BY.
+class ContagemFaceta(models.Model):
+    FACETA_CHOICES = [
+        ('tipo_cozinha', 'Tipo de cozinha'),
+        ('categoria', 'Categoria'),
+    ]
+
+    faceta = models.CharField(max_length=20, choices=FACETA_CHOICES)
+    valor = models.CharField(max_length=50)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['faceta', 'valor'], name='contagem_faceta_unica'),
+        ]
+
     def __str__(self):
-        return f"Avaliação de {self.cliente.nome} para {self.restaurante.nome}: Nota {self.nota}"
\ No newline at end of file
+        return f"{self.valor} ({self.total})"
@@ -0,0 +1,180 @@
+# core/notificacoes.py
+#
+# Notificações de pedidos em tempo real. A criação e as mudanças de status de
+# um Pedido são publicadas nos canais "restaurante:<id>" e "cliente:<id>"; o
+# endpoint SSE (api_views.pedidos_eventos_api) assina o canal do usuário e
+# repassa as mensagens para o navegador, que deixa de recarregar a página.
+#
+# O broker é configurável em settings.NOTIFICACOES_BROKER:
+#
+# * 'core.notificacoes.BrokerLocal' (padrão): hub em memória do processo,
+#   suficiente para um único worker ASGI.
+# * 'core.notificacoes.BrokerRedis': usa o pub/sub do Redis para entregar as
+#   mensagens entre vários workers (precisa do pacote redis e de
+#   NOTIFICACOES_REDIS_URL).
+#
+# O fluxo SSE só existe sob ASGI (uvicorn, daphne). Sob WSGI (runserver,
+# wsgi.py) o StreamingHttpResponse consumiria o gerador assíncrono infinito
+# inteiro antes de mandar qualquer byte, prendendo o worker para sempre.
+
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Pedido
+
+
+def eventos_disponiveis(request):
+    # Só faz sentido abrir o EventSource quando a requisição veio por ASGI
+    return isinstance(request, ASGIRequest)
+
+
+def canal_restaurante(restaurante_id):
+    return f'restaurante:{restaurante_id}'
+
+
+def canal_cliente(cliente_id):
+    return f'cliente:{cliente_id}'
+
+
+class AssinaturaLocal:
+
+    def __init__(self, broker, canal):
+        self.broker = broker
+        self.canal = canal
+        self.loop = asyncio.get_running_loop()
+        self.fila = asyncio.Queue()
+
+    async def proxima(self, timeout):
+        # Devolve None se nada chegar dentro do timeout (usado para heartbeat)
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def fechar(self):
+        self.broker._remover(self)
+
+
+class BrokerLocal:
+
+    def __init__(self):
+        self._assinaturas = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, canal, mensagem):
+        # Pode ser chamado de qualquer thread (views síncronas, signals); a
+        # entrega em cada fila acontece no event loop de quem assinou.
+        with self._lock:
+            assinaturas = list(self._assinaturas.get(canal, ()))
+        for assinatura in assinaturas:
+            assinatura.loop.call_soon_threadsafe(assinatura.fila.put_nowait, mensagem)
+
+    async def assinar(self, canal):
+        assinatura = AssinaturaLocal(self, canal)
+        with self._lock:
+            self._assinaturas.setdefault(canal, set()).add(assinatura)
+        return assinatura
+
+    def _remover(self, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.canal)
+            if assinaturas is not None:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._assinaturas[assinatura.canal]
+
+
+class AssinaturaRedis:
+
+    def __init__(self, cliente, pubsub):
+        self.cliente = cliente
+        self.pubsub = pubsub
+
+    async def proxima(self, timeout):
+        mensagem = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if mensagem is None:
+            return None
+        return json.loads(mensagem['data'])
+
+    async def fechar(self):
+        await self.pubsub.aclose()
+        await self.cliente.aclose()
+
+
+class BrokerRedis:
+
+    def __init__(self):
+        import redis
+
+        self.url = settings.NOTIFICACOES_REDIS_URL
+        self._cliente = redis.Redis.from_url(self.url)
+
+    def publicar(self, canal, mensagem):
+        self._cliente.publish(canal, json.dumps(mensagem))
+
+    async def assinar(self, canal):
+        import redis.asyncio
+
+        cliente = redis.asyncio.Redis.from_url(self.url)
+        pubsub = cliente.pubsub()
+        await pubsub.subscribe(canal)
+        return AssinaturaRedis(cliente, pubsub)
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def obter_broker():
+    caminho = settings.NOTIFICACOES_BROKER
+    with _brokers_lock:
+        if caminho not in _brokers:
+            _brokers[caminho] = import_string(caminho)()
+        return _brokers[caminho]
+
+
+def notificar_pedido(pedido_id, restaurante_id, cliente_id, status, evento):
+    """Publica a mudança de um pedido para o restaurante e para o cliente.
+
+    A publicação só acontece depois do commit, para ninguém receber um pedido
+    que acabou sendo desfeito.
+    """
+    mensagem = {'evento': evento, 'pedido_id': pedido_id, 'status': status}
+    canais = [canal_restaurante(restaurante_id)]
+    if cliente_id is not None:
+        canais.append(canal_cliente(cliente_id))
+
+    def publicar():
+        broker = obter_broker()
+        for canal in canais:
+            broker.publicar(canal, mensagem)
+
+    transaction.on_commit(publicar)
+
+
+def notificar_pedidos(pedido_ids, evento):
+    """Versão para mudanças feitas com UPDATE em lote, que não disparam signals.
+
+    Os dados de roteamento (restaurante e cliente) são lidos numa consulta só,
+    depois do commit, fora do caminho crítico da transição.
+    """
+    pedido_ids = list(pedido_ids)
+    if not pedido_ids:
+        return
+
+    def publicar():
+        broker = obter_broker()
+        pedidos = Pedido.objects.filter(id__in=pedido_ids).values('id', 'restaurante_id', 'cliente_id', 'status')
+        for pedido in pedidos:
+            mensagem = {'evento': evento, 'pedido_id': pedido['id'], 'status': pedido['status']}
+            broker.publicar(canal_restaurante(pedido['restaurante_id']), mensagem)
+            if pedido['cliente_id'] is not None:
+                broker.publicar(canal_cliente(pedido['cliente_id']), mensagem)
+
+    transaction.on_commit(publicar)
@@ -0,0 +1,185 @@
+# core/pedidos.py
+#
+# Regras de criação de pedido compartilhadas pela view web (finalizar_pedido)
+# e pela API (checkout_api).
+
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+from .carrinho import CarrinhoInvalido, precificar_carrinho
+from .eta import estimar, registrar_eventos
+from .models import Entrega, Pedido, PedidoEvento, ItemPedido
+from .notificacoes import notificar_pedidos
+from .vendas import itens_criados, status_alterados
+
+
+class TransicaoInvalida(Exception):
+    pass
+
+
+class ConflitoStatus(Exception):
+    pass
+
+
+def criar_pedido(cliente, carrinho):
+    """Transforma o carrinho ({produto_id: quantidade}) em um Pedido.
+
+    Precifica o carrinho numa única consulta, calcula o total antes de gravar
+    e insere o pedido e todos os itens numa só transação, com um número fixo
+    de escritas independente da quantidade de itens.
+    """
+    if not carrinho:
+        raise CarrinhoInvalido('Carrinho vazio')
+
+    precificado = precificar_carrinho(carrinho)
+    if not precificado.linhas:
+        raise CarrinhoInvalido('Produtos inválidos')
+
+    # Estima antes de inserir, para o pedido novo não contar na própria fila.
+    # Sai das médias em memória de core/eta.py, sem ler o histórico de pedidos.
+    estimativa = estimar(precificado.restaurante_id, cliente.latitude, cliente.longitude)
+    with transaction.atomic():
+        pedido = Pedido.objects.create(
+            cliente=cliente,
+            restaurante_id=precificado.restaurante_id,
+            status='Pendente',
+            valor_total=precificado.total,
+        )
+        ItemPedido.objects.bulk_create([
+            ItemPedido(
+                pedido=pedido,
+                produto_id=linha.produto_id,
+                quantidade=linha.quantidade,
+                preco_unitario=linha.preco,
+            )
+            for linha in precificado.linhas
+        ])
+        itens_criados(pedido, [(linha.produto_id, linha.quantidade, linha.preco) for linha in precificado.linhas])
+        pedido.entrega = Entrega.objects.create(
+            pedido=pedido,
+            tempo_estimado=estimativa.texto,
+            minutos_minimo=estimativa.minimo,
+            minutos_maximo=estimativa.maximo,
+            distancia_km=estimativa.distancia_km,
+            estimado_em=timezone.now(),
+        )
+    return pedido
+
+
+def validar_transicao(status_atual, novo_status):
+    if novo_status not in Pedido.TRANSICOES.get(status_atual, ()):
+        raise TransicaoInvalida(f"Não é possível mudar de '{status_atual}' para '{novo_status}'")
+
+
+def mudar_status(pedido_id, status_atual, novo_status, dono):
+    """Aplica uma transição de status com um único UPDATE condicional.
+
+    O UPDATE só acontece se o pedido ainda estiver em status_atual e for de
+    um restaurante do dono; caso contrário levanta ConflitoStatus (status
+    desatualizado, pedido de outro dono ou inexistente). Duas telas da
+    cozinha mudando o mesmo pedido não sobrescrevem uma à outra.
+    """
+    validar_transicao(status_atual, novo_status)
+    with transaction.atomic():
+        alterados = Pedido.objects.filter(
+            id=pedido_id, status=status_atual, restaurante__dono=dono
+        ).update(status=novo_status)
+        if not alterados:
+            raise ConflitoStatus('O status do pedido mudou ou o pedido não pertence a este restaurante')
+        # O restaurante vem de uma subconsulta dentro do próprio INSERT
+        evento = PedidoEvento.objects.create(
+            pedido_id=pedido_id,
+            restaurante_id=Subquery(Pedido.objects.filter(pk=pedido_id).values('restaurante_id')[:1]),
+            status_anterior=status_atual,
+            status=novo_status,
+        )
+        # O ETA descobre o restaurante pela etapa aberta do pedido
+        registrar_eventos([(pedido_id, None, status_atual, novo_status, evento.criado_em)])
+        status_alterados([(pedido_id, status_atual, novo_status)])
+        notificar_pedidos([pedido_id], 'atualizado')
+
+
+def mudar_status_em_lote(pedido_ids, novo_status, dono):
+    """Move vários pedidos do dono para novo_status de uma vez.
+
+    Lê o status atual de todos numa consulta, aplica as transições válidas
+    num único UPDATE condicional e devolve um resultado por pedido:
+    'ok', 'invalido' (transição não permitida), 'conflito' (o status mudou
+    entre a leitura e o UPDATE) ou 'nao_encontrado'.
+    """
+    if novo_status not in dict(Pedido.STATUS_CHOICES):
+        raise TransicaoInvalida(f"Status inválido: '{novo_status}'")
+    pedido_ids = list(dict.fromkeys(int(pedido_id) for pedido_id in pedido_ids))
+    origens = [status for status, destinos in Pedido.TRANSICOES.items() if novo_status in destinos]
+
+    with transaction.atomic():
+        lidos = Pedido.objects.filter(id__in=pedido_ids, restaurante__dono=dono).values_list(
+            'id', 'status', 'restaurante_id'
+        )
+        atuais = {}
+        restaurantes = {}
+        for pedido_id, status, restaurante_id in lidos:
+            atuais[pedido_id] = status
+            restaurantes[pedido_id] = restaurante_id
+        anteriores = dict(atuais)
+        validos = [pedido_id for pedido_id, status in atuais.items() if status in origens]
+        alterados = 0
+        if validos:
+            alterados = Pedido.objects.filter(
+                id__in=validos, status__in=origens, restaurante__dono=dono
+            ).update(status=novo_status)
+        if alterados != len(validos):
+            # Raro: alguém mudou algum desses pedidos no meio do caminho
+            atuais.update(Pedido.objects.filter(id__in=validos).values_list('id', 'status'))
+            aplicados = {pedido_id for pedido_id in validos if atuais[pedido_id] == novo_status}
+        else:
+            aplicados = set(validos)
+            atuais.update((pedido_id, novo_status) for pedido_id in validos)
+        eventos = PedidoEvento.objects.bulk_create([
+            PedidoEvento(
+                pedido_id=pedido_id,
+                restaurante_id=restaurantes[pedido_id],
+                status_anterior=anteriores[pedido_id],
+                status=novo_status,
+            )
+            for pedido_id in aplicados
+        ])
+        registrar_eventos(
+            (e.pedido_id, e.restaurante_id, e.status_anterior, e.status, e.criado_em) for e in eventos
+        )
+        status_alterados((pedido_id, anteriores[pedido_id], novo_status) for pedido_id in aplicados)
+        notificar_pedidos(aplicados, 'atualizado')
+
+    resultados = []
+    for pedido_id in pedido_ids:
+        if pedido_id not in atuais:
+            resultado = 'nao_encontrado'
+        elif pedido_id in aplicados:
+            resultado = 'ok'
+        elif pedido_id in validos:
+            resultado = 'conflito'
+        else:
+            resultado = 'invalido'
+        resultados.append({'pedido_id': pedido_id, 'resultado': resultado, 'status': atuais.get(pedido_id)})
+    return resultados
+
+
+def linha_do_tempo(pedido_id, user):
+    """Eventos de um pedido, visíveis para o cliente dele ou o dono do restaurante.
+
+    Uma única consulta usando o índice (pedido, criado_em).
+    """
+    return list(
+        PedidoEvento.objects.filter(pedido_id=pedido_id)
+        .filter(Q(pedido__cliente__user=user) | Q(restaurante__dono=user))
+        .order_by('criado_em', 'id')
+        .values('status_anterior', 'status', 'criado_em')
+    )
+
+
+def eventos_do_restaurante(restaurante_id, inicio, fim):
+    # Janela de tempo de um restaurante, pelo índice (restaurante, criado_em)
+    return PedidoEvento.objects.filter(
+        restaurante_id=restaurante_id, criado_em__gte=inicio, criado_em__lt=fim
+    ).order_by('criado_em', 'id')
@@ -0,0 +1,235 @@
+# core/signals.py
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import avaliacoes, busca, facetas, vendas
+from .cardapio import cardapio_alterado
+from .eta import registrar_eventos
+from .geo import celula
+from .horarios import atualizar_horarios
+from .carrinho import mesclar_carrinho_da_sessao
+from .imagens import agendar_rendicoes, arquivos_derivados, remover_arquivos
+from .models import Avaliacao, Restaurante, Produto, Pedido, PedidoEvento
+from .notificacoes import notificar_pedido
+
+
+@receiver(pre_save, sender=Restaurante)
+@receiver(pre_save, sender=Produto)
+def valores_anteriores(sender, instance, **kwargs):
+    # Registrado antes dos outros: um campo adiado no .only()/.defer() e
+    # atribuído depois não tem valor carregado, então o anterior é relido do
+    # banco antes do UPDATE. Os que continuam adiados não são gravados e
+    # ficam sem o atributo, então os signals abaixo não os comparam.
+    if instance._state.adding:
+        return
+    deferidos = instance.get_deferred_fields()
+    faltando = {
+        campo: atributo for campo, atributo in sender.CAMPOS_ACOMPANHADOS.items()
+        if campo not in deferidos and not hasattr(instance, atributo)
+    }
+    if faltando:
+        anteriores = sender.objects.filter(pk=instance.pk).values(*faltando).first() or {}
+        for campo, atributo in faltando.items():
+            setattr(instance, atributo, anteriores.get(campo))
+
+
+# Registrado antes de produto_alterado: a capa do restaurante é recalculada
+# depois que as versões da foto antiga já saíram do produto
+@receiver(post_save, sender=Produto)
+def foto_do_produto_salva(sender, instance, created, **kwargs):
+    if not created and not hasattr(instance, '_foto_carregada'):
+        # Continuava adiado no save(): não foi gravado
+        return
+    foto = instance.foto.name if instance.foto else None
+    anterior = None if created else instance._foto_carregada
+    if foto != anterior:
+        # As versões da foto anterior deixam de valer na hora: a API serve a
+        # foto original até as novas ficarem prontas. A foto antiga e as
+        # versões dela vão para o lixo. Lê as versões do banco porque a
+        # instância pode ter sido carregada antes de o worker gravá-las.
+        derivadas = None if created else Produto.objects.filter(pk=instance.pk).values_list(
+            'fotos_derivadas', flat=True
+        ).first()
+        if derivadas:
+            Produto.objects.filter(pk=instance.pk).update(fotos_derivadas={})
+            remover_arquivos(list(arquivos_derivados(derivadas)))
+        instance.fotos_derivadas = {}
+        if foto:
+            # Gera as versões reduzidas da foto nova fora da requisição
+            agendar_rendicoes(instance.id)
+        remover_arquivos([anterior])
+    instance._foto_carregada = foto
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def produto_alterado(sender, instance, **kwargs):
+    cardapio_alterado(instance.restaurante_id)
+
+
+@receiver(post_delete, sender=Produto)
+def produto_excluido(sender, instance, **kwargs):
+    remover_arquivos([instance.foto.name, *arquivos_derivados(instance.fotos_derivadas)])
+
+
+@receiver(post_save, sender=Produto)
+def indexar_produto(sender, instance, **kwargs):
+    busca.indexar_produto(instance)
+
+
+@receiver(post_delete, sender=Produto)
+def desindexar_produto(sender, instance, **kwargs):
+    busca.remover_produto(instance.id)
+
+
+@receiver(post_save, sender=Produto)
+def atualizar_facetas_produto(sender, instance, created, **kwargs):
+    if not created and not hasattr(instance, '_categoria_carregada'):
+        # Continuava adiado no save(): não foi gravado
+        return
+    anterior = None if created else instance._categoria_carregada
+    if instance.categoria != anterior:
+        facetas.recontar_categoria(instance.categoria)
+        facetas.recontar_categoria(anterior)
+    instance._categoria_carregada = instance.categoria
+
+
+@receiver(post_delete, sender=Produto)
+def atualizar_facetas_produto_excluido(sender, instance, **kwargs):
+    facetas.recontar_categoria(instance.categoria)
+
+
+@receiver(pre_save, sender=Restaurante)
+def restaurante_antes_de_salvar(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        return
+    if update_fields is not None and 'versao_cardapio' not in update_fields:
+        return
+    # Incrementa no próprio UPDATE do save() para nunca regravar uma versão antiga
+    instance.versao_cardapio = F('versao_cardapio') + 1
+
+
+@receiver(pre_save, sender=Restaurante)
+def localizacao_do_restaurante(sender, instance, **kwargs):
+    deferidos = instance.get_deferred_fields()
+    # Sem as coordenadas carregadas, o UPDATE do save() não passa por elas
+    coordenadas_carregadas = not deferidos & {'latitude', 'longitude', 'celula_geo'}
+    if 'endereco' not in deferidos:
+        # Endereço novo invalida as coordenadas até o próximo geocodificar
+        anterior = getattr(instance, '_endereco_carregado', instance.endereco)
+        if not instance._state.adding and instance.endereco != anterior:
+            if coordenadas_carregadas:
+                instance.latitude = instance.longitude = None
+            else:
+                Restaurante.objects.filter(pk=instance.pk).update(latitude=None, longitude=None, celula_geo=None)
+        instance._endereco_carregado = instance.endereco
+    if coordenadas_carregadas:
+        instance.celula_geo = celula(instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Restaurante)
+def restaurante_salvo(sender, instance, created, **kwargs):
+    if hasattr(instance.versao_cardapio, 'resolve_expression'):
+        instance.refresh_from_db(fields=['versao_cardapio'])
+
+
+@receiver(post_save, sender=Restaurante)
+def indexar_restaurante(sender, instance, **kwargs):
+    busca.indexar_restaurante(instance)
+
+
+@receiver(post_delete, sender=Restaurante)
+def desindexar_restaurante(sender, instance, **kwargs):
+    busca.remover_restaurante(instance.id)
+
+
+@receiver(post_save, sender=Restaurante)
+def atualizar_facetas_restaurante(sender, instance, created, **kwargs):
+    if not created and not hasattr(instance, '_tipo_cozinha_carregado'):
+        # Continuava adiado no save(): não foi gravado
+        return
+    anterior = None if created else instance._tipo_cozinha_carregado
+    if instance.tipo_cozinha != anterior:
+        facetas.ajustar_cozinha(instance.tipo_cozinha, 1)
+        facetas.ajustar_cozinha(anterior, -1)
+    instance._tipo_cozinha_carregado = instance.tipo_cozinha
+
+
+@receiver(post_delete, sender=Restaurante)
+def atualizar_facetas_restaurante_excluido(sender, instance, **kwargs):
+    facetas.ajustar_cozinha(instance.tipo_cozinha, -1)
+
+
+@receiver(post_save, sender=Restaurante)
+def interpretar_horario(sender, instance, created, **kwargs):
+    if not created and not hasattr(instance, '_horario_carregado'):
+        # Continuava adiado no save(): não foi gravado
+        return
+    anterior = None if created else instance._horario_carregado
+    if instance.horario_funcionamento != anterior:
+        atualizar_horarios(instance.id, instance.horario_funcionamento)
+    instance._horario_carregado = instance.horario_funcionamento
+
+
+@receiver(user_logged_in)
+def usuario_logou(sender, request, user, **kwargs):
+    mesclar_carrinho_da_sessao(request, user)
+
+
+@receiver(post_save, sender=Pedido)
+def registrar_evento_pedido(sender, instance, created, **kwargs):
+    # Cobre as gravações via save() (criação do pedido, admin). As transições
+    # feitas com UPDATE em core/pedidos.py gravam o próprio evento.
+    anterior = getattr(instance, '_status_carregado', None)
+    if created or instance.status != anterior:
+        evento = PedidoEvento.objects.create(
+            pedido=instance,
+            restaurante_id=instance.restaurante_id,
+            status_anterior=None if created else anterior,
+            status=instance.status,
+        )
+        registrar_eventos([
+            (instance.id, instance.restaurante_id, evento.status_anterior, evento.status, evento.criado_em)
+        ])
+        if created:
+            vendas.pedido_criado(instance)
+        else:
+            vendas.status_alterados([(instance.id, anterior, instance.status)])
+    instance._status_carregado = instance.status
+
+
+@receiver(post_save, sender=Pedido)
+def pedido_salvo(sender, instance, created, **kwargs):
+    notificar_pedido(
+        instance.id, instance.restaurante_id, instance.cliente_id, instance.status,
+        'criado' if created else 'atualizado',
+    )
+
+
+@receiver(post_save, sender=Avaliacao)
+def avaliacao_salva(sender, instance, created, **kwargs):
+    # Ajusta os agregados do Restaurante pela diferença, na mesma transação
+    if created:
+        avaliacoes.somar(instance.restaurante_id, instance.nota, 1)
+    else:
+        anterior = getattr(instance, '_restaurante_carregado', instance.restaurante_id)
+        nota_anterior = getattr(instance, '_nota_carregada', instance.nota)
+        if anterior != instance.restaurante_id:
+            avaliacoes.somar(anterior, -nota_anterior, -1)
+            avaliacoes.somar(instance.restaurante_id, instance.nota, 1)
+        else:
+            avaliacoes.somar(instance.restaurante_id, instance.nota - nota_anterior, 0)
+    instance._nota_carregada = instance.nota
+    instance._restaurante_carregado = instance.restaurante_id
+
+
+@receiver(post_delete, sender=Avaliacao)
+def avaliacao_excluida(sender, instance, **kwargs):
+    avaliacoes.somar(
+        getattr(instance, '_restaurante_carregado', instance.restaurante_id),
+        -getattr(instance, '_nota_carregada', instance.nota),
+        -1,
+    )
@@ -1,3 +1,1581 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .api_views import PAGE_SIZE_MAXIMO, PAGE_SIZE_PADRAO
+from .cardapio import estatisticas_cache
+from .despacho import COLETA, ENTREGA, EntregadorLivre, PedidoDespacho, despachar, entregadores_livres, planejar
+from .eta import MINUTOS_PADRAO, motor
+from .forms import ProdutoForm, RestauranteForm
+from .geo import distancia_km
+from .horarios import HorarioInvalido, intervalos_semana
+from .imagens import RENDICOES, arquivos_derivados, gerar_rendicoes
+from .carrinho import CarrinhoMultiRestaurante, desempacotar, empacotar, precificar_carrinho
+from .models import (
+    Avaliacao, Carrinho, ChaveIdempotencia, Cliente, Entrega, Entregador, ItemCarrinho, Pedido, PedidoEvento, Produto,
+    Restaurante, VendaDiaria, VendaProdutoDiaria,
+)
+from .notificacoes import BrokerLocal
+from .pedidos import (
+    CarrinhoInvalido, ConflitoStatus, TransicaoInvalida, criar_pedido, eventos_do_restaurante, linha_do_tempo,
+    mudar_status, mudar_status_em_lote,
+)
+from .vendas import dia_local
+from .views import PEDIDOS_POR_PAGINA
+
+
+class RestaurantListApiTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+
+    def criar_restaurantes(self, n):
+        Restaurante.objects.bulk_create([
+            Restaurante(
+                dono=self.dono,
+                nome=f'Restaurante {i}',
+                endereco='Rua A',
+                horario_funcionamento='08:00-22:00',
+                tipo_cozinha='Brasileira',
+            )
+            for i in range(n)
+        ])
+
+    def test_numero_de_consultas_constante(self):
+        for n in (10, 1000):
+            Restaurante.objects.all().delete()
+            self.criar_restaurantes(n)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('api_restaurant_list'), {'limit': PAGE_SIZE_MAXIMO})
+            self.assertEqual(len(response.json()), min(n, PAGE_SIZE_MAXIMO))
+
+    def test_foto_capa_acompanha_produtos(self):
+        self.criar_restaurantes(1)
+        restaurante = Restaurante.objects.get()
+        sem_foto = Produto.objects.create(
+            restaurante=restaurante, nome='Suco', descricao='', preco='5.00', categoria='Bebida'
+        )
+        com_foto = Produto.objects.create(
+            restaurante=restaurante, nome='Pizza', descricao='', preco='40.00',
+            categoria='Prato Principal', foto='produtos_fotos/pizza.png',
+        )
+        url = reverse('api_restaurant_list')
+        self.assertEqual(self.client.get(url).json()[0]['imagem_url'], '/produtos_fotos/pizza.png')
+
+        sem_foto.foto = 'produtos_fotos/suco.png'
+        sem_foto.save()
+        self.assertEqual(self.client.get(url).json()[0]['imagem_url'], '/produtos_fotos/suco.png')
+
+        sem_foto.delete()
+        com_foto.delete()
+        self.assertIsNone(self.client.get(url).json()[0]['imagem_url'])
+
+    def test_paginacao_por_cursor(self):
+        self.criar_restaurantes(5)
+        url = reverse('api_restaurant_list')
+        vistos = []
+        cursor = 0
+        while cursor is not None:
+            response = self.client.get(url, {'limit': 2, 'cursor': cursor})
+            vistos += [r['id'] for r in response.json()]
+            cursor = response.headers.get('X-Next-Cursor')
+        self.assertEqual(vistos, sorted(Restaurante.objects.values_list('id', flat=True)))
+
+    def test_sem_parametros_usa_o_tamanho_padrao(self):
+        self.criar_restaurantes(PAGE_SIZE_PADRAO + 5)
+        response = self.client.get(reverse('api_restaurant_list'))
+        self.assertEqual(len(response.json()), PAGE_SIZE_PADRAO)
+        self.assertIn('X-Next-Cursor', response.headers)
+
+    def test_page_size_limitado(self):
+        self.criar_restaurantes(PAGE_SIZE_MAXIMO + 5)
+        response = self.client.get(reverse('api_restaurant_list'), {'limit': 10000})
+        self.assertEqual(len(response.json()), PAGE_SIZE_MAXIMO)
+
+    def test_selecao_de_campos(self):
+        self.criar_restaurantes(1)
+        url = reverse('api_restaurant_list')
+        self.assertEqual(set(self.client.get(url, {'fields': 'nome'}).json()[0]), {'id', 'nome'})
+        self.assertEqual(self.client.get(url, {'fields': 'senha'}).status_code, 400)
+
+
+class RestaurantDetailApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cardapio_paginado(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        restaurante = Restaurante.objects.create(
+            dono=dono, nome='Cantina', endereco='Rua B',
+            horario_funcionamento='11:00-15:00', tipo_cozinha='Italiana',
+        )
+        Produto.objects.bulk_create([
+            Produto(restaurante=restaurante, nome=f'Prato {i}', descricao='', preco='10.00', categoria='Prato Principal')
+            for i in range(3)
+        ])
+        url = reverse('api_restaurant_detail', args=[restaurante.id])
+        response = self.client.get(url, {'limit': 2, 'fields': 'nome,preco'})
+        self.assertEqual([set(p) for p in response.json()['produtos']], [{'id', 'nome', 'preco'}] * 2)
+        response = self.client.get(url, {'cursor': response.headers['X-Next-Cursor']})
+        self.assertEqual(len(response.json()['produtos']), 1)
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+
+class FotosDerivadasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media, IMAGENS_SINCRONO=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurante = Restaurante.objects.create(
+            dono=dono, nome='Cantina', endereco='Rua B',
+            horario_funcionamento='11:00-15:00', tipo_cozinha='Italiana',
+        )
+
+    def imagem(self, nome='pizza.png', tamanho=(2000, 1000), cor='red'):
+        buffer = BytesIO()
+        Image.new('RGBA', tamanho, cor).save(buffer, 'PNG')
+        return SimpleUploadedFile(nome, buffer.getvalue(), content_type='image/png')
+
+    def criar_produto(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Produto.objects.create(
+                restaurante=self.restaurante, nome='Pizza', descricao='', preco='40.00',
+                categoria='Prato Principal', **kwargs
+            )
+
+    def test_gera_versoes_ao_salvar_foto(self):
+        produto = self.criar_produto(foto=self.imagem())
+        produto.refresh_from_db()
+        self.assertEqual(set(produto.fotos_derivadas), set(RENDICOES))
+        for rendicao, lado in RENDICOES.items():
+            for nome in produto.fotos_derivadas[rendicao].values():
+                with default_storage.open(nome) as arquivo, Image.open(arquivo) as gerada:
+                    self.assertEqual(max(gerada.size), lado)
+        # A capa do restaurante acompanha as versões do primeiro produto com foto
+        self.restaurante.refresh_from_db()
+        self.assertEqual(self.restaurante.capa_derivadas, produto.fotos_derivadas)
+
+    def test_nome_muda_com_o_conteudo(self):
+        produto = self.criar_produto(foto=self.imagem())
+        produto.refresh_from_db()
+        antigas = produto.fotos_derivadas
+        # Mesmo conteúdo gera os mesmos arquivos
+        self.assertEqual(gerar_rendicoes(produto.id), antigas)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.foto = self.imagem(cor='blue')
+            produto.save()
+        produto.refresh_from_db()
+        self.assertNotEqual(produto.fotos_derivadas['card']['webp'], antigas['card']['webp'])
+
+    def test_outras_alteracoes_nao_regeram(self):
+        produto = Produto.objects.get(pk=self.criar_produto(foto=self.imagem()).pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            produto.preco = '45.00'
+            produto.save()
+        self.assertEqual(callbacks, [])
+
+    def test_api_expoe_urls_por_tamanho(self):
+        self.criar_produto(foto=self.imagem())
+        response = self.client.get(reverse('api_restaurant_detail', args=[self.restaurante.id]))
+        fotos = response.json()['produtos'][0]['fotos']
+        self.assertEqual(set(fotos), set(RENDICOES))
+        self.assertTrue(fotos['thumb']['webp'].endswith('.webp'))
+        self.assertTrue(fotos['thumb']['jpeg'].startswith('/produtos_fotos/derivadas/'))
+        imagens = self.client.get(reverse('api_restaurant_list')).json()[0]['imagens']
+        self.assertEqual(imagens, fotos)
+
+    def test_foto_trocada_limpa_versoes_ate_gerar_as_novas(self):
+        produto = Produto.objects.get(pk=self.criar_produto(foto=self.imagem()).pk)
+        # Sem executar os callbacks: as versões novas ainda não foram geradas
+        with self.captureOnCommitCallbacks():
+            produto.foto = self.imagem('calabresa.png', cor='blue')
+            produto.save()
+        response = self.client.get(reverse('api_restaurant_detail', args=[self.restaurante.id]))
+        item = response.json()['produtos'][0]
+        self.assertEqual(item['fotos'], {})
+        self.assertIn('calabresa', item['foto_url'])
+        self.restaurante.refresh_from_db()
+        self.assertEqual(self.restaurante.capa_derivadas, {})
+
+    def test_foto_trocada_apaga_arquivos_antigos(self):
+        produto = self.criar_produto(foto=self.imagem())
+        produto = Produto.objects.get(pk=produto.pk)
+        antigos = [produto.foto.name, *arquivos_derivados(produto.fotos_derivadas)]
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.foto = self.imagem(cor='blue')
+            produto.save()
+        self.assertFalse(any(default_storage.exists(nome) for nome in antigos))
+
+        produto.refresh_from_db()
+        atuais = [produto.foto.name, *arquivos_derivados(produto.fotos_derivadas)]
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.delete()
+        self.assertFalse(any(default_storage.exists(nome) for nome in atuais))
+
+    def test_versoes_compartilhadas_nao_sao_apagadas(self):
+        primeiro = self.criar_produto(foto=self.imagem())
+        # Outro produto apontando para o mesmo original gera os mesmos arquivos
+        segundo = self.criar_produto(foto=primeiro.foto.name)
+        primeiro.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual(primeiro.fotos_derivadas, segundo.fotos_derivadas)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primeiro.foto = self.imagem(cor='blue')
+            primeiro.save()
+        self.assertTrue(default_storage.exists(segundo.foto.name))
+        self.assertTrue(all(default_storage.exists(nome) for nome in arquivos_derivados(segundo.fotos_derivadas)))
+
+    def test_formulario_valida_sem_decodificar(self):
+        def enviar(arquivo):
+            dados = {'nome': 'Pizza', 'descricao': 'Mussarela', 'preco': '40.00', 'categoria': 'Prato Principal'}
+            return ProdutoForm(dados, {'foto': arquivo})
+
+        self.assertTrue(enviar(self.imagem()).is_valid())
+        falsa = SimpleUploadedFile('pizza.png', b'nao sou uma imagem', content_type='image/png')
+        self.assertIn('foto', enviar(falsa).errors)
+        with self.settings(PRODUTO_FOTO_MAX_LADO=1000):
+            self.assertEqual(enviar(self.imagem()).errors.as_data()['foto'][0].code, 'dimensoes')
+        with self.settings(PRODUTO_FOTO_MAX_BYTES=10):
+            self.assertEqual(enviar(self.imagem()).errors.as_data()['foto'][0].code, 'tamanho')
+
+    def test_comando_limpa_fotos_orfas(self):
+        produto = self.criar_produto(foto=self.imagem())
+        produto.refresh_from_db()
+        orfa = default_storage.save('produtos_fotos/esquecida.png', self.imagem())
+        saida = StringIO()
+        call_command('limpar_fotos_orfas', minutos=0, stdout=saida)
+        self.assertIn('1 arquivo(s)', saida.getvalue())
+        self.assertFalse(default_storage.exists(orfa))
+        for nome in [produto.foto.name, *arquivos_derivados(produto.fotos_derivadas)]:
+            self.assertTrue(default_storage.exists(nome))
+
+
+class BuscaTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurante = Restaurante.objects.create(
+            dono=dono, nome='Casa do Açaí', endereco='Rua B',
+            horario_funcionamento='11:00-15:00', tipo_cozinha='Brasileira',
+        )
+        self.pizzaria = Restaurante.objects.create(
+            dono=dono, nome='Forno a Lenha', endereco='Rua C',
+            horario_funcionamento='18:00-23:00', tipo_cozinha='Italiana',
+        )
+        self.pizza = Produto.objects.create(
+            restaurante=self.pizzaria, nome='Pizza de Calabresa', descricao='Calabresa e cebola',
+            preco='45.00', categoria='Prato Principal',
+        )
+        self.tigela = Produto.objects.create(
+            restaurante=self.restaurante, nome='Tigela', descricao='Açaí com granola e banana',
+            preco='18.00', categoria='Sobremesa',
+        )
+
+    def buscar(self, q):
+        response = self.client.get(reverse('api_busca'), {'q': q})
+        return [(r['tipo'], r['id']) for r in response.json()['resultados']]
+
+    def test_ignora_acentos_e_ranqueia_pelo_nome(self):
+        # O nome do restaurante pesa mais que a descrição do produto
+        self.assertEqual(
+            self.buscar('acai'),
+            [('restaurante', self.restaurante.id), ('produto', self.tigela.id)],
+        )
+
+    def test_prefixo_na_ultima_palavra(self):
+        self.assertEqual(self.buscar('pizza cala'), [('produto', self.pizza.id)])
+        self.assertEqual(self.buscar('ital'), [('restaurante', self.pizzaria.id)])
+        self.assertEqual(self.buscar('cala pizza'), [])
+
+    def test_operadores_do_usuario_nao_quebram_a_consulta(self):
+        self.assertEqual(self.buscar('"pizza" OR NEAR(*'), [])
+        self.assertEqual(self.buscar(''), [])
+
+    def test_signals_mantem_o_indice(self):
+        self.pizza.nome = 'Lasanha Bolonhesa'
+        self.pizza.save()
+        self.assertEqual(self.buscar('lasanha'), [('produto', self.pizza.id)])
+        self.assertEqual(self.buscar('pizza'), [])
+        self.pizzaria.delete()
+        self.assertEqual(self.buscar('lasanha'), [])
+        self.assertEqual(self.buscar('forno'), [])
+
+    def test_reindexar(self):
+        Produto.objects.filter(pk=self.pizza.pk).update(nome='Esfiha')
+        self.assertEqual(self.buscar('esfiha'), [])
+        call_command('reindexar_busca', stdout=StringIO())
+        self.assertEqual(self.buscar('esfiha'), [('produto', self.pizza.id)])
+
+
+class FacetasTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        self.sushi = self.criar_restaurante('Sushi Bar', 'Japonesa')
+        self.pizzaria = self.criar_restaurante('Forno a Lenha', 'Italiana')
+        for restaurante in (self.sushi, self.pizzaria):
+            for nome in ('Pudim', 'Mousse'):
+                Produto.objects.create(
+                    restaurante=restaurante, nome=nome, descricao='-', preco='12.00', categoria='Sobremesa'
+                )
+        Produto.objects.create(
+            restaurante=self.sushi, nome='Temaki', descricao='-', preco='30.00', categoria='Prato Principal'
+        )
+
+    def criar_restaurante(self, nome, tipo_cozinha):
+        return Restaurante.objects.create(
+            dono=self.dono, nome=nome, endereco='Rua A',
+            horario_funcionamento='11:00-23:00', tipo_cozinha=tipo_cozinha,
+        )
+
+    def contagens(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('api_facetas')).json()
+        return {faceta: {c['valor']: c['total'] for c in valores} for faceta, valores in data.items()}
+
+    def test_contagens_acompanham_as_alteracoes(self):
+        self.assertEqual(self.contagens(), {
+            'tipo_cozinha': {'Japonesa': 1, 'Italiana': 1},
+            'categoria': {'Sobremesa': 2, 'Prato Principal': 1},
+        })
+        self.pizzaria.tipo_cozinha = 'Japonesa'
+        self.pizzaria.save()
+        temaki = Produto.objects.get(nome='Temaki')
+        temaki.categoria = 'Entrada'
+        temaki.save()
+        self.sushi.delete()
+        self.assertEqual(self.contagens(), {
+            'tipo_cozinha': {'Japonesa': 1},
+            'categoria': {'Sobremesa': 1},
+        })
+
+    def test_instancia_com_campos_adiados(self):
+        antes = self.contagens()
+        # Campo adiado e não alterado: nada muda nas facetas
+        restaurante = Restaurante.objects.only('id', 'nome').get(pk=self.pizzaria.pk)
+        restaurante.nome = 'Forno Novo'
+        restaurante.save()
+        produto = Produto.objects.defer('categoria').get(nome='Temaki')
+        produto.preco = '32.00'
+        produto.save()
+        self.assertEqual(self.contagens(), antes)
+
+        # Campo adiado e atribuído depois: o valor anterior vem do banco
+        restaurante = Restaurante.objects.only('id').get(pk=self.pizzaria.pk)
+        restaurante.tipo_cozinha = 'Japonesa'
+        restaurante.save()
+        self.assertEqual(self.contagens()['tipo_cozinha'], {'Japonesa': 2})
+
+    def test_recalcular_bate_com_o_incremental(self):
+        antes = self.contagens()
+        call_command('recalcular_facetas', stdout=StringIO())
+        self.assertEqual(self.contagens(), antes)
+
+    def test_filtros_da_listagem(self):
+        url = reverse('api_restaurant_list')
+        ids = lambda params: [r['id'] for r in self.client.get(url, params).json()]
+        self.assertEqual(ids({'tipo_cozinha': 'Japonesa'}), [self.sushi.id])
+        self.assertEqual(ids({'categoria': 'Sobremesa'}), [self.sushi.id, self.pizzaria.id])
+        self.assertEqual(ids({'categoria': 'Prato Principal', 'tipo_cozinha': 'Italiana'}), [])
+
+
+class HorarioFuncionamentoTests(TestCase):
+
+    def test_interpreta_formatos(self):
+        self.assertEqual(intervalos_semana('08:00-22:00'), [(dia, 480, 1320) for dia in range(7)])
+        self.assertEqual(intervalos_semana('08:00–22:00'), [(dia, 480, 1320) for dia in range(7)])
+        self.assertEqual(intervalos_semana('Seg-Sex: 08:00-18:00'), [(dia, 480, 1080) for dia in range(5)])
+        self.assertEqual(intervalos_semana('Dom: fechado; Sáb: 10h—14h'), [(5, 600, 840)])
+        self.assertEqual(
+            intervalos_semana('Seg-Sex 11h-15h e 18h-23h; Sáb 10:00-14:00; Dom fechado'),
+            sorted([(d, 660, 900) for d in range(5)] + [(d, 1080, 1380) for d in range(5)] + [(5, 600, 840)]),
+        )
+        # Passa da meia-noite: o domingo termina na segunda de madrugada
+        self.assertEqual(intervalos_semana('Dom 18:00-02:00'), [(0, 0, 120), (6, 1080, 1440)])
+        for invalido in ('quando der', '25:00-10:00', 'Seg a Xyz 10-12'):
+            with self.assertRaises(HorarioInvalido):
+                intervalos_semana(invalido)
+
+    def test_filtro_aberto_agora(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        bar = Restaurante.objects.create(
+            dono=dono, nome='Bar', endereco='Rua A',
+            horario_funcionamento='Ter-Sáb 18:00-02:00', tipo_cozinha='Bar',
+        )
+        padaria = Restaurante.objects.create(
+            dono=dono, nome='Padaria', endereco='Rua B',
+            horario_funcionamento='06:00-12:00', tipo_cozinha='Padaria',
+        )
+        url = reverse('api_restaurant_list')
+
+        def abertos(ano, mes, dia, hora, minuto):
+            # Horário de Brasília (UTC-3)
+            agora = datetime(ano, mes, dia, hora + 3, minuto, tzinfo=dt_timezone.utc)
+            with mock.patch('core.horarios.timezone.now', return_value=agora):
+                return [r['id'] for r in self.client.get(url, {'aberto_agora': '1'}).json()]
+
+        # 2026-10-17 é um sábado
+        self.assertEqual(abertos(2026, 10, 17, 7, 0), [padaria.id])
+        self.assertEqual(abertos(2026, 10, 17, 19, 30), [bar.id])
+        self.assertEqual(abertos(2026, 10, 18, 1, 59), [bar.id])
+        self.assertEqual(abertos(2026, 10, 18, 2, 0), [])
+
+        bar.horario_funcionamento = '24h'
+        bar.save()
+        self.assertEqual(abertos(2026, 10, 18, 2, 0), [bar.id])
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+    def test_formulario_rejeita_horario_ininteligivel(self):
+        dados = {'nome': 'Bar', 'endereco': 'Rua A', 'tipo_cozinha': 'Bar', 'horario_funcionamento': 'sempre'}
+        self.assertIn('horario_funcionamento', RestauranteForm(dados).errors)
+
+
+class ProximidadeTests(TestCase):
+
+    # Endereços que existem em core/dados/geocodificacao.json
+    PAULISTA = 'Avenida Paulista, 1578 - Bela Vista, São Paulo - SP'
+    AUGUSTA = 'Rua Augusta, 1500 - Consolação, São Paulo - SP'
+    PINHEIROS = 'Rua dos Pinheiros, 320 - Pinheiros, São Paulo - SP'
+    SANTANA = 'Rua Voluntários da Pátria, 1500 - Santana, São Paulo - SP'
+    COPACABANA = 'Avenida Atlântica, 1702 - Copacabana, Rio de Janeiro - RJ'
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        self.augusta = self.criar_restaurante('Augusta', self.AUGUSTA, 5)
+        self.pinheiros = self.criar_restaurante('Pinheiros', self.PINHEIROS, 5)
+        # A ~7 km da Paulista, mas só entrega num raio de 3 km
+        self.santana = self.criar_restaurante('Santana', self.SANTANA, 3)
+        self.rio = self.criar_restaurante('Rio', self.COPACABANA, 15)
+        self.sem_endereco = self.criar_restaurante('Desconhecido', 'Rua Que Não Existe, 1', 15)
+        call_command('geocodificar', stdout=StringIO())
+
+    def criar_restaurante(self, nome, endereco, raio):
+        return Restaurante.objects.create(
+            dono=self.dono, nome=nome, endereco=endereco, horario_funcionamento='00:00-23:59',
+            tipo_cozinha='Brasileira', raio_entrega_km=raio,
+        )
+
+    def proximos(self, **params):
+        response = self.client.get(reverse('api_restaurant_list'), params)
+        return response.json()
+
+    def test_save_com_campos_adiados_preserva_as_coordenadas(self):
+        restaurante = Restaurante.objects.only('id', 'nome').get(pk=self.augusta.pk)
+        restaurante.nome = 'Augusta Nova'
+        restaurante.save()
+        coordenadas = ('latitude', 'longitude', 'celula_geo')
+        self.augusta.refresh_from_db()
+        self.assertIsNotNone(self.augusta.celula_geo)
+        antes = [getattr(self.augusta, campo) for campo in coordenadas]
+
+        restaurante = Restaurante.objects.defer('endereco').get(pk=self.augusta.pk)
+        restaurante.save()
+        self.augusta.refresh_from_db()
+        self.assertEqual([getattr(self.augusta, campo) for campo in coordenadas], antes)
+
+        restaurante = Restaurante.objects.only('id').get(pk=self.augusta.pk)
+        restaurante.endereco = self.PINHEIROS
+        restaurante.save()
+        self.augusta.refresh_from_db()
+        self.assertEqual([getattr(self.augusta, campo) for campo in coordenadas], [None, None, None])
+
+    def test_ordena_pela_distancia_e_respeita_o_raio(self):
+        lat, lon = -23.561414, -46.655881  # Avenida Paulista
+        data = self.proximos(lat=lat, lon=lon)
+        self.assertEqual([r['id'] for r in data], [self.augusta.id, self.pinheiros.id])
+        self.assertAlmostEqual(data[0]['distancia_km'], distancia_km(lat, lon, -23.556329, -46.660886), places=2)
+        self.assertEqual([r['id'] for r in self.proximos(lat=lat, lon=lon, raio_km=1)], [self.augusta.id])
+        self.assertEqual(self.proximos(lat=lat, lon='x')['error'], 'lat e lon devem ser números')
+
+    def test_usa_a_localizacao_do_cliente(self):
+        user = User.objects.create_user(username='cliente', password='senha123')
+        Cliente.objects.create(user=user, telefone='1', endereco=self.PAULISTA)
+        call_command('geocodificar', stdout=StringIO())
+        self.client.force_login(user)
+        self.assertEqual([r['id'] for r in self.proximos(perto=1)], [self.augusta.id, self.pinheiros.id])
+
+    def test_pre_filtro_usa_a_grade(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.proximos(lat=-22.967174, lon=-43.178813)
+        self.assertIn('"celula_geo" IN', consultas[0]['sql'])
+
+    def test_endereco_novo_invalida_coordenadas(self):
+        self.augusta.refresh_from_db()
+        self.assertIsNotNone(self.augusta.celula_geo)
+        self.augusta.endereco = 'Outro lugar'
+        self.augusta.save()
+        self.augusta.refresh_from_db()
+        self.assertIsNone(self.augusta.latitude)
+        self.assertIsNone(self.augusta.celula_geo)
+
+
+class CardapioHttpCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurante = Restaurante.objects.create(
+            dono=dono, nome='Cantina', endereco='Rua B',
+            horario_funcionamento='11:00-15:00', tipo_cozinha='Italiana',
+        )
+        self.produto = Produto.objects.create(
+            restaurante=self.restaurante, nome='Lasanha', descricao='', preco='30.00', categoria='Prato Principal'
+        )
+        self.url = reverse('api_restaurant_detail', args=[self.restaurante.id])
+
+    def versao(self):
+        self.restaurante.refresh_from_db()
+        return self.restaurante.versao_cardapio
+
+    def test_versao_incrementa_com_alteracoes(self):
+        versao = self.versao()
+        self.produto.preco = '32.00'
+        self.produto.save()
+        self.assertEqual(self.versao(), versao + 1)
+        self.restaurante.nome = 'Cantina Nova'
+        self.restaurante.save()
+        self.assertEqual(self.restaurante.versao_cardapio, versao + 2)
+        self.produto.delete()
+        self.assertEqual(self.versao(), versao + 3)
+
+    def test_requisicao_condicional_retorna_304(self):
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+        self.assertIn('public', response.headers['Cache-Control'])
+        # Só a versão do cardápio é consultada, a tabela de produtos não
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.produto.nome = 'Lasanha Bolonhesa'
+        self.produto.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_pagina_do_restaurante_usa_etag(self):
+        url = reverse('core:detalhe_restaurante', args=[self.restaurante.id])
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_etag_da_pagina_acompanha_o_token_csrf(self):
+        User.objects.create_user(username='cliente', password='senha123')
+        cliente = Client(enforce_csrf_checks=True)
+        url = reverse('core:detalhe_restaurante', args=[self.restaurante.id])
+
+        def entrar():
+            cliente.get(reverse('core:login'))
+            cliente.post(reverse('core:login'), {
+                'username': 'cliente', 'password': 'senha123',
+                'csrfmiddlewaretoken': cliente.cookies['csrftoken'].value,
+            })
+
+        def sair(pagina):
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', pagina.content.decode()).group(1)
+            return cliente.post(reverse('core:logout'), {'csrfmiddlewaretoken': token})
+
+        entrar()
+        pagina = cliente.get(url)
+        etag = pagina.headers['ETag']
+        self.assertEqual(sair(pagina).status_code, 302)
+
+        entrar()
+        pagina = cliente.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(pagina.status_code, 200)
+        self.assertEqual(sair(pagina).status_code, 302)
+
+
+class CardapioServerCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurantes = [
+            Restaurante.objects.create(
+                dono=dono, nome=nome, endereco='Rua C',
+                horario_funcionamento='11:00-23:00', tipo_cozinha='Japonesa',
+            )
+            for nome in ('Sushi Um', 'Sushi Dois')
+        ]
+        for restaurante in self.restaurantes:
+            Produto.objects.create(
+                restaurante=restaurante, nome='Temaki', descricao='', preco='25.00', categoria='Prato Principal'
+            )
+
+    def test_json_do_cardapio_em_cache(self):
+        url = reverse('api_restaurant_detail', args=[self.restaurantes[0].id])
+        self.client.get(url)
+        antes = estatisticas_cache()
+        # Só o restaurante é lido; os produtos vêm do cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['produtos'][0]['nome'], 'Temaki')
+        self.assertEqual(estatisticas_cache()['hits'], antes['hits'] + 1)
+
+    def test_invalida_apenas_o_restaurante_alterado(self):
+        urls = [reverse('api_restaurant_detail', args=[r.id]) for r in self.restaurantes]
+        for url in urls:
+            self.client.get(url)
+        Produto.objects.filter(restaurante=self.restaurantes[0]).get().delete()
+
+        antes = estatisticas_cache()
+        self.assertEqual(self.client.get(urls[0]).json()['produtos'], [])
+        self.client.get(urls[1])
+        depois = estatisticas_cache()
+        self.assertEqual(depois['misses'], antes['misses'] + 1)
+        self.assertEqual(depois['hits'], antes['hits'] + 1)
+
+    def test_secao_de_produtos_em_cache(self):
+        url = reverse('core:detalhe_restaurante', args=[self.restaurantes[0].id])
+        self.assertContains(self.client.get(url), 'Temaki')
+        antes = estatisticas_cache()
+        self.assertContains(self.client.get(url), 'Temaki')
+        self.assertEqual(estatisticas_cache()['hits'], antes['hits'] + 1)
+
+    def test_metricas_no_formato_prometheus(self):
+        response = self.client.get(reverse('api_cache_metrics'))
+        self.assertContains(response, 'delivery_cardapio_cache_hits_total')
+
+
+class CheckoutTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurante = Restaurante.objects.create(
+            dono=dono, nome='Burger', endereco='Rua D',
+            horario_funcionamento='18:00-23:00', tipo_cozinha='Lanches',
+        )
+        self.produtos = Produto.objects.bulk_create([
+            Produto(restaurante=self.restaurante, nome=f'Lanche {i}', descricao='', preco='12.50', categoria='Lanche')
+            for i in range(10)
+        ])
+        user = User.objects.create_user(username='cliente', password='senha123')
+        self.cliente = Cliente.objects.create(user=user, telefone='1199999999', endereco='Rua E')
+        motor.limpar()
+
+    def carrinho(self, n):
+        return {str(p.id): 2 for p in self.produtos[:n]}
+
+    def test_numero_de_escritas_constante(self):
+        # O primeiro pedido carrega o estado do restaurante no motor de ETA
+        criar_pedido(self.cliente, self.carrinho(1))
+        contagens = []
+        for n in (1, 10):
+            with CaptureQueriesContext(connection) as consultas:
+                pedido = criar_pedido(self.cliente, self.carrinho(n))
+            contagens.append(len(consultas))
+            self.assertEqual(pedido.itens.count(), n)
+            self.assertEqual(pedido.valor_total, Decimal('25.00') * n)
+        self.assertEqual(contagens[0], contagens[1])
+
+    def test_carrinho_com_produtos_inexistentes(self):
+        with self.assertRaises(CarrinhoInvalido):
+            criar_pedido(self.cliente, {'999999': 1})
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_checkout_api(self):
+        self.client.login(username='cliente', password='senha123')
+        session = self.client.session
+        session['carrinho'] = self.carrinho(3)
+        session.save()
+        response = self.client.post(reverse('api_checkout'))
+        pedido = Pedido.objects.get(pk=response.json()['pedido_id'])
+        self.assertEqual(pedido.restaurante, self.restaurante)
+        self.assertEqual(pedido.valor_total, Decimal('75.00'))
+        self.assertFalse(self.client.session['carrinho'])
+
+
+class EstimativaEntregaTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurante = Restaurante.objects.create(
+            dono=self.dono, nome='Pizzaria', endereco='Rua A',
+            horario_funcionamento='00:00-23:59', tipo_cozinha='Italiana',
+        )
+        self.produto = Produto.objects.create(
+            restaurante=self.restaurante, nome='Pizza', descricao='', preco='40.00', categoria='Pizza',
+        )
+        user = User.objects.create_user(username='cliente', password='senha123')
+        self.cliente = Cliente.objects.create(user=user, telefone='1', endereco='Rua B')
+        motor.limpar()
+
+    def pedir(self):
+        return criar_pedido(self.cliente, {str(self.produto.id): 1})
+
+    def test_sem_historico_usa_o_padrao(self):
+        entrega = self.pedir().entrega
+        total = round(sum(MINUTOS_PADRAO.values()))
+        self.assertEqual((entrega.minutos_minimo, entrega.minutos_maximo), (total, total + 5))
+        self.assertEqual(entrega.tempo_estimado, f'{total}-{total + 5} min')
+        self.assertIsNone(entrega.distancia_km)
+
+    def test_fila_aumenta_a_estimativa(self):
+        sozinho = self.pedir().entrega.minutos_minimo
+        motor.limpar()
+        for _ in range(2):
+            self.pedir()
+        motor.limpar()
+        # Três pedidos à frente, três preparados ao mesmo tempo: um preparo a mais
+        self.assertEqual(self.pedir().entrega.minutos_minimo, sozinho + round(MINUTOS_PADRAO['preparo']))
+
+    def test_historico_do_restaurante(self):
+        inicio = timezone.now() - timedelta(hours=2)
+        for i in range(3):
+            pedido = Pedido.objects.create(cliente=self.cliente, restaurante=self.restaurante, status='Entregue')
+            PedidoEvento.objects.bulk_create([
+                PedidoEvento(pedido=pedido, restaurante=self.restaurante, status=status, criado_em=inicio + timedelta(minutes=m))
+                for status, m in (('Pendente', 0), ('Em preparação', 2), ('A caminho', 12), ('Entregue', 20))
+            ])
+        # 2 min de aceite + 10 de preparo + 8 de deslocamento
+        self.assertEqual(self.pedir().entrega.minutos_minimo, 20)
+
+    def test_eventos_atualizam_o_estado_em_memoria(self):
+        self.pedir()
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = Pedido.objects.create(cliente=self.cliente, restaurante=self.restaurante)
+        with self.captureOnCommitCallbacks(execute=True):
+            mudar_status(pedido.id, 'Pendente', 'Em preparação', self.dono)
+        estado = motor._estado(self.restaurante.id)
+        self.assertEqual(estado.fila['Em preparação'], 1)
+        self.assertEqual(estado.medias['aceite'].amostras, 1)
+
+    def test_distancia_quando_geocodificado(self):
+        Restaurante.objects.filter(pk=self.restaurante.id).update(latitude=-23.556329, longitude=-46.660886)
+        Cliente.objects.filter(pk=self.cliente.pk).update(latitude=-23.561414, longitude=-46.655881)
+        self.cliente.refresh_from_db()
+        entrega = self.pedir().entrega
+        self.assertAlmostEqual(entrega.distancia_km, distancia_km(-23.556329, -46.660886, -23.561414, -46.655881))
+        self.assertLess(entrega.minutos_minimo, round(sum(MINUTOS_PADRAO.values())))
+
+    def test_checkout_devolve_a_estimativa(self):
+        self.client.login(username='cliente', password='senha123')
+        session = self.client.session
+        session['carrinho'] = {str(self.produto.id): 1}
+        session.save()
+        data = self.client.post(reverse('api_checkout')).json()
+        entrega = Entrega.objects.get(pedido_id=data['pedido_id'])
+        self.assertEqual(data['tempo_estimado']['minimo'], entrega.minutos_minimo)
+        self.assertEqual(data['tempo_estimado']['texto'], entrega.tempo_estimado)
+
+
+class DespachoTests(TestCase):
+
+    PAULISTA = (-23.561414, -46.655881)
+    AUGUSTA = (-23.556329, -46.660886)
+    SANTANA = (-23.502600, -46.625200)
+
+    def test_agrupa_pedidos_proximos(self):
+        a = PedidoDespacho(1, self.PAULISTA, self.AUGUSTA)
+        b = PedidoDespacho(2, self.PAULISTA, (-23.5580, -46.6620))
+        rotas = planejar([a, b], [EntregadorLivre(7, self.PAULISTA), EntregadorLivre(8, self.SANTANA)])
+        self.assertEqual(len(rotas), 1)
+        self.assertEqual(rotas[0].entregador_id, 7)
+        paradas = [(tipo, pedido.pedido_id) for tipo, pedido in rotas[0].paradas]
+        for pedido_id in (1, 2):
+            self.assertLess(paradas.index((COLETA, pedido_id)), paradas.index((ENTREGA, pedido_id)))
+
+    def test_respeita_desvio_capacidade_e_coordenadas(self):
+        perto = PedidoDespacho(1, self.PAULISTA, self.AUGUSTA)
+        longe = PedidoDespacho(2, self.SANTANA, self.PAULISTA)
+        sem_endereco = PedidoDespacho(3, self.PAULISTA, None)
+        entregadores = [EntregadorLivre(i, self.PAULISTA) for i in (1, 2)]
+        rotas = planejar([perto, longe, sem_endereco], entregadores)
+        # Só dois entregadores: o pedido sem coordenadas fica para o próximo ciclo
+        self.assertEqual([[p.pedido_id for p in rota.pedidos] for rota in rotas], [[1], [2]])
+
+    def test_despachar_grava_as_rotas(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        restaurante = Restaurante.objects.create(
+            dono=dono, nome='Pizzaria', endereco='Rua A', horario_funcionamento='00:00-23:59',
+            tipo_cozinha='Italiana', latitude=self.PAULISTA[0], longitude=self.PAULISTA[1],
+        )
+        produto = Produto.objects.create(restaurante=restaurante, nome='Pizza', descricao='', preco='40.00', categoria='Pizza')
+        user = User.objects.create_user(username='cliente', password='senha123')
+        cliente = Cliente.objects.create(
+            user=user, telefone='1', endereco='Rua B', latitude=self.AUGUSTA[0], longitude=self.AUGUSTA[1],
+        )
+        pedidos = [criar_pedido(cliente, {str(produto.id): 1}) for _ in range(3)]
+        mudar_status_em_lote([p.id for p in pedidos[:2]], 'Em preparação', dono)
+        entregador = Entregador.objects.create(nome='Carlos', latitude=self.PAULISTA[0], longitude=self.PAULISTA[1])
+
+        rotas = despachar()
+        self.assertEqual(len(rotas), 1)
+        entregas = Entrega.objects.filter(rota=rotas[0]).order_by('parada_coleta')
+        self.assertEqual({e.pedido_id for e in entregas}, {pedidos[0].id, pedidos[1].id})
+        self.assertTrue(all(e.despachado_em for e in entregas))
+        # O pedido ainda Pendente não entra, e o entregador agora está ocupado
+        self.assertIsNone(Entrega.objects.get(pedido=pedidos[2]).rota_id)
+        self.assertEqual(entregadores_livres(), [])
+        mudar_status_em_lote([p.id for p in pedidos[:2]], 'Cancelado', dono)
+        self.assertEqual([e.entregador_id for e in entregadores_livres()], [entregador.id])
+
+    def test_simulacao_deterministica(self):
+        saidas = []
+        for _ in range(2):
+            saida = StringIO()
+            call_command('simular_despacho', horas=1, pedidos_por_hora=60, entregadores=10, stdout=saida)
+            # A última linha é tempo de CPU
+            saidas.append(saida.getvalue().splitlines()[:-1])
+        self.assertEqual(saidas[0], saidas[1])
+        self.assertIn('Pedidos por entregador-hora', '\n'.join(saidas[0]))
+
+
+class AvaliacaoTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurantes = [
+            Restaurante.objects.create(
+                dono=dono, nome=f'Restaurante {i}', endereco='Rua A',
+                horario_funcionamento='00:00-23:59', tipo_cozinha='Brasileira',
+            )
+            for i in range(3)
+        ]
+        self.clientes = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'cliente{i}', password='senha123')
+            cliente = Cliente.objects.create(user=user, telefone='1', endereco='Rua B')
+            for restaurante in self.restaurantes:
+                Pedido.objects.create(cliente=cliente, restaurante=restaurante, status='Entregue')
+            self.clientes.append(cliente)
+
+    def avaliar(self, cliente, restaurante, nota, **extra):
+        self.client.force_login(cliente.user)
+        return self.client.post(
+            reverse('api_avaliacoes', args=[restaurante.id]), {'nota': nota, **extra}, content_type='application/json',
+        )
+
+    def test_save_do_restaurante_nao_regrava_agregados(self):
+        # Instância lida antes da avaliação, como num formulário do admin
+        restaurante = Restaurante.objects.get(pk=self.restaurantes[0].pk)
+        self.avaliar(self.clientes[0], restaurante, 4)
+        restaurante.nome = 'Novo nome'
+        restaurante.save()
+        restaurante.refresh_from_db()
+        self.assertEqual((restaurante.nome, restaurante.total_avaliacoes, restaurante.soma_notas), ('Novo nome', 1, 4))
+
+    def test_agregados_acompanham_as_avaliacoes(self):
+        restaurante = self.restaurantes[0]
+        self.assertEqual(self.avaliar(self.clientes[0], restaurante, 5).json()['nota_media'], 5)
+        data = self.avaliar(self.clientes[1], restaurante, 2, comentario='Demorou').json()
+        self.assertEqual((data['nota_media'], data['total_avaliacoes']), (3.5, 2))
+        # Mandar de novo substitui a nota, sem contar outra avaliação
+        data = self.avaliar(self.clientes[1], restaurante, 4).json()
+        self.assertEqual((data['nota_media'], data['total_avaliacoes']), (4.5, 2))
+        Avaliacao.objects.get(cliente=self.clientes[0]).delete()
+        restaurante.refresh_from_db()
+        self.assertEqual((restaurante.nota_media, restaurante.total_avaliacoes, restaurante.soma_notas), (4.0, 1, 4))
+
+    def test_validacoes(self):
+        self.assertEqual(self.avaliar(self.clientes[0], self.restaurantes[0], 6).status_code, 400)
+        self.assertEqual(self.avaliar(self.clientes[0], self.restaurantes[0], '5').status_code, 400)
+        Pedido.objects.filter(cliente=self.clientes[0], restaurante=self.restaurantes[0]).update(status='Cancelado')
+        self.assertEqual(self.avaliar(self.clientes[0], self.restaurantes[0], 5).status_code, 403)
+        self.client.logout()
+        response = self.client.post(reverse('api_avaliacoes', args=[self.restaurantes[0].id]), {'nota': 5},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_listagem_das_avaliacoes(self):
+        for i, cliente in enumerate(self.clientes):
+            self.avaliar(cliente, self.restaurantes[0], i + 3)
+        response = self.client.get(reverse('api_avaliacoes', args=[self.restaurantes[0].id]), {'limit': 2})
+        data = response.json()
+        self.assertEqual((data['nota_media'], data['total_avaliacoes']), (4.0, 3))
+        self.assertEqual([a['cliente'] for a in data['avaliacoes']], ['cliente2', 'cliente1'])
+        response = self.client.get(
+            reverse('api_avaliacoes', args=[self.restaurantes[0].id]), {'cursor': response['X-Next-Cursor']}
+        )
+        self.assertEqual([a['nota'] for a in response.json()['avaliacoes']], [3])
+        self.assertEqual(str(Avaliacao.objects.get(nota=3)), 'Avaliação de cliente0 para Restaurante 0: Nota 3')
+
+    def test_listagem_de_restaurantes_ordenada_pela_nota(self):
+        self.avaliar(self.clientes[0], self.restaurantes[1], 5)
+        self.avaliar(self.clientes[0], self.restaurantes[2], 3)
+        self.avaliar(self.clientes[1], self.restaurantes[2], 4)
+        url = reverse('api_restaurant_list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'ordenar': 'nota', 'limit': 2, 'fields': 'nome,nota_media'})
+        self.assertEqual(
+            response.json(),
+            [{'id': self.restaurantes[1].id, 'nome': 'Restaurante 1', 'nota_media': 5.0},
+             {'id': self.restaurantes[2].id, 'nome': 'Restaurante 2', 'nota_media': 3.5}],
+        )
+        response = self.client.get(url, {'ordenar': 'nota', 'cursor': response['X-Next-Cursor']})
+        self.assertEqual([r['id'] for r in response.json()], [self.restaurantes[0].id])
+        self.assertEqual(self.client.get(url, {'ordenar': 'nota', 'cursor': 'x'}).status_code, 400)
+
+    def test_recalcular(self):
+        Avaliacao.objects.bulk_create([
+            Avaliacao(cliente=cliente, restaurante=self.restaurantes[0], nota=nota)
+            for cliente, nota in zip(self.clientes, (1, 2, 4))
+        ])
+        call_command('recalcular_avaliacoes', stdout=StringIO())
+        restaurante = Restaurante.objects.get(pk=self.restaurantes[0].id)
+        self.assertEqual((restaurante.total_avaliacoes, restaurante.soma_notas), (3, 7))
+        self.assertAlmostEqual(restaurante.nota_media, 7 / 3)
+        self.assertEqual(Restaurante.objects.get(pk=self.restaurantes[1].id).nota_media, 0)
+
+
+class VendasDiariasTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        Cliente.objects.create(user=self.dono, telefone='1', endereco='-', tipo_usuario='RESTAURANTE')
+        self.restaurante = Restaurante.objects.create(
+            dono=self.dono, nome='Pizzaria', endereco='Rua A',
+            horario_funcionamento='00:00-23:59', tipo_cozinha='Italiana',
+        )
+        self.pizza, self.suco = Produto.objects.bulk_create([
+            Produto(restaurante=self.restaurante, nome='Pizza', descricao='', preco='40.00', categoria='Pizza'),
+            Produto(restaurante=self.restaurante, nome='Suco', descricao='', preco='7.50', categoria='Bebida'),
+        ])
+        user = User.objects.create_user(username='cliente', password='senha123')
+        self.cliente = Cliente.objects.create(user=user, telefone='1', endereco='Rua B')
+
+    def pedir(self, pizzas, sucos):
+        return criar_pedido(self.cliente, {str(self.pizza.id): pizzas, str(self.suco.id): sucos})
+
+    def rollups(self):
+        dias = list(VendaDiaria.objects.values_list('pedidos', 'faturamento_centavos', 'cancelados'))
+        produtos = dict(
+            VendaProdutoDiaria.objects.values_list('produto_id').annotate(total=Sum('quantidade')).order_by()
+        )
+        return dias, produtos
+
+    def test_checkout_e_cancelamentos(self):
+        pedidos = [self.pedir(1, 2), self.pedir(2, 0), self.pedir(1, 1), self.pedir(3, 0)]
+        self.assertEqual(self.rollups(), ([(4, 5500 + 8000 + 4750 + 12000, 0)], {self.pizza.id: 7, self.suco.id: 3}))
+        mudar_status(pedidos[0].id, 'Pendente', 'Cancelado', self.dono)
+        mudar_status_em_lote([pedidos[1].id], 'Cancelado', self.dono)
+        pedido = Pedido.objects.get(pk=pedidos[2].id)
+        pedido.status = 'Cancelado'
+        pedido.save()
+        # Mudanças que não cancelam não mexem nas vendas
+        mudar_status(pedidos[3].id, 'Pendente', 'Em preparação', self.dono)
+        esperado = ([(1, 12000, 3)], {self.pizza.id: 3, self.suco.id: 0})
+        self.assertEqual(self.rollups(), esperado)
+        call_command('recalcular_vendas', stdout=StringIO())
+        self.assertEqual(self.rollups()[0], esperado[0])
+        self.assertEqual(self.rollups()[1][self.pizza.id], 3)
+
+    def test_api_de_vendas(self):
+        self.pedir(2, 2)
+        self.pedir(1, 0)
+        # Histórico de 90 dias gravado direto nos rollups
+        hoje = dia_local(timezone.now())
+        VendaDiaria.objects.bulk_create([
+            VendaDiaria(restaurante=self.restaurante, dia=hoje - timedelta(days=d), pedidos=2, faturamento_centavos=3000)
+            for d in range(1, 90)
+        ])
+        self.client.login(username='dono', password='senha123')
+        inicio = (hoje - timedelta(days=89)).isoformat()
+        with self.assertNumQueries(5):  # sessão, usuário, restaurantes, dias, produtos
+            data = self.client.get(reverse('api_painel_vendas'), {'inicio': inicio, 'fim': hoje.isoformat()}).json()
+        self.assertEqual(len(data['por_dia']), 90)
+        self.assertEqual(data['pedidos'], 2 + 89 * 2)
+        self.assertEqual(data['faturamento'], str(Decimal('135.00') + 89 * Decimal('30.00')))
+        self.assertEqual(data['mais_vendidos'][0], {
+            'produto_id': self.pizza.id, 'nome': 'Pizza', 'quantidade': 3, 'faturamento': '120.00',
+        })
+        self.assertEqual(self.client.get(reverse('api_painel_vendas'), {'inicio': 'ontem'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('api_painel_vendas'), {'inicio': '2020-01-01', 'fim': '2022-01-01'}).status_code,
+            400,
+        )
+        self.client.force_login(self.cliente.user)
+        self.assertEqual(self.client.get(reverse('api_painel_vendas')).status_code, 404)
+
+    def test_painel_mostra_o_resumo(self):
+        self.pedir(1, 2)
+        self.client.login(username='dono', password='senha123')
+        response = self.client.get(reverse('core:painel_restaurante'))
+        self.assertContains(response, 'Faturamento: R$ 55.00')
+        self.assertContains(response, 'Suco - 2 un.')
+
+
+class CheckoutIdempotenteTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        restaurante = Restaurante.objects.create(
+            dono=dono, nome='Pastelaria', endereco='Rua F',
+            horario_funcionamento='10:00-20:00', tipo_cozinha='Lanches',
+        )
+        self.produto = Produto.objects.create(
+            restaurante=restaurante, nome='Pastel', descricao='', preco='8.00', categoria='Lanche'
+        )
+        user = User.objects.create_user(username='cliente', password='senha123')
+        Cliente.objects.create(user=user, telefone='1199999999', endereco='Rua G')
+        self.client.login(username='cliente', password='senha123')
+
+    def checkout(self, chave):
+        session = self.client.session
+        if not session.get('carrinho'):
+            session['carrinho'] = {str(self.produto.id): 1}
+            session.save()
+        return self.client.post(reverse('api_checkout'), HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_repeticao_devolve_o_mesmo_pedido(self):
+        primeira = self.checkout('abc-123')
+        segunda = self.client.post(reverse('api_checkout'), HTTP_IDEMPOTENCY_KEY='abc-123')
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(segunda.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Pedido.objects.count(), 1)
+
+        self.checkout('outra-chave')
+        self.assertEqual(Pedido.objects.count(), 2)
+
+    def test_chave_em_andamento_devolve_409(self):
+        user = User.objects.get(username='cliente')
+        ChaveIdempotencia.objects.create(user=user, chave='em-andamento')
+        self.assertEqual(self.checkout('em-andamento').status_code, 409)
+        self.assertEqual(Pedido.objects.count(), 0)
+
+    def test_falha_libera_a_chave(self):
+        resposta = self.client.post(reverse('api_checkout'), HTTP_IDEMPOTENCY_KEY='vazio')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+        self.assertEqual(self.checkout('vazio').status_code, 200)
+
+    def test_comando_purga_chaves_expiradas(self):
+        self.checkout('antiga')
+        self.checkout('recente')
+        ChaveIdempotencia.objects.filter(chave='antiga').update(
+            criado_em=timezone.now() - timedelta(days=2)
+        )
+        call_command('purgar_chaves_idempotencia', stdout=StringIO())
+        self.assertEqual(list(ChaveIdempotencia.objects.values_list('chave', flat=True)), ['recente'])
+
+
+class CarrinhoBackendTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        restaurante = Restaurante.objects.create(
+            dono=dono, nome='Padaria', endereco='Rua H',
+            horario_funcionamento='06:00-20:00', tipo_cozinha='Padaria',
+        )
+        self.produtos = Produto.objects.bulk_create([
+            Produto(restaurante=restaurante, nome=f'Pão {i}', descricao='', preco='1.50', categoria='Pães')
+            for i in range(2)
+        ])
+        self.user = User.objects.create_user(username='cliente', password='senha123')
+        Cliente.objects.create(user=self.user, telefone='1199999999', endereco='Rua I')
+
+    def test_codificacao_compacta_da_sessao(self):
+        self.assertEqual(empacotar({'12': 3, '45': 1}), '12:3,45:1')
+        self.assertEqual(desempacotar('12:3,45:1'), {'12': 3, '45': 1})
+        self.assertEqual(desempacotar({'12': 3}), {'12': 3})
+        self.assertEqual(desempacotar(''), {})
+
+    def test_produto_id_invalido(self):
+        url = reverse('api_add_to_cart')
+        for corpo in ({'produto_id': 'abc'}, {}, {'produto_id': [1]}):
+            self.assertEqual(self.client.post(url, corpo, content_type='application/json').status_code, 400)
+        self.client.post(url, {'produto_id': str(self.produtos[0].id)}, content_type='application/json')
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['itens'][0]['quantidade'], 1)
+
+    @override_settings(CARRINHO_BACKEND='modelo')
+    def test_backend_modelo_incrementa_no_banco(self):
+        self.client.login(username='cliente', password='senha123')
+        url = reverse('api_add_to_cart')
+        for _ in range(3):
+            self.client.post(url, {'produto_id': self.produtos[0].id}, content_type='application/json')
+        self.assertEqual(ItemCarrinho.objects.get().quantidade, 3)
+        self.assertNotIn('carrinho', self.client.session)
+
+    @override_settings(CARRINHO_BACKEND='modelo')
+    def test_carrinho_anonimo_mesclado_no_login(self):
+        Carrinho.objects.create(user=self.user).itens.create(produto=self.produtos[0], quantidade=1)
+        url = reverse('api_add_to_cart')
+        for produto in self.produtos:
+            self.client.post(url, {'produto_id': produto.id}, content_type='application/json')
+
+        self.client.post(reverse('api_login'), {'username': 'cliente', 'password': 'senha123'}, content_type='application/json')
+        itens = self.client.get(reverse('api_cart')).json()['itens']
+        self.assertEqual(
+            {i['produto_id']: i['quantidade'] for i in itens},
+            {self.produtos[0].id: 2, self.produtos[1].id: 1},
+        )
+
+    @override_settings(CARRINHO_BACKEND='modelo')
+    def test_login_com_carrinhos_de_restaurantes_diferentes(self):
+        outro = Restaurante.objects.create(
+            dono=self.produtos[0].restaurante.dono, nome='Pizzaria', endereco='Rua K',
+            horario_funcionamento='18:00-23:00', tipo_cozinha='Italiana',
+        )
+        pizza = Produto.objects.create(restaurante=outro, nome='Pizza', descricao='', preco='40.00', categoria='Pizzas')
+        Carrinho.objects.create(user=self.user).itens.create(produto=self.produtos[0], quantidade=1)
+        self.client.post(reverse('api_add_to_cart'), {'produto_id': pizza.id}, content_type='application/json')
+
+        resposta = self.client.post(
+            reverse('core:login'), {'username': 'cliente', 'password': 'senha123'}, follow=True
+        )
+        self.assertContains(resposta, 'foi substituído pelo carrinho atual')
+        itens = self.client.get(reverse('api_cart')).json()['itens']
+        self.assertEqual({i['produto_id']: i['quantidade'] for i in itens}, {pizza.id: 1})
+
+    @override_settings(CARRINHO_BACKEND='modelo')
+    def test_carrinho_com_dois_restaurantes_lista_os_itens(self):
+        outro = Restaurante.objects.create(
+            dono=self.produtos[0].restaurante.dono, nome='Pizzaria', endereco='Rua K',
+            horario_funcionamento='18:00-23:00', tipo_cozinha='Italiana',
+        )
+        pizza = Produto.objects.create(restaurante=outro, nome='Pizza', descricao='', preco='40.00', categoria='Pizzas')
+        carrinho = Carrinho.objects.create(user=self.user)
+        carrinho.itens.create(produto=self.produtos[0], quantidade=1)
+        carrinho.itens.create(produto=pizza, quantidade=1)
+        self.client.login(username='cliente', password='senha123')
+
+        resposta = self.client.get(reverse('core:ver_carrinho'))
+        self.assertContains(resposta, 'mais de um restaurante')
+        self.assertContains(resposta, 'Pizza')
+        self.assertContains(resposta, 'Pão 0')
+        self.assertNotContains(resposta, reverse('core:finalizar_pedido'))
+
+
+class CarrinhoEmLoteTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        restaurante = Restaurante.objects.create(
+            dono=dono, nome='Açaí', endereco='Rua J',
+            horario_funcionamento='10:00-22:00', tipo_cozinha='Sobremesas',
+        )
+        self.produtos = Produto.objects.bulk_create([
+            Produto(restaurante=restaurante, nome=f'Açaí {i}', descricao='', preco='10.00', categoria='Sobremesa')
+            for i in range(3)
+        ])
+        user = User.objects.create_user(username='cliente', password='senha123')
+        Cliente.objects.create(user=user, telefone='1199999999', endereco='Rua K')
+        self.client.login(username='cliente', password='senha123')
+
+    def patch(self, operacoes):
+        return self.client.patch(reverse('api_cart'), {'operacoes': operacoes}, content_type='application/json')
+
+    def quantidades(self, response):
+        return {i['produto_id']: i['quantidade'] for i in response.json()['itens']}
+
+    def operacoes_de_exemplo(self):
+        a, b, c = (p.id for p in self.produtos)
+        self.patch([{'produto_id': c, 'quantidade': 1}])
+        response = self.patch([
+            {'produto_id': a, 'quantidade': 4, 'op': 'set'},
+            {'produto_id': b, 'op': 'increment'},
+            {'produto_id': b, 'quantidade': 2, 'op': 'increment'},
+            {'produto_id': c, 'op': 'remove'},
+        ])
+        self.assertEqual(self.quantidades(response), {a: 4, b: 3})
+        self.assertEqual(response.json()['total'], '70.00')
+
+    def test_operacoes_em_lote_na_sessao(self):
+        self.operacoes_de_exemplo()
+
+    @override_settings(CARRINHO_BACKEND='modelo')
+    def test_operacoes_em_lote_no_modelo(self):
+        self.operacoes_de_exemplo()
+        self.assertEqual(ItemCarrinho.objects.count(), 2)
+
+    def test_lote_invalido_nao_altera_o_carrinho(self):
+        self.patch([{'produto_id': self.produtos[0].id, 'quantidade': 1}])
+        response = self.patch([
+            {'produto_id': self.produtos[0].id, 'quantidade': 5},
+            {'produto_id': 999999, 'quantidade': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantidades(self.client.get(reverse('api_cart'))), {self.produtos[0].id: 1})
+
+
+class PrecificacaoTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurantes = [
+            Restaurante.objects.create(
+                dono=dono, nome=nome, endereco='Rua L',
+                horario_funcionamento='11:00-23:00', tipo_cozinha='Variada',
+            )
+            for nome in ('Um', 'Dois')
+        ]
+        self.a = Produto.objects.create(restaurante=self.restaurantes[0], nome='A', descricao='', preco='0.10', categoria='-')
+        self.b = Produto.objects.create(restaurante=self.restaurantes[0], nome='B', descricao='', preco='0.20', categoria='-')
+        self.c = Produto.objects.create(restaurante=self.restaurantes[1], nome='C', descricao='', preco='5.00', categoria='-')
+
+    def test_uma_consulta_e_total_decimal(self):
+        with self.assertNumQueries(1):
+            precificado = precificar_carrinho({str(self.a.id): 3, str(self.b.id): 1})
+        self.assertEqual(precificado.total, Decimal('0.50'))
+        self.assertIsInstance(precificado.total, Decimal)
+        self.assertEqual(precificado.restaurante_id, self.restaurantes[0].id)
+        self.assertEqual([l.subtotal for l in precificado.linhas], [Decimal('0.30'), Decimal('0.20')])
+
+    def test_rejeita_carrinho_de_varios_restaurantes(self):
+        with self.assertRaises(CarrinhoMultiRestaurante):
+            precificar_carrinho({str(self.a.id): 1, str(self.c.id): 1})
+
+    def test_api_recusa_produto_de_outro_restaurante(self):
+        url = reverse('api_add_to_cart')
+        self.client.post(url, {'produto_id': self.a.id}, content_type='application/json')
+        response = self.client.post(url, {'produto_id': self.c.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['total'], '0.10')
+
+
+class IndicesPedidoTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', password='senha123')
+        self.cliente = Cliente.objects.create(user=self.user, telefone='1199999999', endereco='Rua M')
+        self.restaurante = Restaurante.objects.create(
+            dono=self.user, nome='Bistrô', endereco='Rua N',
+            horario_funcionamento='12:00-22:00', tipo_cozinha='Francesa',
+        )
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = queryset.explain()
+        self.assertIn(f'USING INDEX {indice}', plano)
+        # A ordenação vem do próprio índice, sem ordenar em tabela temporária
+        self.assertNotIn('TEMP B-TREE', plano)
+
+    def test_historico_do_cliente(self):
+        self.assertUsaIndice(
+            Pedido.objects.filter(cliente__user=self.user).order_by('-data_pedido'),
+            'pedido_cliente_data_idx',
+        )
+
+    def test_pedidos_do_restaurante(self):
+        self.assertUsaIndice(
+            Pedido.objects.filter(restaurante=self.restaurante).order_by('-data_pedido'),
+            'pedido_restaurante_data_idx',
+        )
+
+    def test_pedidos_do_restaurante_por_status(self):
+        self.assertUsaIndice(
+            Pedido.objects.filter(restaurante=self.restaurante, status='Pendente'),
+            'pedido_restaurante_status_idx',
+        )
+
+
+class PainelPedidosTests(TestCase):
+
+    def setUp(self):
+        dono = User.objects.create_user(username='dono', password='senha123')
+        Cliente.objects.create(user=dono, telefone='1199999999', endereco='Rua O', tipo_usuario='RESTAURANTE')
+        self.restaurante = Restaurante.objects.create(
+            dono=dono, nome='Churrascaria', endereco='Rua P',
+            horario_funcionamento='11:00-23:00', tipo_cozinha='Brasileira',
+        )
+        self.client.login(username='dono', password='senha123')
+        self.url = reverse('core:ver_pedidos_restaurante')
+
+    def criar_pedidos(self, n, status='Pendente'):
+        clientes = []
+        for i in range(n):
+            user = User.objects.create(username=f'cliente-{status}-{Pedido.objects.count()}-{i}')
+            clientes.append(Cliente.objects.create(user=user, telefone='1', endereco='-'))
+        Pedido.objects.bulk_create([
+            Pedido(cliente=c, restaurante=self.restaurante, status=status, valor_total='10.00')
+            for c in clientes
+        ])
+
+    def contar_consultas(self, **params):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, params)
+        return len(consultas), response
+
+    def test_consultas_nao_crescem_com_o_historico(self):
+        self.criar_pedidos(5)
+        poucos, _ = self.contar_consultas()
+        self.criar_pedidos(45)
+        muitos, response = self.contar_consultas()
+        self.assertEqual(poucos, muitos)
+        self.assertEqual(len(response.context['pedidos']), 50)
+
+    def test_filtro_padrao_mostra_apenas_ativos(self):
+        self.criar_pedidos(2)
+        self.criar_pedidos(3, status='Entregue')
+        _, response = self.contar_consultas()
+        self.assertEqual({p.status for p in response.context['pedidos']}, {'Pendente'})
+        _, response = self.contar_consultas(status='Entregue')
+        self.assertEqual(len(response.context['pedidos']), 3)
+        _, response = self.contar_consultas(status='todos')
+        self.assertEqual(len(response.context['pedidos']), 5)
+
+    def test_paginacao_do_historico(self):
+        self.criar_pedidos(PEDIDOS_POR_PAGINA + 3, status='Entregue')
+        _, pagina1 = self.contar_consultas(status='todos')
+        cursor = pagina1.context['proximo_cursor']
+        _, pagina2 = self.contar_consultas(status='todos', cursor=cursor)
+        ids = [p.id for p in pagina1.context['pedidos']] + [p.id for p in pagina2.context['pedidos']]
+        self.assertEqual(ids, sorted(Pedido.objects.values_list('id', flat=True), reverse=True))
+        self.assertIsNone(pagina2.context['proximo_cursor'])
+
+
+class BrokerMemoria(BrokerLocal):
+    # Substituto de um broker externo nos testes: as mensagens passam por
+    # JSON, como passariam pelo Redis, e ficam registradas para conferência.
+    publicadas = []
+
+    def publicar(self, canal, mensagem):
+        BrokerMemoria.publicadas.append((canal, mensagem))
+        super().publicar(canal, json.loads(json.dumps(mensagem)))
+
+
+@override_settings(NOTIFICACOES_BROKER='core.tests.BrokerMemoria', SSE_HEARTBEAT_SEGUNDOS=0.05)
+class NotificacoesPedidoTests(TestCase):
+
+    def setUp(self):
+        BrokerMemoria.publicadas = []
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        Cliente.objects.create(user=self.dono, telefone='1', endereco='-', tipo_usuario='RESTAURANTE')
+        self.restaurante = Restaurante.objects.create(
+            dono=self.dono, nome='Tapiocaria', endereco='Rua Q',
+            horario_funcionamento='07:00-14:00', tipo_cozinha='Nordestina',
+        )
+        user = User.objects.create_user(username='cliente', password='senha123')
+        self.cliente = Cliente.objects.create(user=user, telefone='1', endereco='-')
+
+    def criar_pedido(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Pedido.objects.create(cliente=self.cliente, restaurante=self.restaurante)
+
+    def test_publica_criacao_e_mudanca_de_status(self):
+        pedido = self.criar_pedido()
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.status = 'Em preparação'
+            pedido.save()
+        self.assertEqual(BrokerMemoria.publicadas, [
+            (f'restaurante:{self.restaurante.id}', {'evento': 'criado', 'pedido_id': pedido.id, 'status': 'Pendente'}),
+            (f'cliente:{self.cliente.id}', {'evento': 'criado', 'pedido_id': pedido.id, 'status': 'Pendente'}),
+            (f'restaurante:{self.restaurante.id}', {'evento': 'atualizado', 'pedido_id': pedido.id, 'status': 'Em preparação'}),
+            (f'cliente:{self.cliente.id}', {'evento': 'atualizado', 'pedido_id': pedido.id, 'status': 'Em preparação'}),
+        ])
+
+    def test_nada_e_publicado_sem_commit(self):
+        Pedido.objects.create(cliente=self.cliente, restaurante=self.restaurante)
+        self.assertEqual(BrokerMemoria.publicadas, [])
+
+    async def test_sse_entrega_pedidos_ao_restaurante(self):
+        await self.async_client.aforce_login(self.dono)
+        response = await self.async_client.get(reverse('api_pedidos_eventos'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        fluxo = response.streaming_content
+        self.assertEqual(await anext(fluxo), b'retry: 5000\n\n')
+        # Sem mensagens, o fluxo manda heartbeats
+        self.assertEqual(await anext(fluxo), b': ping\n\n')
+
+        pedido = await sync_to_async(self.criar_pedido)()
+        while (chunk := await asyncio.wait_for(anext(fluxo), 1)) == b': ping\n\n':
+            pass
+        self.assertEqual(chunk.decode(), 'event: pedido\ndata: ' + json.dumps(
+            {'evento': 'criado', 'pedido_id': pedido.id, 'status': 'Pendente'}
+        ) + '\n\n')
+        await fluxo.aclose()
+
+    async def test_sse_exige_login(self):
+        response = await self.async_client.get(reverse('api_pedidos_eventos'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_sem_asgi_nao_abre_o_fluxo(self):
+        self.client.force_login(self.dono)
+        self.assertEqual(self.client.get(reverse('api_pedidos_eventos')).status_code, 501)
+        self.assertNotContains(self.client.get(reverse('core:ver_pedidos_restaurante')), 'EventSource')
+
+    async def test_pagina_abre_o_fluxo_sob_asgi(self):
+        await self.async_client.aforce_login(self.dono)
+        response = await self.async_client.get(reverse('core:ver_pedidos_restaurante'))
+        self.assertContains(response, 'EventSource')
+
+
+class TransicaoStatusTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        Cliente.objects.create(user=self.dono, telefone='1', endereco='-', tipo_usuario='RESTAURANTE')
+        self.restaurante = Restaurante.objects.create(
+            dono=self.dono, nome='Pizzaria', endereco='Rua R',
+            horario_funcionamento='18:00-23:59', tipo_cozinha='Italiana',
+        )
+        self.pedido = Pedido.objects.create(restaurante=self.restaurante)
+
+    def status(self):
+        self.pedido.refresh_from_db()
+        return self.pedido.status
+
+    def test_transicao_em_um_update(self):
+        with CaptureQueriesContext(connection) as consultas:
+            mudar_status(self.pedido.id, 'Pendente', 'Em preparação', self.dono)
+        comandos = [c['sql'].split()[0] for c in consultas.captured_queries]
+        # Um UPDATE condicional e o INSERT do evento, sem nenhum SELECT antes
+        self.assertEqual([c for c in comandos if c in ('SELECT', 'UPDATE', 'INSERT')], ['UPDATE', 'INSERT'])
+        self.assertEqual(self.status(), 'Em preparação')
+
+    def test_status_desatualizado_gera_conflito(self):
+        mudar_status(self.pedido.id, 'Pendente', 'Em preparação', self.dono)
+        # Segunda tela ainda mostrava "Pendente"
+        with self.assertRaises(ConflitoStatus):
+            mudar_status(self.pedido.id, 'Pendente', 'Cancelado', self.dono)
+        self.assertEqual(self.status(), 'Em preparação')
+
+    def test_transicao_fora_da_maquina_de_estados(self):
+        with self.assertRaises(TransicaoInvalida):
+            mudar_status(self.pedido.id, 'Pendente', 'Entregue', self.dono)
+        with self.assertRaises(TransicaoInvalida):
+            mudar_status(self.pedido.id, 'Entregue', 'Pendente', self.dono)
+
+    def test_outro_dono_nao_altera(self):
+        outro = User.objects.create_user(username='outro', password='senha123')
+        with self.assertRaises(ConflitoStatus):
+            mudar_status(self.pedido.id, 'Pendente', 'Em preparação', outro)
+        self.assertEqual(self.status(), 'Pendente')
+
+    def test_api_retorna_409_com_status_desatualizado(self):
+        self.client.login(username='dono', password='senha123')
+        url = reverse('api_pedido_status', args=[self.pedido.id])
+        dados = {'status_atual': 'Pendente', 'novo_status': 'Em preparação'}
+        self.assertEqual(self.client.post(url, dados, content_type='application/json').status_code, 200)
+        self.assertEqual(self.client.post(url, dados, content_type='application/json').status_code, 409)
+
+    def test_view_web(self):
+        self.client.login(username='dono', password='senha123')
+        self.client.post(
+            reverse('core:atualizar_status_pedido', args=[self.pedido.id]),
+            {'status_atual': 'Pendente', 'novo_status': 'Cancelado'},
+        )
+        self.assertEqual(self.status(), 'Cancelado')
+
+
+class TransicaoEmLoteTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        Cliente.objects.create(user=self.dono, telefone='1', endereco='-', tipo_usuario='RESTAURANTE')
+        restaurante = Restaurante.objects.create(
+            dono=self.dono, nome='Marmitaria', endereco='Rua S',
+            horario_funcionamento='10:00-15:00', tipo_cozinha='Caseira',
+        )
+        self.preparando = Pedido.objects.bulk_create([
+            Pedido(restaurante=restaurante, status='Em preparação') for _ in range(3)
+        ])
+        self.entregue = Pedido.objects.create(restaurante=restaurante, status='Entregue')
+        outro_dono = User.objects.create_user(username='outro', password='senha123')
+        self.de_outro = Pedido.objects.create(
+            status='Em preparação',
+            restaurante=Restaurante.objects.create(
+                dono=outro_dono, nome='Outro', endereco='-', horario_funcionamento='-', tipo_cozinha='-'
+            ),
+        )
+
+    def test_resultado_por_pedido(self):
+        ids = [p.id for p in self.preparando] + [self.entregue.id, self.de_outro.id]
+        resultados = mudar_status_em_lote(ids, 'A caminho', self.dono)
+        self.assertEqual(
+            [r['resultado'] for r in resultados],
+            ['ok', 'ok', 'ok', 'invalido', 'nao_encontrado'],
+        )
+        self.assertEqual(Pedido.objects.filter(status='A caminho').count(), 3)
+        self.assertEqual(Pedido.objects.get(pk=self.de_outro.id).status, 'Em preparação')
+
+    def test_api_em_lote(self):
+        self.client.login(username='dono', password='senha123')
+        response = self.client.post(
+            reverse('api_pedidos_status_em_lote'),
+            {'pedido_ids': [p.id for p in self.preparando], 'novo_status': 'A caminho'},
+            content_type='application/json',
+        )
+        self.assertEqual({r['status'] for r in response.json()['resultados']}, {'A caminho'})
+        response = self.client.post(
+            reverse('api_pedidos_status_em_lote'), {'pedido_ids': [True], 'novo_status': 'Entregue'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_view_web_em_lote(self):
+        self.client.login(username='dono', password='senha123')
+        self.client.post(
+            reverse('core:atualizar_status_pedidos_em_lote'),
+            {'pedido_ids': [p.id for p in self.preparando[:2]], 'novo_status': 'Cancelado'},
+        )
+        self.assertEqual(Pedido.objects.filter(status='Cancelado').count(), 2)
+
+
+class PedidoEventoTests(TestCase):
+
+    def setUp(self):
+        self.dono = User.objects.create_user(username='dono', password='senha123')
+        self.restaurante = Restaurante.objects.create(
+            dono=self.dono, nome='Sorveteria', endereco='Rua T',
+            horario_funcionamento='12:00-22:00', tipo_cozinha='Sobremesas',
+        )
+        user = User.objects.create_user(username='cliente', password='senha123')
+        self.cliente = Cliente.objects.create(user=user, telefone='1', endereco='-')
+        self.pedido = Pedido.objects.create(cliente=self.cliente, restaurante=self.restaurante)
+
+    def test_eventos_de_criacao_e_transicoes(self):
+        mudar_status(self.pedido.id, 'Pendente', 'Em preparação', self.dono)
+        mudar_status_em_lote([self.pedido.id], 'A caminho', self.dono)
+        pedido = Pedido.objects.get(pk=self.pedido.id)
+        pedido.status = 'Entregue'
+        pedido.save()
+        self.assertEqual(
+            list(self.pedido.eventos.order_by('id').values_list('status_anterior', 'status', 'restaurante_id')),
+            [
+                (None, 'Pendente', self.restaurante.id),
+                ('Pendente', 'Em preparação', self.restaurante.id),
+                ('Em preparação', 'A caminho', self.restaurante.id),
+                ('A caminho', 'Entregue', self.restaurante.id),
+            ],
+        )
+
+    def test_evento_nao_pode_ser_alterado(self):
+        evento = self.pedido.eventos.get()
+        evento.status = 'Cancelado'
+        with self.assertRaises(ValueError):
+            evento.save()
+
+    def test_linha_do_tempo_em_uma_consulta(self):
+        mudar_status(self.pedido.id, 'Pendente', 'Cancelado', self.dono)
+        with self.assertNumQueries(1):
+            eventos = linha_do_tempo(self.pedido.id, self.cliente.user)
+        self.assertEqual([e['status'] for e in eventos], ['Pendente', 'Cancelado'])
+        self.assertEqual(linha_do_tempo(self.pedido.id, User.objects.create(username='estranho')), [])
+
+    def test_janela_do_restaurante_usa_indice(self):
+        agora = timezone.now()
+        plano = eventos_do_restaurante(self.restaurante.id, agora - timedelta(hours=1), agora).explain()
+        self.assertIn('evento_restaurante_data_idx', plano)
+
+    def test_api_linha_do_tempo(self):
+        self.client.login(username='dono', password='senha123')
+        response = self.client.get(reverse('api_pedido_timeline', args=[self.pedido.id]))
+        self.assertEqual(response.json()['eventos'][0]['status'], 'Pendente')
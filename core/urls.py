@@ -21,5 +21,6 @@ urlpatterns = [
     path('painel/cardapio/editar/<int:produto_id>/', views.editar_produto, name='editar_produto'),
     path('painel/cardapio/excluir/<int:produto_id>/', views.excluir_produto, name='excluir_produto'),
     path('painel/pedidos/', views.ver_pedidos_restaurante, name='ver_pedidos_restaurante'),
+    path('painel/pedidos/atualizar-status/', views.atualizar_status_pedidos_em_lote, name='atualizar_status_pedidos_em_lote'),
     path('painel/pedidos/atualizar-status/<int:pedido_id>/', views.atualizar_status_pedido, name='atualizar_status_pedido'),
 ]
\ No newline at end of file
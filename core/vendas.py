@@ -0,0 +1,215 @@
+# core/vendas.py
+#
+# Rollups de vendas para o painel do dono: VendaDiaria (restaurante, dia) e
+# VendaProdutoDiaria (restaurante, dia, produto). O dia é o da data do pedido
+# no fuso dos restaurantes.
+#
+# * Na criação do pedido (signal) entra +1 pedido e o valor_total; os itens
+#   entram em criar_pedido, logo depois do bulk_create.
+# * Quando um pedido é cancelado (por save, mudar_status ou em lote), os
+#   mesmos valores saem e o dia ganha +1 cancelado.
+#
+# As somas são um INSERT ... ON CONFLICT DO UPDATE com executemany: uma
+# consulta por tabela, qualquer que seja a quantidade de linhas. O comando
+# recalcular_vendas reconstrói tudo a partir de Pedido e ItemPedido.
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ItemPedido, Pedido, VendaDiaria, VendaProdutoDiaria
+
+# Maior intervalo aceito pelo endpoint de vendas
+DIAS_MAXIMOS = 366
+
+
+def dia_local(momento):
+    return timezone.localtime(momento, ZoneInfo(settings.RESTAURANTES_FUSO_HORARIO)).date()
+
+
+def centavos(valor):
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def _somar(tabela, chaves, valores, linhas):
+    # linhas: {(chave...): [valor, ...]} somadas às existentes (ou inseridas)
+    if not linhas:
+        return
+    colunas = chaves + valores
+    atualizacoes = ', '.join(f'{coluna} = {tabela}.{coluna} + excluded.{coluna}' for coluna in valores)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabela} ({", ".join(colunas)}) VALUES ({", ".join(["%s"] * len(colunas))}) '
+            f'ON CONFLICT ({", ".join(chaves)}) DO UPDATE SET {atualizacoes}',
+            [
+                (*(connection.ops.adapt_datefield_value(v) if isinstance(v, date) else v for v in chave), *soma)
+                for chave, soma in linhas.items()
+            ],
+        )
+
+
+def _somar_dias(linhas):
+    _somar(VendaDiaria._meta.db_table, ['restaurante_id', 'dia'],
+           ['pedidos', 'faturamento_centavos', 'cancelados'], linhas)
+
+
+def _somar_produtos(linhas):
+    _somar(VendaProdutoDiaria._meta.db_table, ['restaurante_id', 'dia', 'produto_id'],
+           ['quantidade', 'faturamento_centavos'], linhas)
+
+
+def pedido_criado(pedido):
+    cancelado = pedido.status == 'Cancelado'
+    _somar_dias({
+        (pedido.restaurante_id, dia_local(pedido.data_pedido)): [
+            0 if cancelado else 1, 0 if cancelado else centavos(pedido.valor_total), 1 if cancelado else 0,
+        ],
+    })
+
+
+def itens_criados(pedido, itens):
+    # itens: [(produto_id, quantidade, preço unitário)]
+    if pedido.status == 'Cancelado':
+        return
+    dia = dia_local(pedido.data_pedido)
+    linhas = defaultdict(lambda: [0, 0])
+    for produto_id, quantidade, preco in itens:
+        linha = linhas[(pedido.restaurante_id, dia, produto_id)]
+        linha[0] += quantidade
+        linha[1] += centavos(preco) * quantidade
+    _somar_produtos(linhas)
+
+
+def status_alterados(mudancas):
+    """Ajusta os rollups para [(pedido_id, status_anterior, novo_status)].
+
+    Só cancelamentos (ou a volta de um pedido cancelado) mexem nas vendas;
+    as outras mudanças não custam nenhuma consulta.
+    """
+    sinais = {}
+    for pedido_id, anterior, novo in mudancas:
+        if (anterior == 'Cancelado') != (novo == 'Cancelado'):
+            sinais[pedido_id] = -1 if novo == 'Cancelado' else 1
+    if not sinais:
+        return
+
+    dias = defaultdict(lambda: [0, 0, 0])
+    chaves = {}
+    linhas = Pedido.objects.filter(id__in=sinais).values_list('id', 'restaurante_id', 'data_pedido', 'valor_total')
+    for pedido_id, restaurante_id, data_pedido, valor_total in linhas:
+        sinal = sinais[pedido_id]
+        chave = chaves[pedido_id] = (restaurante_id, dia_local(data_pedido))
+        dias[chave][0] += sinal
+        dias[chave][1] += sinal * centavos(valor_total)
+        dias[chave][2] -= sinal
+    produtos = defaultdict(lambda: [0, 0])
+    itens = ItemPedido.objects.filter(pedido_id__in=chaves).values_list(
+        'pedido_id', 'produto_id', 'quantidade', 'preco_unitario'
+    )
+    for pedido_id, produto_id, quantidade, preco in itens:
+        sinal = sinais[pedido_id]
+        linha = produtos[(*chaves[pedido_id], produto_id)]
+        linha[0] += sinal * quantidade
+        linha[1] += sinal * centavos(preco) * quantidade
+    _somar_dias(dias)
+    _somar_produtos(produtos)
+
+
+def recalcular():
+    """Reconstrói os rollups de todos os pedidos (backfill)."""
+    dias = defaultdict(lambda: [0, 0, 0])
+    pedidos = {}
+    linhas = Pedido.objects.values_list('id', 'restaurante_id', 'data_pedido', 'valor_total', 'status')
+    for pedido_id, restaurante_id, data_pedido, valor_total, status in linhas.iterator(chunk_size=5000):
+        chave = (restaurante_id, dia_local(data_pedido))
+        if status == 'Cancelado':
+            dias[chave][2] += 1
+        else:
+            dias[chave][0] += 1
+            dias[chave][1] += centavos(valor_total)
+            pedidos[pedido_id] = chave
+    produtos = defaultdict(lambda: [0, 0])
+    itens = ItemPedido.objects.values_list('pedido_id', 'produto_id', 'quantidade', 'preco_unitario')
+    for pedido_id, produto_id, quantidade, preco in itens.iterator(chunk_size=5000):
+        if pedido_id in pedidos:
+            linha = produtos[(*pedidos[pedido_id], produto_id)]
+            linha[0] += quantidade
+            linha[1] += centavos(preco) * quantidade
+    with transaction.atomic():
+        VendaDiaria.objects.all().delete()
+        VendaProdutoDiaria.objects.all().delete()
+        _somar_dias(dias)
+        _somar_produtos(produtos)
+
+
+def intervalo(inicio=None, fim=None, dias=30):
+    """(inicio, fim) como datas; por padrão os últimos `dias` dias até hoje."""
+    fim = date.fromisoformat(fim) if fim else dia_local(timezone.now())
+    inicio = date.fromisoformat(inicio) if inicio else fim - timedelta(days=dias - 1)
+    if inicio > fim:
+        raise ValueError('inicio deve ser anterior a fim')
+    if (fim - inicio).days >= DIAS_MAXIMOS:
+        raise ValueError(f'O intervalo pode ter no máximo {DIAS_MAXIMOS} dias')
+    return inicio, fim
+
+
+def _reais(valor_centavos):
+    return str((Decimal(valor_centavos or 0) / 100).quantize(Decimal('0.01')))
+
+
+def resumo(restaurante_ids, inicio, fim, produtos_no_topo=10):
+    """Faturamento, pedidos, ticket médio, série diária e mais vendidos de
+    [inicio, fim], somando os restaurantes informados. Lê só os rollups."""
+    dias = (
+        VendaDiaria.objects.filter(restaurante_id__in=restaurante_ids, dia__range=(inicio, fim))
+        .values('dia').annotate(
+            pedidos=Sum('pedidos'), faturamento=Sum('faturamento_centavos'), cancelados=Sum('cancelados'),
+        ).order_by('dia')
+    )
+    por_dia = {linha['dia']: linha for linha in dias}
+    serie = []
+    totais = {'pedidos': 0, 'faturamento': 0, 'cancelados': 0}
+    dia = inicio
+    while dia <= fim:
+        linha = por_dia.get(dia, {'pedidos': 0, 'faturamento': 0, 'cancelados': 0})
+        for campo in totais:
+            totais[campo] += linha[campo]
+        serie.append({
+            'dia': dia.isoformat(),
+            'pedidos': linha['pedidos'],
+            'faturamento': _reais(linha['faturamento']),
+            'cancelados': linha['cancelados'],
+        })
+        dia += timedelta(days=1)
+
+    mais_vendidos = (
+        VendaProdutoDiaria.objects.filter(restaurante_id__in=restaurante_ids, dia__range=(inicio, fim))
+        .values('produto_id').annotate(
+            nome=F('produto__nome'), quantidade=Sum('quantidade'), faturamento=Sum('faturamento_centavos'),
+        ).filter(quantidade__gt=0).order_by('-quantidade', '-faturamento', 'produto_id')[:produtos_no_topo]
+    )
+    ticket_medio = Decimal(totais['faturamento']) / totais['pedidos'] / 100 if totais['pedidos'] else Decimal(0)
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'pedidos': totais['pedidos'],
+        'faturamento': _reais(totais['faturamento']),
+        'ticket_medio': str(ticket_medio.quantize(Decimal('0.01'))),
+        'cancelados': totais['cancelados'],
+        'por_dia': serie,
+        'mais_vendidos': [
+            {
+                'produto_id': linha['produto_id'],
+                'nome': linha['nome'],
+                'quantidade': linha['quantidade'],
+                'faturamento': _reais(linha['faturamento']),
+            }
+            for linha in mais_vendidos
+        ],
+    }
@@ -1,9 +1,26 @@
 from django.views.generic import ListView, DetailView
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth import login  
 from django.contrib.auth.decorators import login_required
-from .models import Restaurante, Produto, Pedido, ItemPedido, Cliente
+from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+from .cardapio import chave_cardapio_html, etag_cardapio_pagina, obter_ou_gerar
+from .carrinho import CarrinhoMultiRestaurante, obter_carrinho, precificar_carrinho, verificar_restaurante
+from .models import Restaurante, Produto, Pedido, Cliente
+from .notificacoes import eventos_disponiveis
 from .forms import CadastroForm, RestauranteForm, ProdutoForm
+from .vendas import intervalo, resumo
+from .pedidos import (
+    CarrinhoInvalido, ConflitoStatus, TransicaoInvalida, criar_pedido, mudar_status, mudar_status_em_lote,
+)
+
+# Quantos pedidos o painel do restaurante mostra por página
+PEDIDOS_POR_PAGINA = 50
 
 class RestauranteListView(ListView):
     model = Restaurante
@@ -11,6 +28,11 @@ class RestauranteListView(ListView):
     context_object_name = "restaurantes"
 
 
+# A página depende do usuário logado, então o cache é privado e sempre
+# revalidado pelo ETag (que inclui a versão do cardápio).
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(vary_on_cookie, name='dispatch')
+@method_decorator(condition(etag_func=etag_cardapio_pagina), name='dispatch')
 class RestauranteDetailView(DetailView):
     model = Restaurante
     template_name = "core/restaurante_detail.html"
@@ -18,7 +40,21 @@ class RestauranteDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["produtos"] = self.get_object().produtos.all()
+        user = self.request.user
+        pode_comprar = (
+            user.is_authenticated
+            and hasattr(user, 'cliente')
+            and user.cliente.tipo_usuario == 'CLIENTE'
+        )
+        # A seção de produtos fica em cache por restaurante + versão do cardápio
+        produtos_html = obter_ou_gerar(
+            chave_cardapio_html(self.object, pode_comprar),
+            lambda: render_to_string("core/cardapio_produtos.html", {
+                "produtos": self.object.produtos.all(),
+                "pode_comprar": pode_comprar,
+            }),
+        )
+        context["produtos_html"] = mark_safe(produtos_html)
         return context
 
 
@@ -31,47 +67,31 @@ def adicionar_ao_carrinho(request, produto_id):
     
     produto = get_object_or_404(Produto, id=produto_id)
 
-    carrinho = request.session.get('carrinho', {})
-
-    produto_id_str = str(produto.id)
-
-    if produto_id_str in carrinho:
-        carrinho[produto_id_str] += 1
-    else:
-        carrinho[produto_id_str] = 1
-
-    request.session['carrinho'] = carrinho
+    carrinho = obter_carrinho(request)
+    try:
+        verificar_restaurante(carrinho.itens(), produto.restaurante_id)
+    except CarrinhoMultiRestaurante:
+        # Produto de outro restaurante: começa um carrinho novo
+        carrinho.limpar()
+    carrinho.adicionar(produto.id)
 
-    return redirect('core:detalhe_restaurante', pk=produto.restaurante.id)
+    return redirect('core:detalhe_restaurante', pk=produto.restaurante_id)
 @login_required
 def ver_carrinho(request):
     if request.user.cliente.tipo_usuario == 'RESTAURANTE':
         return redirect('core:painel_restaurante')
     
-    carrinho = request.session.get("carrinho", {})
-    produto_ids = carrinho.keys()
-    produtos_no_carrinho = Produto.objects.filter(id__in=produto_ids)
-    itens_carrinho = []
-    valor_total = 0
-
-    for produto in produtos_no_carrinho:
-        produto_id_str = str(produto.id)
-        quantidade = carrinho[produto_id_str]
-        subtotal = produto.preco * quantidade
-
-        itens_carrinho.append(
-            {
-                "produto": produto,
-                "quantidade": quantidade,
-                "subtotal": subtotal,
-            }
-        )
-        valor_total += subtotal
-
-    contexto = {
-        "itens_carrinho": itens_carrinho,
-        "valor_total": valor_total,
-    }
+    contexto = {"itens_carrinho": [], "valor_total": 0}
+    try:
+        # Uma única consulta leve traz nome, preço e restaurante dos produtos
+        precificado = precificar_carrinho(obter_carrinho(request).itens())
+        contexto["itens_carrinho"] = precificado.linhas
+        contexto["valor_total"] = precificado.total
+    except CarrinhoMultiRestaurante as e:
+        # Mostra os itens mesmo assim, para o usuário ver o que remover
+        contexto["itens_carrinho"] = e.linhas
+        contexto["valor_total"] = e.total
+        contexto["erro"] = str(e)
 
     return render(request, "core/carrinho.html", contexto)
 
@@ -80,7 +100,8 @@ def finalizar_pedido(request):
     if request.user.cliente.tipo_usuario == 'RESTAURANTE':
         return redirect('core:painel_restaurante')
     
-    carrinho = request.session.get('carrinho', {})
+    carrinho_do_usuario = obter_carrinho(request)
+    carrinho = carrinho_do_usuario.itens()
     if not carrinho:
         return redirect('core:lista_restaurantes')
 
@@ -89,45 +110,18 @@ def finalizar_pedido(request):
     # o perfil Cliente ligado a ele pelo OneToOneField que criamos.
     cliente_logado = request.user.cliente
 
-    # O resto da lógica para pegar os produtos e calcular o total continua
-    produto_ids = carrinho.keys()
-    produtos = Produto.objects.filter(id__in=produto_ids)
-
-    # Validação para caso os produtos não existam mais
-    if not produtos.exists():
-        request.session['carrinho'] = {} # Limpa o carrinho inválido
+    try:
+        # Cria o Pedido e os itens numa única transação
+        novo_pedido = criar_pedido(cliente_logado, carrinho)
+    except CarrinhoMultiRestaurante:
+        return redirect('core:ver_carrinho')
+    except CarrinhoInvalido:
+        # Os produtos do carrinho não existem mais
+        carrinho_do_usuario.limpar() # Limpa o carrinho inválido
         return redirect('core:lista_restaurantes')
 
-    restaurante_do_pedido = produtos.first().restaurante
-
-    # Cria o objeto Pedido, agora com o cliente correto
-    novo_pedido = Pedido.objects.create(
-        cliente=cliente_logado, 
-        restaurante=restaurante_do_pedido,
-        status='Pendente'
-    )
-
-    valor_total = 0
-    # Cria os Itens do Pedido
-    for produto in produtos:
-        produto_id_str = str(produto.id)
-        quantidade = carrinho[produto_id_str]
-        subtotal = produto.preco * quantidade
-
-        ItemPedido.objects.create(
-            pedido=novo_pedido,
-            produto=produto,
-            quantidade=quantidade,
-            preco_unitario=produto.preco
-        )
-        valor_total += subtotal
-
-    #  Atualiza o valor total no pedido
-    novo_pedido.valor_total = valor_total
-    novo_pedido.save()
-
-    #  Limpa o carrinho da sessão
-    request.session['carrinho'] = {}
+    #  Limpa o carrinho
+    carrinho_do_usuario.limpar()
 
     #  Redireciona para a página de confirmação
     return redirect('core:pedido_confirmado', pedido_id=novo_pedido.id)
@@ -169,7 +163,8 @@ def meus_pedidos(request):
     pedidos_do_usuario = Pedido.objects.filter(cliente__user=request.user).order_by('-data_pedido')
 
     contexto = {
-        'pedidos': pedidos_do_usuario
+        'pedidos': pedidos_do_usuario,
+        'eventos_ao_vivo': eventos_disponiveis(request),
     }
     return render(request, 'core/meus_pedidos.html', contexto)
 
@@ -181,9 +176,12 @@ def painel_restaurante(request):
 
     # Busca os restaurantes que pertencem ao usuário logado
     restaurantes_do_dono = Restaurante.objects.filter(dono=request.user)
-    
+
+    # Resumo dos últimos 30 dias, lido só dos rollups diários (core/vendas.py)
+    restaurante_ids = [r.id for r in restaurantes_do_dono]
     contexto = {
-        'restaurantes': restaurantes_do_dono
+        'restaurantes': restaurantes_do_dono,
+        'vendas': resumo(restaurante_ids, *intervalo(), produtos_no_topo=5) if restaurante_ids else None,
     }
     return render(request, 'core/painel_restaurante.html', contexto)
 
@@ -310,14 +308,43 @@ def ver_pedidos_restaurante(request):
     try:
         # Busca o restaurante do dono logado
         restaurante_do_dono = Restaurante.objects.get(dono=request.user)
-        # Busca todos os pedidos feitos para esse restaurante, dos mais novos para os mais antigos
-        pedidos = Pedido.objects.filter(restaurante=restaurante_do_dono).order_by('-data_pedido')
     except Restaurante.DoesNotExist:
         # Se ele não tiver restaurante, não há pedidos para mostrar
         return redirect('core:painel_restaurante')
 
+    # Por padrão mostra só os pedidos ativos; ?status=todos ou ?status=Entregue
+    # (pode repetir) abrem o histórico
+    status_validos = [status[0] for status in Pedido.STATUS_CHOICES]
+    filtro = [s for s in request.GET.getlist('status') if s in status_validos or s == 'todos']
+    if not filtro:
+        filtro = Pedido.STATUS_ATIVOS
+
+    # select_related evita uma consulta por linha para mostrar o cliente
+    pedidos = (
+        Pedido.objects.filter(restaurante=restaurante_do_dono)
+        .select_related('cliente__user')
+        .order_by('-data_pedido', '-id')
+    )
+    if 'todos' not in filtro:
+        pedidos = pedidos.filter(status__in=filtro)
+
+    # Paginação por cursor: o id é crescente junto com data_pedido, então
+    # "id menor que o último mostrado" é a próxima página na mesma ordem
+    cursor = request.GET.get('cursor')
+    if cursor and cursor.isdigit():
+        pedidos = pedidos.filter(id__lt=int(cursor))
+    pedidos = list(pedidos[:PEDIDOS_POR_PAGINA + 1])
+    proximo_cursor = None
+    if len(pedidos) > PEDIDOS_POR_PAGINA:
+        pedidos = pedidos[:PEDIDOS_POR_PAGINA]
+        proximo_cursor = pedidos[-1].id
+
     contexto = {
-        'pedidos': pedidos
+        'pedidos': pedidos,
+        'status_choices': Pedido.STATUS_CHOICES,
+        'filtro_status': filtro,
+        'proximo_cursor': proximo_cursor,
+        'eventos_ao_vivo': eventos_disponiveis(request),
     }
     return render(request, 'core/ver_pedidos.html', contexto)
 
@@ -330,20 +357,40 @@ def atualizar_status_pedido(request, pedido_id):
 
     # Garante que a requisição seja do tipo POST
     if request.method == 'POST':
-        pedido = get_object_or_404(Pedido, id=pedido_id)
+        # O formulário envia o status que a tela mostrava; se outra pessoa já
+        # mudou o pedido nesse meio tempo, a transição é recusada
+        status_atual = request.POST.get('status_atual')
+        novo_status = request.POST.get('novo_status')
+        try:
+            mudar_status(pedido_id, status_atual, novo_status, request.user)
+        except TransicaoInvalida as e:
+            messages.error(request, str(e))
+        except ConflitoStatus:
+            messages.warning(request, f'O pedido #{pedido_id} foi alterado por outra pessoa. Confira o status atual.')
 
-        # Segurança: Garante que o dono só pode alterar pedidos do seu próprio restaurante
-        if pedido.restaurante.dono != request.user:
-            return redirect('core:painel_restaurante') # Ou acesso negado
+    # Redireciona de volta para a lista de pedidos em qualquer caso
+    return redirect('core:ver_pedidos_restaurante')
 
-        # Pega o novo status enviado pelo formulário
-        novo_status = request.POST.get('novo_status')
 
-        # Valida se o novo status é uma das opções válidas no modelo Pedido
-        valid_statuses = [status[0] for status in Pedido.STATUS_CHOICES]
-        if novo_status in valid_statuses:
-            pedido.status = novo_status
-            pedido.save()
+@login_required
+def atualizar_status_pedidos_em_lote(request):
+    # Proteções de segurança
+    if not hasattr(request.user, 'cliente') or request.user.cliente.tipo_usuario != 'RESTAURANTE':
+        return redirect('core:lista_restaurantes')
 
-    # Redireciona de volta para a lista de pedidos em qualquer caso
-    return redirect('core:ver_pedidos_restaurante')
\ No newline at end of file
+    if request.method == 'POST':
+        pedido_ids = [i for i in request.POST.getlist('pedido_ids') if i.isdigit()]
+        novo_status = request.POST.get('novo_status')
+        if pedido_ids:
+            try:
+                resultados = mudar_status_em_lote(pedido_ids, novo_status, request.user)
+            except TransicaoInvalida as e:
+                messages.error(request, str(e))
+            else:
+                recusados = [r['pedido_id'] for r in resultados if r['resultado'] != 'ok']
+                messages.success(request, f"{len(resultados) - len(recusados)} pedido(s) movido(s) para '{novo_status}'.")
+                if recusados:
+                    lista = ', '.join(f'#{pedido_id}' for pedido_id in recusados)
+                    messages.warning(request, f'Não foi possível mudar os pedidos {lista}.')
+
+    return redirect('core:ver_pedidos_restaurante')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,6 +82,34 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Por padrão usa memória local (LocMemCache, que descarta primeiro as entradas
+# menos usadas recentemente). Em produção com vários workers dá para trocar
+# por arquivo ou Redis: DELIVERY_CACHE_BACKEND=file|redis e
+# DELIVERY_CACHE_LOCATION=/var/tmp/delivery_cache ou redis://127.0.0.1:6379/1
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_BACKEND = os.environ.get('DELIVERY_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('DELIVERY_CACHE_LOCATION', 'delivery'),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 5000} if CACHE_BACKEND != 'redis' else {},
+    }
+}
+
+# Alias do cache usado para o JSON e o HTML dos cardápios
+CARDAPIO_CACHE_ALIAS = 'default'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -125,4 +154,58 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/'
 
 # URL que o Django deve usar para a PÁGINA DE LOGIN
-LOGIN_URL = '/login/'
\ No newline at end of file
+LOGIN_URL = '/login/'
+
+# Paginação das APIs JSON (restaurantes e cardápio)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Tempo (segundos) que CDN/proxy podem servir o JSON do cardápio sem revalidar
+CARDAPIO_CACHE_MAX_AGE = 60
+
+# Por quanto tempo uma Idempotency-Key do checkout continua valendo antes de
+# ser removida pelo comando purgar_chaves_idempotencia
+IDEMPOTENCY_KEY_TTL_HORAS = 24
+
+# Onde o carrinho é guardado: 'sessao' (django_session, padrão) ou 'modelo'
+# (tabelas Carrinho/ItemCarrinho para usuários logados). Ver core/carrinho.py.
+CARRINHO_BACKEND = os.environ.get('DELIVERY_CARRINHO_BACKEND', 'sessao')
+
+# Broker das notificações de pedidos em tempo real (ver core/notificacoes.py).
+# Com vários workers ASGI use 'core.notificacoes.BrokerRedis'.
+NOTIFICACOES_BROKER = os.environ.get('DELIVERY_NOTIFICACOES_BROKER', 'core.notificacoes.BrokerLocal')
+NOTIFICACOES_REDIS_URL = os.environ.get('DELIVERY_NOTIFICACOES_REDIS_URL', 'redis://127.0.0.1:6379/0')
+SSE_HEARTBEAT_SEGUNDOS = 15
+
+# Geração das versões reduzidas das fotos de produto (ver core/imagens.py).
+# IMAGENS_SINCRONO gera na própria thread, depois do commit (útil em testes).
+IMAGENS_WORKERS = int(os.environ.get('DELIVERY_IMAGENS_WORKERS', 2))
+IMAGENS_SINCRONO = False
+
+# Limites das fotos de produto, checados antes de decodificar a imagem
+PRODUTO_FOTO_MAX_BYTES = int(os.environ.get('DELIVERY_PRODUTO_FOTO_MAX_BYTES', 5 * 1024 * 1024))
+PRODUTO_FOTO_MAX_LADO = 6000
+PRODUTO_FOTO_FORMATOS = ('JPEG', 'PNG', 'WEBP')
+
+# Fuso em que os restaurantes cadastram o horário de funcionamento, usado pelo
+# filtro "aberto agora" (ver core/horarios.py)
+RESTAURANTES_FUSO_HORARIO = 'America/Sao_Paulo'
+
+# Geocodificação dos endereços, feita pelo comando geocodificar (ver core/geo.py)
+GEOCODIFICADOR = os.environ.get('DELIVERY_GEOCODIFICADOR', 'core.geo.GeocodificadorFixture')
+GEOCODIFICADOR_FIXTURE = BASE_DIR / 'core' / 'dados' / 'geocodificacao.json'
+GEOCODIFICADOR_USER_AGENT = 'delivery_project/1.0'
+
+# Estimativa de tempo de entrega (ver core/eta.py)
+ETA_AMOSTRAS = 500                # eventos recentes lidos ao carregar um restaurante
+ETA_RECARREGAR_SEGUNDOS = 300     # recarrega as médias e a fila do banco
+ETA_PEDIDOS_SIMULTANEOS = 3       # pedidos que uma cozinha prepara ao mesmo tempo
+ETA_VELOCIDADE_KMH = 20           # velocidade média do entregador na cidade
+ETA_MINUTOS_RETIRADA = 3          # do pedido pronto até o entregador sair
+
+# Despacho de entregadores (ver core/despacho.py e o comando despachar)
+DESPACHO_INTERVALO_SEGUNDOS = 30      # de quanto em quanto tempo o worker planeja
+DESPACHO_LIMITE_SEGUNDOS = 2.0        # tempo máximo de um planejamento
+DESPACHO_PEDIDOS_POR_ROTA = 3         # capacidade de um entregador por saída
+DESPACHO_DESVIO_MAXIMO_MINUTOS = 10   # quanto um pedido pode alongar uma rota
+DESPACHO_MINUTOS_POR_PARADA = 3       # retirada no restaurante ou entrega ao cliente